@@ -1,19 +1,41 @@
 """
 Backend package initialization
+
+子模块在第一次访问对应名称时才导入，导入 backend 本身不会加载 pywin32、
+zstandard、SQLite 等依赖
 """
-from .models import RoleInfo, BackupInfo
-from .path_resolver import PathResolver
-from .role_scanner import RoleScanner
-from .role_copier import RoleCopier
-from .backup_manager import BackupManager
-from .config_manager import ConfigManager
+import importlib
+
+# 名称 -> 所在子模块
+_EXPORTS = {
+    'RoleInfo': 'models',
+    'BackupInfo': 'models',
+    'PathResolver': 'path_resolver',
+    'RoleScanner': 'role_scanner',
+    'RoleWatcher': 'role_watcher',
+    'RoleCopier': 'role_copier',
+    'BackupManager': 'backup_manager',
+    'BlobStore': 'blob_store',
+    'HashCache': 'hash_cache',
+    'ConfigManager': 'config_manager',
+    'SyncProfile': 'sync_profile',
+    'Job': 'job_manager',
+    'JobCancelled': 'job_manager',
+    'JobManager': 'job_manager'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    # 缓存到包的命名空间，之后的访问不再经过 __getattr__
+    globals()[name] = value
+    return value
+
 
-__all__ = [
-    'RoleInfo',
-    'BackupInfo',
-    'PathResolver',
-    'RoleScanner',
-    'RoleCopier',
-    'BackupManager',
-    'ConfigManager'
-]
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
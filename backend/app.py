@@ -2,21 +2,53 @@
 Flask API 服务
 提供 REST API 供 Electron 前端调用
 """
-from flask import Flask, request, jsonify
+import time
+
+# 启动计时从导入 Flask 等依赖之前开始
+BOOT_STARTED = time.monotonic()
+
+from flask import Flask, Response, g, request, jsonify, send_file
 from flask_cors import CORS
+from werkzeug.serving import make_server
 from pathlib import Path
+import argparse
 import sys
 import os
+import atexit
+import json
+import queue
 import subprocess
 import platform
+import threading
+from typing import TYPE_CHECKING, Optional
+
+try:
+    from waitress import create_server
+    HAS_WAITRESS = True
+except ImportError:
+    HAS_WAITRESS = False
 
 # 添加父目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# backend 的子模块按需导入：备份管理器（zstandard、tarfile、SQLite 目录）在启动后的后台线程中
+# 导入，角色包在第一次导入导出时导入
 from backend import (
-    PathResolver, RoleScanner, RoleCopier, BackupManager,
-    ConfigManager, RoleInfo
+    PathResolver, RoleScanner, RoleCopier,
+    ConfigManager, RoleInfo, RoleWatcher, JobManager, SyncProfile, HashCache
 )
+from backend.retention import RetentionPolicy
+from backend.io_scheduler import io_scheduler
+from backend.metrics import ERRORS, HTTP_DURATION, metrics
+from backend import request_profiler
+from backend.request_profiler import RequestProfiler
+from backend.role_locks import RoleBusy, RoleLocks
+from backend.startup import STAGE_INDEX_LOADED, STAGE_READY, STAGE_SERVICES_READY, StartupState
+from backend.sync_plan import PlanStore
+from backend.tree_diff import scan_tree
+
+if TYPE_CHECKING:
+    from backend.backup_manager import BackupManager
 
 # 获取项目根目录
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -28,9 +60,352 @@ CORS(app)  # 允许跨域请求
 
 # 全局实例
 config_manager = ConfigManager()
+# 角色索引与配置文件放在一起
+ROLE_INDEX_FILE = config_manager.config_file.with_name('jx3_role_index.json')
+HASH_CACHE_FILE = config_manager.config_file.with_name('jx3_hash_cache.sqlite3')
+PROFILE_DIR = config_manager.config_file.with_name('jx3_profiles')
+# 复制、备份和扫描共用的文件哈希缓存，启动时在后台读入（见 warm_start），不推迟监听端口
+hash_cache = HashCache(str(HASH_CACHE_FILE), max_entries=config_manager.get('hash_cache_entries'),
+                       lazy=True)
+atexit.register(hash_cache.close)
 role_scanner = None
-role_copier = RoleCopier()
+role_copier = RoleCopier(max_workers=config_manager.get('copy_workers'), hash_cache=hash_cache)
 backup_manager = None
+role_watcher = None
+job_manager = JobManager(max_workers=config_manager.get('job_workers'))
+# 待执行的同步计划
+copy_plans = PlanStore()
+# 按角色路径的读写锁：同一角色同一时间只有一个写入操作
+role_locks = RoleLocks()
+metrics.enabled = bool(config_manager.get('metrics_enabled'))
+io_scheduler.configure(enabled=bool(config_manager.get('io_scheduler_enabled')),
+                       initial=config_manager.get('io_initial_concurrency'),
+                       maximum=config_manager.get('io_max_concurrency'))
+profiler = RequestProfiler(str(PROFILE_DIR), max_captures=config_manager.get('profile_max_captures'),
+                           mode=request_profiler.parse_mode(config_manager.get('profile_requests')))
+# 单个请求开启性能分析的请求头，值为 1 / full 或 cpu
+PROFILE_HEADER = 'X-Profile'
+# 不做性能分析的接口：分析记录本身和运行指标
+PROFILE_SKIP_PREFIXES = ('/api/debug/', '/api/metrics')
+# 任务进度事件的最小推送间隔（秒）
+JOB_EVENT_INTERVAL = 0.2
+# 角色查询单页最多返回的数量
+ROLE_QUERY_MAX_LIMIT = 1000
+# 启动进度，/api/health 报告
+startup = StartupState(BOOT_STARTED)
+# 服务创建完成前到达的请求最多等待的秒数，超时返回 503
+STARTUP_WAIT_SECONDS = 30
+# 启动期间不需要等待服务的接口
+STARTUP_EXEMPT_PREFIXES = ('/api/health', '/api/metrics', '/api/debug/')
+_warm_start_thread = None
+_warm_start_lock = threading.Lock()
+
+
+def init_services(userdata_path: str, warm: bool = False):
+    """
+    根据 userdata 路径初始化扫描器、备份管理器和目录监视器
+
+    Args:
+        userdata_path: userdata 目录路径
+        warm: 启动时使用。保存的角色索引不经校验直接使用，监视器在后台校验，
+            并随每一步推进 startup 的阶段；否则第一次获取角色时先校验索引
+    """
+    global role_scanner, backup_manager, role_watcher
+    from backend.backup_manager import BackupManager
+
+    if role_watcher:
+        role_watcher.stop()
+        role_watcher = None
+
+    role_scanner = RoleScanner(userdata_path, index_file=str(ROLE_INDEX_FILE), hash_cache=hash_cache,
+                               use_saved_index=warm)
+    if warm:
+        startup.advance(STAGE_INDEX_LOADED)
+    backup_manager = BackupManager(
+        userdata_path,
+        backup_dir=str(BACKUP_DIR),
+        backup_format=config_manager.get('backup_format'),
+        compression_level=config_manager.get('backup_compression_level'),
+        use_dictionary=config_manager.get('backup_use_dictionary'),
+        hash_cache=hash_cache,
+        retention=load_retention_policy(),
+        defer_retention=True
+    )
+
+    if config_manager.get('watch_roles'):
+        role_watcher = RoleWatcher(role_scanner)
+        role_watcher.start(revalidate=not warm)
+
+
+def warm_start():
+    """
+    启动后在后台初始化服务：先加载保存的角色索引，再创建备份管理器，
+    最后校验索引与磁盘一致，同时读入哈希缓存，各阶段通过 /api/health 报告
+    """
+    try:
+        userdata_path = config_manager.get('userdata_path')
+        # 已经通过其他方式初始化过服务时不再重复创建
+        warm = role_scanner is None and userdata_path and Path(userdata_path).exists()
+        if warm:
+            init_services(userdata_path, warm=True)
+            scanner, watcher = role_scanner, role_watcher
+            startup.advance(STAGE_SERVICES_READY)
+
+        # 监视器在自己的线程中校验索引，哈希缓存在这期间读入；读入前用到缓存的操作会等待读入完成
+        hash_cache.load()
+        startup.mark('hash_cache_loaded')
+
+        if warm:
+            if watcher:
+                watcher.ready.wait()
+            else:
+                scanner.scan_all_roles()
+        startup.advance(STAGE_READY)
+    except Exception as e:
+        print(f"启动服务失败: {e}")
+        startup.fail(str(e))
+
+
+def begin_warm_start():
+    """启动后台初始化线程，只启动一次；main() 在监听端口后调用，其他方式运行时由第一个请求触发"""
+    global _warm_start_thread
+    with _warm_start_lock:
+        if _warm_start_thread is None:
+            _warm_start_thread = threading.Thread(target=warm_start, name='warm-start', daemon=True)
+            _warm_start_thread.start()
+
+
+def load_retention_policy() -> RetentionPolicy:
+    """读取配置中的备份保留策略，格式无效时保留所有备份"""
+    try:
+        return RetentionPolicy.from_dict(config_manager.get('retention'))
+    except (TypeError, ValueError) as e:
+        print(f"读取保留策略失败: {e}")
+        return RetentionPolicy()
+
+
+def schedule_retention():
+    """任务结束后，在后台对有新备份的角色统一执行一次保留策略"""
+    manager = backup_manager
+    if manager and manager.has_pending_retention():
+        job_manager.submit('retention',
+                           lambda job: manager.apply_retention(progress=job.report, lease=retention_lease),
+                           '清理旧备份')
+
+
+def requested_profile_mode():
+    """当前请求的性能分析模式，请求头优先于配置；事件流等长连接不分析"""
+    if request.path.startswith(PROFILE_SKIP_PREFIXES) or request.path.endswith('/events'):
+        return None
+    header = request.headers.get(PROFILE_HEADER)
+    if header is not None:
+        return request_profiler.parse_mode(header)
+    return profiler.mode
+
+
+@app.before_request
+def start_profiling():
+    mode = requested_profile_mode()
+    if not mode:
+        return
+    try:
+        g.profile = profiler.start({'kind': 'request', 'method': request.method, 'path': request.path}, mode)
+    except ValueError as e:
+        print(f"启动性能分析失败: {e}")
+
+
+@app.after_request
+def stop_profiling(response):
+    """结束性能分析，记录 ID 通过 X-Profile-Id 响应头返回"""
+    capture = g.pop('profile', None)
+    if capture:
+        route = request.url_rule.rule if request.url_rule else None
+        summary = capture.stop({'route': route, 'status': response.status_code})
+        if summary:
+            response.headers['X-Profile-Id'] = summary['id']
+    return response
+
+
+@app.teardown_request
+def discard_profiling(exc):
+    """请求异常中止、没有经过 after_request 时也要结束分析，释放内存记录"""
+    capture = g.pop('profile', None)
+    if capture:
+        capture.stop({'error': str(exc) if exc else None})
+
+
+@app.before_request
+def start_request_timer():
+    if metrics.enabled:
+        g.request_started = time.perf_counter()
+
+
+@app.before_request
+def wait_for_startup():
+    """服务在后台创建，完成前到达的请求先等待，超时返回 503"""
+    if startup.reached(STAGE_SERVICES_READY):
+        return None
+    begin_warm_start()
+    if request.path.startswith(STARTUP_EXEMPT_PREFIXES):
+        return None
+    if not startup.wait(STAGE_SERVICES_READY, STARTUP_WAIT_SECONDS):
+        return jsonify({'success': False, 'error': '后端正在启动，请稍后重试',
+                        'startup': startup.to_dict()}), 503
+    return None
+
+
+@app.after_request
+def record_request_metrics(response):
+    """按路由模板记录接口耗时，流式响应只统计到开始返回为止"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe(HTTP_DURATION, time.perf_counter() - started,
+                        route=route, method=request.method, status=response.status_code)
+        if response.status_code >= 500:
+            metrics.inc(ERRORS, phase='http')
+    return response
+
+
+def format_sse(event: str, data: dict) -> str:
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def run_or_submit(kind: str, work, description: str = '', reads=(), writes=()):
+    """
+    执行耗时操作
+
+    请求体中 wait 为 true 时同步执行并直接返回结果，
+    否则提交到后台任务并立即返回任务 ID（202）。
+    操作期间持有 reads / writes 中角色的读锁 / 写锁，角色被占用时按
+    role_lock_timeout 等待，为 0 时直接返回 409。
+
+    Args:
+        kind: 任务类型
+        work: 操作函数，接收进度回调，返回结果字典
+        description: 任务说明
+        reads: 只读取的角色路径
+        writes: 会被修改的角色路径
+    """
+    timeout = config_manager.get('role_lock_timeout')
+
+    def run(progress):
+        waiting = (lambda owner: progress(0, 0, f"等待其他操作完成：{owner}")) if progress else None
+        try:
+            with role_locks.acquire(reads, writes, description, timeout, waiting):
+                try:
+                    return work(progress)
+                finally:
+                    # 操作结束后把新计算的文件哈希写入磁盘
+                    hash_cache.flush()
+        finally:
+            # 释放角色锁后再批量清理旧备份，清理时需要获取角色的写锁
+            schedule_retention()
+
+    data = request.json or {}
+    if data.get('wait'):
+        try:
+            return jsonify(run(None))
+        except RoleBusy as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    if timeout == 0:
+        owner = role_locks.conflict(reads, writes)
+        if owner is not None:
+            return jsonify({'success': False, 'error': str(RoleBusy(owner))}), 409
+
+    capture = g.get('profile')
+    if capture:
+        # 请求开启了性能分析时，后台任务在自己的线程中另外记录一份
+        label = {'kind': 'job', 'method': request.method, 'path': request.path, 'job_kind': kind}
+
+        def profiled(job):
+            try:
+                job_capture = profiler.start({**label, 'job_id': job.id}, capture.mode)
+            except ValueError as e:
+                # 任务线程中已有其他分析器（如调试器）在运行，任务照常执行，只是不记录
+                print(f"启动性能分析失败: {e}")
+                return run(job.report)
+            try:
+                return run(job.report)
+            finally:
+                job_capture.stop()
+
+        job = job_manager.submit(kind, profiled, description)
+    else:
+        job = job_manager.submit(kind, lambda job: run(job.report), description)
+    return jsonify({'success': True, 'job_id': job.id, 'job': job.to_dict()}), 202
+
+
+def resolve_profile(value) -> SyncProfile:
+    """
+    解析请求中的同步方案：方案名称或完整的方案对象
+
+    Raises:
+        ValueError: 方案不存在或格式无效
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        profile = config_manager.get_sync_profile(value)
+        if profile is None:
+            raise ValueError(f'同步方案不存在: {value}')
+        return profile
+    return SyncProfile.from_dict(value)
+
+
+def backup_hook(manager: 'BackupManager', clone_strategy: str):
+    """
+    生成复制前备份目标的回调，供 RoleCopier 在写入每个目标前调用
+
+    Returns:
+        before_write 回调，备份失败时该目标不会被覆盖
+    """
+    def before_write(target: RoleInfo, set_message):
+        set_message(f"正在备份: {target}")
+        result = manager.backup_role(target, clone_strategy)
+        if not result['success']:
+            return {**result, 'message': f"备份失败: {result['message']}"}
+        set_message(f"已备份: {target}")
+        return result
+
+    return before_write
+
+
+def role_label(role: RoleInfo) -> str:
+    return f"{role.account} - {role.region} - {role.server} - {role.role}"
+
+
+def role_dir(key: tuple) -> Optional[str]:
+    """角色键 (account, region, server, role) 对应的角色目录路径"""
+    if not role_scanner:
+        return None
+    return str(Path(role_scanner.userdata_path, *key))
+
+
+def backup_role_path(backup_name: str) -> Optional[str]:
+    """备份所属角色的目录路径，备份目录中没有该备份时返回 None"""
+    record = backup_manager.catalog.get(backup_name) if backup_name else None
+    if record is None:
+        return None
+    return role_dir((record['account'], record['region'], record['server'], record['role']))
+
+
+def retention_lease(key: tuple):
+    """
+    清理某个角色的旧备份前获取该角色的写锁，与删除备份相同；
+    角色被占用（如正在从其备份还原）时不等待，返回 None，本次跳过该角色
+    """
+    path = role_dir(key)
+    if path is None:
+        return None
+    try:
+        return role_locks.acquire(writes=[path], owner='清理旧备份', timeout=0)
+    except RoleBusy:
+        return None
 
 
 # ===== 路径相关 API =====
@@ -66,15 +441,20 @@ def resolve_game_path():
     userdata_path = PathResolver.resolve_game_path(base_path)
 
     if userdata_path:
-        # 保存配置
-        config_manager.set('userdata_path', str(userdata_path))
-        config_manager.set('game_path', base_path)
-        config_manager.save()
+        # 等待正在进行的角色操作结束，切换期间不接受新的操作
+        try:
+            lease = role_locks.acquire_all('切换游戏路径', config_manager.get('role_lock_timeout'))
+        except RoleBusy as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
 
-        # 初始化扫描器和备份管理器
-        global role_scanner, backup_manager
-        role_scanner = RoleScanner(str(userdata_path))
-        backup_manager = BackupManager(str(userdata_path), backup_dir=str(BACKUP_DIR))
+        with lease:
+            # 保存配置
+            config_manager.set('userdata_path', str(userdata_path))
+            config_manager.set('game_path', base_path)
+            config_manager.save()
+
+            # 初始化扫描器和备份管理器
+            init_services(str(userdata_path))
 
         return jsonify({
             'success': True,
@@ -100,7 +480,8 @@ def scan_roles():
         return jsonify({
             'success': True,
             'roles': [role.to_dict() for role in roles],
-            'count': len(roles)
+            'count': len(roles),
+            'errors': role_scanner.scan_errors
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -113,7 +494,8 @@ def get_filters():
         return jsonify({'error': '未设置游戏路径'}), 400
 
     try:
-        roles = role_scanner.scan_all_roles()
+        # 直接使用索引中的角色，不再重新扫描
+        roles = role_scanner.get_roles()
         return jsonify({
             'accounts': role_scanner.get_accounts(roles),
             'regions': role_scanner.get_regions(roles),
@@ -123,6 +505,243 @@ def get_filters():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/roles/query', methods=['GET'])
+def query_roles():
+    """
+    查询角色
+
+    参数：q（角色名、拼音首字母或全拼）、account、region、server、
+    match（prefix/fuzzy）、sort、order（asc/desc）、offset、limit
+    """
+    if not role_scanner:
+        return jsonify({'error': '未设置游戏路径'}), 400
+
+    args = request.args
+    limit = min(args.get('limit', 50, type=int), ROLE_QUERY_MAX_LIMIT)
+    start = time.perf_counter()
+    try:
+        result = role_scanner.query_roles(
+            q=args.get('q', ''),
+            account=args.get('account'),
+            region=args.get('region'),
+            server=args.get('server'),
+            match=args.get('match', 'fuzzy'),
+            sort=args.get('sort'),
+            order=args.get('order', 'asc'),
+            offset=args.get('offset', 0, type=int),
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'roles': [role.to_dict() for role in result['roles']],
+        'total': result['total'],
+        'offset': result['offset'],
+        'limit': result['limit'],
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 3)
+    })
+
+
+@app.route('/api/roles/events', methods=['GET'])
+def role_events():
+    """角色变化事件流（Server-Sent Events）"""
+    if not role_watcher:
+        return jsonify({'error': '未启用角色目录监视'}), 400
+
+    watcher = role_watcher
+    events = watcher.subscribe()
+
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = events.get(timeout=15)
+                except queue.Empty:
+                    # 保持连接
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_sse(event['type'], event)
+        finally:
+            watcher.unsubscribe(events)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+
+def bundle_target(role: dict, target) -> RoleInfo:
+    """导入角色包时的目标角色：请求中指定的角色，未指定时为当前 userdata 下的同名角色"""
+    if target:
+        return RoleInfo.from_dict(target)
+    path = role_scanner.userdata_path / role['account'] / role['region'] / role['server'] / role['role']
+    return RoleInfo(role['account'], role['region'], role['server'], role['role'], str(path))
+
+
+def bundle_targets(targets):
+    """
+    生成导入目标解析函数
+
+    Args:
+        targets: 与清单中角色一一对应的目标列表，元素为 None 时导入到同名角色，
+            为 False 时不导入该角色
+
+    Raises:
+        ValueError: 格式无效
+    """
+    if targets is not None and not isinstance(targets, list):
+        raise ValueError('targets 必须是数组')
+    targets = targets or []
+
+    def resolve(role: dict, index: int):
+        target = targets[index] if index < len(targets) else None
+        if target is False:
+            return None
+        return bundle_target(role, target)
+
+    return resolve
+
+
+@app.route('/api/roles/locks', methods=['GET'])
+def list_role_locks():
+    """正在被写入的角色和占用它们的操作"""
+    return jsonify({'success': True, 'locks': role_locks.holders()})
+
+
+@app.route('/api/roles/export', methods=['POST'])
+def export_roles():
+    """
+    导出角色包，直接从磁盘流式生成 tar / zip
+
+    请求体：roles（角色列表）、format（tar/zip）、profile、
+    skip_hashes（接收方已有的哈希，来自 /api/roles/import/check）、
+    manifest_only（只返回清单，不传输文件）
+    """
+    if not role_scanner:
+        return jsonify({'error': '未设置游戏路径'}), 400
+    from backend import role_bundle
+
+    data = request.json or {}
+    roles = [RoleInfo.from_dict(r) for r in data.get('roles', [])]
+    if not roles:
+        return jsonify({'success': False, 'error': '未选择角色'}), 400
+    try:
+        lease = role_locks.acquire([role.path for role in roles], (), f"导出 {len(roles)} 个角色",
+                                   config_manager.get('role_lock_timeout'))
+    except RoleBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    try:
+        bundle_format = role_bundle.resolve_format(data.get('format'))
+        profile = resolve_profile(data.get('profile'))
+        manifest = role_bundle.build_manifest(roles, hash_cache, profile, data.get('skip_hashes'))
+    except ValueError as e:
+        lease.release()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception:
+        lease.release()
+        raise
+    finally:
+        hash_cache.flush()
+
+    if data.get('manifest_only'):
+        lease.release()
+        return jsonify({'success': True, 'manifest': manifest})
+
+    def stream():
+        with job_manager.track('export_roles', f"导出 {len(roles)} 个角色") as job:
+            yield from role_bundle.stream_bundle(roles, manifest, bundle_format, progress=job.report)
+            job.result = {
+                'success': True,
+                'file_count': manifest['file_count'],
+                'total_size': manifest['total_size']
+            }
+
+    filename = f"jx3-roles-{time.strftime('%Y%m%d_%H%M%S')}.{bundle_format}"
+    response = Response(stream(), mimetype=role_bundle.CONTENT_TYPES[bundle_format],
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+    # 传输结束或客户端断开后释放角色锁
+    response.call_on_close(lease.release)
+    return response
+
+
+@app.route('/api/roles/import/check', methods=['POST'])
+def check_import():
+    """
+    检查角色包清单中哪些内容本机已有，返回的 have 可作为导出时的 skip_hashes
+
+    请求体：manifest（导出时 manifest_only 返回的清单）、targets
+    """
+    if not role_scanner:
+        return jsonify({'error': '未设置游戏路径'}), 400
+    from backend import role_bundle
+
+    data = request.json or {}
+    try:
+        manifest = role_bundle.validate_manifest(data.get('manifest'))
+        result = role_bundle.check_bundle(manifest, bundle_targets(data.get('targets')), hash_cache)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        hash_cache.flush()
+    return jsonify({'success': True, **result})
+
+
+@app.route('/api/roles/import', methods=['POST'])
+def import_roles():
+    """
+    导入角色包，边接收边写入目标角色
+
+    请求体为角色包内容，参数放在查询字符串中：format（tar/zip）、
+    targets（JSON 数组，与清单中的角色一一对应）、auto_backup（0/1）、prune（0/1）
+    """
+    if not role_scanner:
+        return jsonify({'error': '未设置游戏路径'}), 400
+    from backend import role_bundle
+
+    args = request.args
+    auto_backup = args.get('auto_backup', '1') != '0'
+    prune = args.get('prune', '1') != '0'
+    backup_strategy = config_manager.get('backup_clone_strategy')
+    manager = backup_manager
+    try:
+        bundle_format = role_bundle.resolve_format(args.get('format'))
+        resolve = bundle_targets(json.loads(args.get('targets', 'null')))
+    except (ValueError, json.JSONDecodeError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    backup = backup_hook(manager, backup_strategy) if auto_backup and manager else None
+    try:
+        lease = role_locks.acquire(owner='导入角色包', timeout=config_manager.get('role_lock_timeout'))
+    except RoleBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+    def before_write(target: RoleInfo, set_message):
+        # 目标角色在读到清单后才知道，逐个加锁；被占用的目标跳过，不等待
+        try:
+            lease.add(writes=[target.path])
+        except RoleBusy as e:
+            return {'success': False, 'message': str(e)}
+        role_copier.discard_undo(target.path)
+        return backup(target, set_message) if backup else None
+
+    try:
+        # 上传内容只能在请求线程中读取，这里同步执行，同时登记为任务以便查询进度
+        with lease, job_manager.track('import_roles', '导入角色包') as job:
+            job.result = role_bundle.import_bundle(request.stream, bundle_format, resolve, hash_cache,
+                                                   before_write=before_write, prune=prune,
+                                                   progress=job.report)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        hash_cache.flush()
+        schedule_retention()
+
+    return jsonify(job.result)
+
+
 # ===== 复制相关 API =====
 
 @app.route('/api/copy/validate', methods=['POST'])
@@ -143,23 +762,33 @@ def copy_single():
     source = RoleInfo.from_dict(data.get('source'))
     target = RoleInfo.from_dict(data.get('target'))
     auto_backup = data.get('auto_backup', True)
-
+    mode = data.get('mode', config_manager.get('copy_mode'))
+    use_hash = data.get('use_hash', config_manager.get('copy_use_hash'))
+    clone_strategy = data.get('clone_strategy', config_manager.get('copy_clone_strategy'))
+    backup_strategy = data.get('backup_clone_strategy', config_manager.get('backup_clone_strategy'))
+    manager = backup_manager
     try:
+        profile = resolve_profile(data.get('profile'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    def work(progress):
         # 备份
-        if auto_backup and backup_manager:
-            backup_result = backup_manager.backup_role(target)
+        if auto_backup and manager:
+            backup_result = manager.backup_role(target, backup_strategy, progress=progress)
             if not backup_result['success']:
-                return jsonify({
+                return {
                     'success': False,
                     'error': f"备份失败: {backup_result['message']}"
-                }), 500
+                }
 
         # 复制
-        result = role_copier.copy_role(source, target)
-        return jsonify(result)
+        return role_copier.copy_role(source, target, mode, use_hash,
+                                     clone_strategy=clone_strategy, progress=progress,
+                                     profile=profile)
 
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return run_or_submit('copy_single', work, f"{role_label(source)} -> {role_label(target)}",
+                         reads=[source.path], writes=[target.path])
 
 
 @app.route('/api/copy/multiple', methods=['POST'])
@@ -169,23 +798,157 @@ def copy_multiple():
     source = RoleInfo.from_dict(data.get('source'))
     targets = [RoleInfo.from_dict(t) for t in data.get('targets', [])]
     auto_backup = data.get('auto_backup', True)
+    mode = data.get('mode', config_manager.get('copy_mode'))
+    use_hash = data.get('use_hash', config_manager.get('copy_use_hash'))
+    clone_strategy = data.get('clone_strategy', config_manager.get('copy_clone_strategy'))
+    backup_strategy = data.get('backup_clone_strategy', config_manager.get('backup_clone_strategy'))
+    manager = backup_manager
+    try:
+        profile = resolve_profile(data.get('profile'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    def work(progress):
+        # 每个目标备份完成后立即开始复制，备份失败的目标不会被覆盖
+        before_write = backup_hook(manager, backup_strategy) if auto_backup and manager else None
+        result = role_copier.copy_to_multiple(source, targets, mode, use_hash,
+                                              clone_strategy=clone_strategy, progress=progress,
+                                              profile=profile, before_write=before_write)
+        return {
+            'success': True,
+            'success_count': result['success_count'],
+            'failed': result['failed'],
+            'mechanisms': result['mechanisms'],
+            'backups': result.get('prepared', [])
+        }
+
+    return run_or_submit('copy_multiple', work, f"{role_label(source)} -> {len(targets)} 个角色",
+                         reads=[source.path], writes=[target.path for target in targets])
+
+
+@app.route('/api/copy/undo', methods=['POST'])
+def undo_copy():
+    """撤销对目标角色最近一次 staged 模式的复制"""
+    data = request.json or {}
+    if not data.get('target'):
+        return jsonify({'success': False, 'error': '缺少目标角色'}), 400
+    target = RoleInfo.from_dict(data['target'])
 
     try:
-        # 先备份所有目标
-        if auto_backup and backup_manager:
-            for target in targets:
-                backup_manager.backup_role(target)
+        lease = role_locks.acquire(writes=[target.path], owner=f"撤销复制 {role_label(target)}",
+                                   timeout=config_manager.get('role_lock_timeout'))
+    except RoleBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
 
-        # 执行复制
-        result = role_copier.copy_to_multiple(source, targets)
-        return jsonify({
+    with lease:
+        result = role_copier.undo_staged(target)
+    return jsonify(result)
+
+
+@app.route('/api/copy/plan', methods=['POST'])
+def plan_copy():
+    """生成同步计划：逐文件差异、传输字节数和预计耗时，不写入任何文件"""
+    data = request.json
+    source = RoleInfo.from_dict(data.get('source'))
+    targets = [RoleInfo.from_dict(t) for t in data.get('targets', [])]
+    mode = data.get('mode', config_manager.get('copy_mode'))
+    use_hash = data.get('use_hash', config_manager.get('copy_use_hash'))
+    include_files = data.get('include_files', True)
+    try:
+        profile = resolve_profile(data.get('profile'))
+        plan = role_copier.plan(source, targets, mode, use_hash, profile=profile)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    hash_cache.flush()
+
+    copy_plans.add(plan)
+    return jsonify({'success': True, 'plan': plan.to_dict(include_files)})
+
+
+@app.route('/api/copy/plan/<plan_id>/execute', methods=['POST'])
+def execute_plan(plan_id):
+    """执行同步计划，每个计划只能执行一次"""
+    # 获得角色锁后才取出计划，角色被占用返回 409 时计划仍然保留，可以再次执行
+    plan = copy_plans.get(plan_id)
+    if not plan:
+        return jsonify({'success': False, 'error': '同步计划不存在或已过期'}), 404
+
+    data = request.json or {}
+    auto_backup = data.get('auto_backup', True)
+    clone_strategy = data.get('clone_strategy', config_manager.get('copy_clone_strategy'))
+    backup_strategy = data.get('backup_clone_strategy', config_manager.get('backup_clone_strategy'))
+    manager = backup_manager
+
+    def work(progress):
+        if copy_plans.pop(plan_id) is None:
+            return {'success': False, 'message': '同步计划已执行或已过期'}
+        before_write = backup_hook(manager, backup_strategy) if auto_backup and manager else None
+        result = role_copier.execute_plan(plan, clone_strategy=clone_strategy, progress=progress,
+                                          before_write=before_write)
+        return {
             'success': True,
             'success_count': result['success_count'],
-            'failed': result['failed']
-        })
+            'failed': result['failed'],
+            'mechanisms': result['mechanisms'],
+            'backups': result.get('prepared', [])
+        }
+
+    return run_or_submit('copy_plan', work, f"{role_label(plan.source)} -> {len(plan.targets)} 个角色",
+                         reads=[plan.source.path], writes=[t.target.path for t in plan.targets])
+
+
+# ===== 同步方案 API =====
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """列出同步方案"""
+    profiles = config_manager.get_sync_profiles()
+    return jsonify({'profiles': [p.to_dict() for p in profiles.values()]})
+
+
+@app.route('/api/profiles/save', methods=['POST'])
+def save_profile():
+    """添加或修改同步方案"""
+    try:
+        profile = SyncProfile.from_dict(request.json)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    config_manager.set_sync_profile(profile)
+    config_manager.save()
+    return jsonify({'success': True, 'profile': profile.to_dict()})
+
+
+@app.route('/api/profiles/delete', methods=['POST'])
+def delete_profile():
+    """删除同步方案"""
+    name = request.json.get('name')
+    if not config_manager.delete_sync_profile(name):
+        return jsonify({'success': False, 'error': f'同步方案不存在: {name}'}), 404
+
+    config_manager.save()
+    return jsonify({'success': True})
 
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/profiles/preview', methods=['POST'])
+def preview_profile():
+    """列出源角色中匹配同步方案的文件"""
+    data = request.json
+    source = RoleInfo.from_dict(data.get('source'))
+    try:
+        profile = resolve_profile(data.get('profile'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if profile is None:
+        return jsonify({'success': False, 'error': '缺少同步方案'}), 400
+
+    files, _ = profile.filter_tree(scan_tree(Path(source.path))[0])
+    return jsonify({
+        'success': True,
+        'files': sorted(files),
+        'count': len(files),
+        'size': sum(entry.size for entry in files.values())
+    })
 
 
 # ===== 备份相关 API =====
@@ -209,7 +972,16 @@ def list_backups():
         return jsonify({'error': '未设置游戏路径'}), 400
 
     limit = request.args.get('limit', type=int)
-    backups = backup_manager.list_backups(limit)
+    role = None
+    if request.args.get('role'):
+        role = RoleInfo(
+            account=request.args.get('account', ''),
+            region=request.args.get('region', ''),
+            server=request.args.get('server', ''),
+            role=request.args.get('role'),
+            path=''
+        )
+    backups = backup_manager.list_backups(limit, role)
 
     return jsonify({
         'backups': [b.to_dict() for b in backups],
@@ -217,6 +989,26 @@ def list_backups():
     })
 
 
+@app.route('/api/backup/create', methods=['POST'])
+def create_backup():
+    """备份角色"""
+    if not backup_manager:
+        return jsonify({'error': '未设置游戏路径'}), 400
+
+    data = request.json
+    role = RoleInfo.from_dict(data.get('role'))
+    clone_strategy = data.get('clone_strategy', config_manager.get('backup_clone_strategy'))
+    backup_format = data.get('format')
+    manager = backup_manager
+
+    def work(progress):
+        return manager.backup_role(role, clone_strategy, progress=progress,
+                                   backup_format=backup_format)
+
+    # 同一角色同时只做一次备份，备份期间不允许写入该角色
+    return run_or_submit('backup', work, role_label(role), writes=[role.path])
+
+
 @app.route('/api/backup/restore', methods=['POST'])
 def restore_backup():
     """还原备份"""
@@ -226,9 +1018,17 @@ def restore_backup():
     data = request.json
     backup_name = data.get('backup_name')
     target = RoleInfo.from_dict(data.get('target'))
+    clone_strategy = data.get('clone_strategy', config_manager.get('backup_clone_strategy'))
+    manager = backup_manager
 
-    result = backup_manager.restore_backup(backup_name, target)
-    return jsonify(result)
+    def work(progress):
+        role_copier.discard_undo(target.path)
+        return manager.restore_backup(backup_name, target, clone_strategy, progress=progress)
+
+    # 备份所属角色持有读锁，还原期间该备份不会被删除
+    role_path = backup_role_path(backup_name)
+    return run_or_submit('restore', work, f"{backup_name} -> {role_label(target)}",
+                         reads=[role_path] if role_path else (), writes=[target.path])
 
 
 @app.route('/api/backup/delete', methods=['POST'])
@@ -239,11 +1039,111 @@ def delete_backup():
 
     data = request.json
     backup_name = data.get('backup_name')
+    manager = backup_manager
+
+    def work(progress):
+        return manager.delete_backup(backup_name)
+
+    # 删除期间不允许同一角色的备份、还原
+    role_path = backup_role_path(backup_name)
+    return run_or_submit('delete', work, backup_name, writes=[role_path] if role_path else ())
+
+
+
+@app.route('/api/backup/train-dictionary', methods=['POST'])
+def train_backup_dictionary():
+    """用角色文件训练 tar.zst 备份的压缩字典"""
+    if not backup_manager or not role_scanner:
+        return jsonify({'error': '未设置游戏路径'}), 400
+
+    data = request.json or {}
+    if data.get('roles'):
+        roles = [RoleInfo.from_dict(r) for r in data['roles']]
+    else:
+        roles = role_scanner.get_roles()
+
+    # 读取样本期间不允许写入角色
+    try:
+        lease = role_locks.acquire_all('训练压缩字典', config_manager.get('role_lock_timeout'))
+    except RoleBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
 
-    result = backup_manager.delete_backup(backup_name)
+    with lease:
+        result = backup_manager.train_dictionary(roles)
     return jsonify(result)
 
 
+@app.route('/api/backup/rebuild-catalog', methods=['POST'])
+def rebuild_backup_catalog():
+    """从磁盘重建备份目录"""
+    if not backup_manager:
+        return jsonify({'error': '未设置游戏路径'}), 400
+
+    # 重建期间完成的备份会在替换目录时丢失，等待所有操作结束后再重建
+    try:
+        lease = role_locks.acquire_all('重建备份目录', config_manager.get('role_lock_timeout'))
+    except RoleBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+    with lease:
+        result = backup_manager.rebuild_catalog()
+    return jsonify(result)
+
+
+@app.route('/api/backup/gc', methods=['POST'])
+def collect_backup_garbage():
+    """删除不再被任何备份清单引用的文件块（如中断的删除留下的）"""
+    if not backup_manager:
+        return jsonify({'error': '未设置游戏路径'}), 400
+
+    # 读取清单到删除文件块期间不能有新备份完成或备份被删除
+    try:
+        lease = role_locks.acquire_all('回收文件块', config_manager.get('role_lock_timeout'))
+    except RoleBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+    with lease:
+        result = backup_manager.collect_garbage()
+    return jsonify({'success': True, 'message': f"已删除 {result['removed']} 个文件块", **result})
+
+
+@app.route('/api/backup/retention', methods=['GET'])
+def get_retention():
+    """获取备份保留策略"""
+    policy = backup_manager.retention if backup_manager else load_retention_policy()
+    return jsonify({'policy': policy.to_dict()})
+
+
+@app.route('/api/backup/retention', methods=['POST'])
+def set_retention():
+    """设置备份保留策略，不立即清理"""
+    try:
+        policy = RetentionPolicy.from_dict(request.json)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    config_manager.set('retention', policy.to_dict())
+    config_manager.save()
+    if backup_manager:
+        backup_manager.retention = policy
+    return jsonify({'success': True, 'policy': policy.to_dict()})
+
+
+@app.route('/api/backup/retention/apply', methods=['POST'])
+def apply_retention():
+    """按保留策略清理所有角色的旧备份，dry_run 为 true 时只返回将被删除的备份"""
+    if not backup_manager:
+        return jsonify({'error': '未设置游戏路径'}), 400
+
+    manager = backup_manager
+    dry_run = (request.json or {}).get('dry_run', False)
+
+    def work(progress):
+        return manager.apply_retention(manager.catalog.roles(), dry_run=dry_run, progress=progress,
+                                       lease=retention_lease)
+
+    return run_or_submit('retention', work, '清理旧备份')
+
 
 @app.route('/api/backup/clear-all', methods=['POST'])
 def clear_all_backups():
@@ -251,9 +1151,85 @@ def clear_all_backups():
     if not backup_manager:
         return jsonify({'error': '未设置游戏路径'}), 400
 
-    result = backup_manager.clear_all_backups()
+    # 等待正在进行的备份、还原等操作结束，清空期间不接受新的操作
+    try:
+        lease = role_locks.acquire_all('清空备份', config_manager.get('role_lock_timeout'))
+    except RoleBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+    with lease:
+        result = backup_manager.clear_all_backups()
     return jsonify(result)
 
+# ===== 后台任务 API =====
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """列出后台任务"""
+    jobs = [job.to_dict() for job in job_manager.list_jobs()]
+    return jsonify({'jobs': jobs, 'count': len(jobs)})
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    查询任务状态
+
+    支持长轮询：传入 since（上次看到的 version）和 wait（秒），
+    任务有更新或超时后才返回。
+    """
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+
+    since = request.args.get('since', type=int)
+    if since is not None:
+        wait = min(request.args.get('wait', 30, type=float), 60)
+        job.wait_for_update(since, wait)
+
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """任务进度事件流（Server-Sent Events），任务结束后关闭"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+
+    def stream():
+        yield 'retry: 3000\n\n'
+        version = -1
+        while True:
+            new_version = job.wait_for_update(version, 15)
+            if new_version == version and not job.finished:
+                yield ': keep-alive\n\n'
+                continue
+            version = new_version
+
+            state = job.to_dict()
+            if job.finished:
+                yield format_sse('done', state)
+                break
+            yield format_sse('progress', state)
+            # 限制推送频率，文件很多时不必每个文件都推送
+            time.sleep(JOB_EVENT_INTERVAL)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """取消任务"""
+    if not job_manager.get(job_id):
+        return jsonify({'error': '任务不存在'}), 404
+
+    if job_manager.cancel(job_id):
+        return jsonify({'success': True, 'message': '已请求取消'})
+    return jsonify({'success': False, 'message': '任务已结束'})
+
+
 # ===== 配置相关 API =====
 
 @app.route('/api/config/get', methods=['GET'])
@@ -268,6 +1244,16 @@ def set_config():
     data = request.json
     config_manager.update(**data)
     config_manager.save()
+    if 'metrics_enabled' in data:
+        metrics.enabled = bool(config_manager.get('metrics_enabled'))
+    if {'io_scheduler_enabled', 'io_initial_concurrency', 'io_max_concurrency'} & data.keys():
+        io_scheduler.configure(enabled=bool(config_manager.get('io_scheduler_enabled')),
+                               initial=config_manager.get('io_initial_concurrency'),
+                               maximum=config_manager.get('io_max_concurrency'))
+    if 'profile_requests' in data:
+        profiler.mode = request_profiler.parse_mode(config_manager.get('profile_requests'))
+    if 'profile_max_captures' in data:
+        profiler.max_captures = config_manager.get('profile_max_captures')
 
     return jsonify({'success': True})
 
@@ -307,28 +1293,127 @@ def open_folder():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ===== 哈希缓存 API =====
+
+@app.route('/api/hash-cache/stats', methods=['GET'])
+def hash_cache_stats():
+    """文件哈希缓存的记录数和命中统计"""
+    return jsonify(hash_cache.stats())
+
+
+@app.route('/api/hash-cache/clear', methods=['POST'])
+def clear_hash_cache():
+    """清空文件哈希缓存"""
+    hash_cache.clear()
+    return jsonify({'success': True})
+
+
+# ===== I/O 调度 API =====
+
+@app.route('/api/io/devices', methods=['GET'])
+def io_devices():
+    """各磁盘设备当前的并发上限、排队数和延迟"""
+    return jsonify({'enabled': io_scheduler.enabled, 'devices': io_scheduler.stats()})
+
+
+# ===== 性能分析 API =====
+
+@app.route('/api/debug/profiles', methods=['GET'])
+def list_request_profiles():
+    """列出最近的性能分析记录，从新到旧"""
+    return jsonify({'success': True, 'mode': profiler.mode, 'profiles': profiler.list_captures()})
+
+
+@app.route('/api/debug/profiles/<capture_id>', methods=['GET'])
+def get_request_profile(capture_id):
+    """性能分析摘要：耗时最多的函数、内存峰值和未释放内存的分配位置"""
+    summary = profiler.get(capture_id)
+    if not summary:
+        return jsonify({'success': False, 'error': '性能分析记录不存在'}), 404
+    return jsonify({'success': True, 'profile': summary})
+
+
+@app.route('/api/debug/profiles/<capture_id>/download', methods=['GET'])
+def download_request_profile(capture_id):
+    """下载性能分析文件，format 为 prof（默认）、collapsed 或 json"""
+    path = profiler.file_path(capture_id, request.args.get('format', request_profiler.FORMAT_PROF))
+    if not path:
+        return jsonify({'success': False, 'error': '性能分析记录不存在'}), 404
+    return send_file(str(path), as_attachment=True, download_name=path.name)
+
+
+@app.route('/api/debug/profiles/clear', methods=['POST'])
+def clear_request_profiles():
+    """删除所有性能分析记录"""
+    return jsonify({'success': True, 'removed': profiler.clear()})
+
+
+# ===== 运行指标 API =====
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    运行指标：默认 Prometheus 文本格式，format=json 或 Accept 为 JSON 时返回 JSON
+    """
+    if request.args.get('format') == 'json' or \
+            request.accept_mimetypes.best == 'application/json':
+        return jsonify(metrics.to_dict())
+    return Response(metrics.to_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/api/metrics/reset', methods=['POST'])
+def reset_metrics():
+    """清空运行指标"""
+    metrics.reset()
+    return jsonify({'success': True})
+
+
 # ===== 健康检查 =====
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """健康检查"""
+    """
+    健康检查
+
+    端口开始监听后立即可用。stage 为启动阶段：starting（服务尚未创建）、
+    index_loaded（已加载保存的角色索引）、services_ready（所有接口可用）、
+    ready（角色索引已与磁盘校验一致）；timings_ms 为各阶段距进程启动的毫秒数
+    """
     return jsonify({
         'status': 'ok',
         'version': '1.0.0',
-        'has_userdata': role_scanner is not None
+        'has_userdata': role_scanner is not None,
+        **startup.to_dict()
     })
 
 
 def main():
-    """启动 Flask 服务"""
-    # 尝试加载上次的配置
-    userdata_path = config_manager.get('userdata_path')
-    if userdata_path and Path(userdata_path).exists():
-        global role_scanner, backup_manager
-        role_scanner = RoleScanner(userdata_path)
-        backup_manager = BackupManager(userdata_path, backup_dir=str(BACKUP_DIR))
-
-    app.run(host='127.0.0.1', port=5000, debug=False)
+    """
+    启动服务
+
+    默认使用 waitress（多线程 WSGI 服务器），未安装或指定 --dev 时使用 Flask 自带的开发服务器
+    """
+    parser = argparse.ArgumentParser(description='剑网三角色配置同步后端')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--dev', action='store_true', help='使用 Flask 开发服务器')
+    args = parser.parse_args()
+
+    # 先监听端口，再在后台加载上次的配置和角色索引，健康检查不必等待服务创建
+    if HAS_WAITRESS and not args.dev:
+        server = create_server(app, host=args.host, port=args.port,
+                               threads=config_manager.get('server_threads'))
+        server.print_listen("Serving on http://{}:{}")
+        run_server = server.run
+    else:
+        if not args.dev:
+            print("未安装 waitress，使用 Flask 开发服务器")
+        server = make_server(args.host, args.port, app, threaded=True)
+        run_server = server.serve_forever
+    startup.mark('listening')
+
+    begin_warm_start()
+    run_server()
 
 
 if __name__ == '__main__':
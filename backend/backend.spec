@@ -7,7 +7,12 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['flask', 'flask_cors', 'win32com', 'win32com.client'],
+    # backend/__init__.py 按需导入子模块，PyInstaller 无法静态分析，需要显式列出
+    hiddenimports=['flask', 'flask_cors', 'waitress', 'win32com', 'win32com.client',
+                   'backend.models', 'backend.path_resolver', 'backend.role_scanner',
+                   'backend.role_watcher', 'backend.role_copier', 'backend.backup_manager',
+                   'backend.blob_store', 'backend.hash_cache', 'backend.config_manager',
+                   'backend.sync_profile', 'backend.job_manager'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
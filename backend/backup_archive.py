@@ -0,0 +1,305 @@
+"""
+备份归档模块
+将角色目录流式写入单个压缩文件（tar+zstd 或 zip），并支持流式读取和还原
+"""
+import io
+import json
+import os
+import random
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+from .io_scheduler import io_scheduler
+from .progress import ProgressReporter
+from .tree_diff import FileEntry
+
+
+# 备份格式
+FORMAT_STORE = 'store'      # 内容寻址存储（默认）
+FORMAT_TAR_ZSTD = 'tar.zst'
+FORMAT_ZIP = 'zip'
+FORMATS = (FORMAT_STORE, FORMAT_TAR_ZSTD, FORMAT_ZIP)
+ARCHIVE_FORMATS = (FORMAT_TAR_ZSTD, FORMAT_ZIP)
+
+# 归档中的第一个成员，记录备份信息和文件列表
+HEADER_NAME = '.backup-manifest.json'
+DICTIONARY_SUFFIX = '.zdict'
+CHUNK_SIZE = 1024 * 1024
+
+
+def resolve_format(backup_format: str) -> str:
+    """
+    确定实际使用的归档格式
+
+    未安装 zstandard 时 tar.zst 退化为 zip。
+
+    Raises:
+        ValueError: 不支持的格式
+    """
+    if backup_format not in FORMATS:
+        raise ValueError(f'不支持的备份格式: {backup_format}')
+    if backup_format == FORMAT_TAR_ZSTD and not HAS_ZSTD:
+        print("未安装 zstandard，改用 zip 格式备份")
+        return FORMAT_ZIP
+    return backup_format
+
+
+def archive_suffix(backup_format: str) -> str:
+    """归档文件扩展名"""
+    return f'.{backup_format}'
+
+
+def write_archive(path: Path, root: Path, files: Dict[str, FileEntry], header: dict,
+                  backup_format: str, level: int = 3, dictionary: 'zstandard.ZstdCompressionDict' = None,
+                  reporter: ProgressReporter = None):
+    """
+    将目录流式写入归档
+
+    header 作为第一个成员写入，读取备份信息时只需解压开头一小段。
+    先写入临时文件，完成后再替换为正式文件。
+
+    Args:
+        path: 归档文件路径
+        root: 源目录
+        files: 相对路径 -> 文件信息
+        header: 备份信息（包括文件列表）
+        backup_format: tar.zst 或 zip
+        level: 压缩级别，zip 最大为 9
+        dictionary: zstd 压缩字典，仅 tar.zst 使用
+        reporter: 进度汇报，每写入一个文件调用一次 file_done
+    """
+    tmp = path.with_name(path.name + '.partial')
+    header_data = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+    try:
+        if backup_format == FORMAT_TAR_ZSTD:
+            compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+            with open(tmp, 'wb') as raw, compressor.stream_writer(raw, closefd=False) as stream:
+                with tarfile.open(fileobj=stream, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                    info = tarfile.TarInfo(HEADER_NAME)
+                    info.size = len(header_data)
+                    tar.addfile(info, io.BytesIO(header_data))
+
+                    for rel in sorted(files):
+                        with io_scheduler.slot(root / rel, path, size=files[rel].size), \
+                                open(root / rel, 'rb') as f:
+                            info = tar.gettarinfo(arcname=rel, fileobj=f)
+                            tar.addfile(info, f)
+                        if reporter:
+                            reporter.file_done(info.size, advance=1)
+
+        elif backup_format == FORMAT_ZIP:
+            with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED,
+                                 compresslevel=max(0, min(level, 9))) as zf:
+                zf.writestr(HEADER_NAME, header_data)
+                for rel in sorted(files):
+                    with io_scheduler.slot(root / rel, path, size=files[rel].size):
+                        zf.write(root / rel, arcname=rel)
+                    if reporter:
+                        reporter.file_done(files[rel].size, advance=1)
+        else:
+            raise ValueError(f'不支持的归档格式: {backup_format}')
+
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def read_header(path: Path, dictionaries: Path = None) -> dict:
+    """
+    读取归档中的备份信息
+
+    Args:
+        path: 归档文件路径
+        dictionaries: 压缩字典目录
+
+    Returns:
+        备份信息
+    """
+    with _ArchiveReader(path, dictionaries) as members:
+        name, f = next(members)
+        if name != HEADER_NAME:
+            raise ValueError(f'归档缺少备份信息: {path.name}')
+        return json.loads(f.read().decode('utf-8'))
+
+
+def extract_archive(path: Path, target: Path, dictionaries: Path = None,
+                    reporter: ProgressReporter = None) -> dict:
+    """
+    流式解压归档到目标目录，并按备份信息恢复目录结构和修改时间
+
+    Args:
+        path: 归档文件路径
+        target: 目标目录（应已存在且为空）
+        dictionaries: 压缩字典目录
+        reporter: 进度汇报
+
+    Returns:
+        备份信息
+    """
+    header = None
+    entries = {}
+
+    with _ArchiveReader(path, dictionaries) as members:
+        for name, f in members:
+            if header is None:
+                if name != HEADER_NAME:
+                    raise ValueError(f'归档缺少备份信息: {path.name}')
+                header = json.loads(f.read().decode('utf-8'))
+                entries = {entry['path']: entry for entry in header['files']}
+                for rel_dir in header['dirs']:
+                    (target / _safe_path(rel_dir)).mkdir(parents=True, exist_ok=True)
+                continue
+
+            file_path = target / _safe_path(name)
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            entry = entries.get(name)
+            with io_scheduler.slot(path, file_path, size=entry['size'] if entry else 0), \
+                    open(file_path, 'wb') as out:
+                shutil.copyfileobj(f, out, CHUNK_SIZE)
+
+            if entry:
+                os.utime(file_path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+            if reporter:
+                reporter.file_done(entry['size'] if entry else file_path.stat().st_size, advance=1)
+
+    if header is None:
+        raise ValueError(f'归档为空: {path.name}')
+    return header
+
+
+def train_dictionary(samples: Iterable[Path], dict_size: int = 112640,
+                     max_samples: int = 2000, max_sample_size: int = 128 * 1024) -> 'zstandard.ZstdCompressionDict':
+    """
+    用角色文件训练 zstd 压缩字典
+
+    Args:
+        samples: 样本文件路径
+        dict_size: 字典大小（字节）
+        max_samples: 最多使用的样本数，超出时随机抽取
+        max_sample_size: 每个样本最多读取的字节数
+
+    Returns:
+        压缩字典
+    """
+    if not HAS_ZSTD:
+        raise RuntimeError('未安装 zstandard，无法训练压缩字典')
+
+    paths = list(samples)
+    if len(paths) > max_samples:
+        paths = random.sample(paths, max_samples)
+
+    data: List[bytes] = []
+    for sample in paths:
+        try:
+            with open(sample, 'rb') as f:
+                chunk = f.read(max_sample_size)
+        except OSError:
+            continue
+        if chunk:
+            data.append(chunk)
+
+    if len(data) < 8:
+        raise ValueError('样本文件太少，无法训练压缩字典')
+
+    return zstandard.train_dictionary(dict_size, data)
+
+
+def save_dictionary(dictionary: 'zstandard.ZstdCompressionDict', directory: Path) -> Path:
+    """保存压缩字典，文件名为字典 ID"""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{dictionary.dict_id()}{DICTIONARY_SUFFIX}'
+    path.write_bytes(dictionary.as_bytes())
+    return path
+
+
+def load_dictionary(path: Path) -> 'zstandard.ZstdCompressionDict':
+    """加载压缩字典"""
+    return zstandard.ZstdCompressionDict(path.read_bytes())
+
+
+def latest_dictionary(directory: Path) -> Optional[Path]:
+    """最近训练的压缩字典"""
+    if not directory.is_dir():
+        return None
+    candidates = list(directory.glob(f'*{DICTIONARY_SUFFIX}'))
+    if not candidates:
+        return None
+    return max(candidates, key=lambda p: p.stat().st_mtime_ns)
+
+
+class _ArchiveReader:
+    """
+    按顺序遍历归档成员的上下文管理器
+
+    产生 (相对路径, 可读文件对象)，只包含普通文件。
+    tar.zst 以流方式解压，不会读取整个归档。
+    """
+
+    def __init__(self, path: Path, dictionaries: Path = None):
+        self.path = Path(path)
+        self.dictionaries = dictionaries
+        self._closers = []
+
+    def __enter__(self):
+        if self.path.name.endswith(archive_suffix(FORMAT_ZIP)):
+            zf = zipfile.ZipFile(self.path)
+            self._closers.append(zf)
+            return self._iter_zip(zf)
+
+        if not HAS_ZSTD:
+            raise RuntimeError('未安装 zstandard，无法读取 tar.zst 备份')
+
+        raw = open(self.path, 'rb')
+        self._closers.append(raw)
+        dict_id = zstandard.get_frame_parameters(raw.read(18)).dict_id
+        raw.seek(0)
+
+        dictionary = None
+        if dict_id:
+            dict_path = self.dictionaries / f'{dict_id}{DICTIONARY_SUFFIX}' if self.dictionaries else None
+            if dict_path is None or not dict_path.exists():
+                raise FileNotFoundError(f'缺少压缩字典: {dict_id}')
+            dictionary = load_dictionary(dict_path)
+
+        reader = zstandard.ZstdDecompressor(dict_data=dictionary).stream_reader(raw, closefd=False)
+        self._closers.append(reader)
+        tar = tarfile.open(fileobj=reader, mode='r|')
+        self._closers.append(tar)
+        return self._iter_tar(tar)
+
+    def __exit__(self, exc_type, exc, tb):
+        for closer in reversed(self._closers):
+            closer.close()
+        self._closers.clear()
+
+    @staticmethod
+    def _iter_tar(tar: tarfile.TarFile):
+        for member in tar:
+            if member.isfile():
+                yield member.name, tar.extractfile(member)
+
+    @staticmethod
+    def _iter_zip(zf: zipfile.ZipFile):
+        for info in zf.infolist():
+            if not info.is_dir():
+                with zf.open(info) as f:
+                    yield info.filename, f
+
+
+def _safe_path(name: str) -> str:
+    """校验归档中的相对路径，拒绝绝对路径和上级目录"""
+    path = PurePosixPath(name)
+    if path.is_absolute() or '..' in path.parts:
+        raise ValueError(f'归档中包含不安全的路径: {name}')
+    return str(path)
@@ -0,0 +1,218 @@
+"""
+备份目录模块
+用 SQLite 记录每个备份的角色、时间、大小等信息，列出和筛选备份时不再遍历磁盘
+"""
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+
+
+class BackupCatalog:
+    """
+    备份目录
+
+    每次写入或删除备份时同步更新；目录丢失或与磁盘不一致时，
+    由 BackupManager.rebuild_catalog() 从磁盘重建。
+    清单备份引用的文件块记录在 blobs 表中，删除备份后只需检查它引用过的文件块。
+    """
+
+    SCHEMA_VERSION = 2
+    COLUMNS = ('name', 'account', 'region', 'server', 'role', 'format', 'path',
+               'created_at', 'timestamp', 'file_count', 'size', 'checksum')
+
+    def __init__(self, db_path: str):
+        """
+        初始化备份目录
+
+        Args:
+            db_path: 数据库文件路径
+        """
+        self.db_path = Path(db_path)
+        # 数据库文件是新建的，需要从磁盘重建
+        self.is_new = not self.db_path.exists()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+            if version not in (0, self.SCHEMA_VERSION):
+                # 结构不兼容时重建，数据可以从磁盘恢复
+                self._conn.execute('DROP TABLE IF EXISTS backups')
+                self._conn.execute('DROP TABLE IF EXISTS blobs')
+                self.is_new = True
+
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS backups (
+                    name TEXT PRIMARY KEY,
+                    account TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    server TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    timestamp REAL NOT NULL,
+                    file_count INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    checksum TEXT
+                )
+            ''')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_backups_role '
+                'ON backups (account, region, server, role, timestamp DESC)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_backups_timestamp ON backups (timestamp DESC)'
+            )
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS blobs (
+                    name TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (name, hash)
+                ) WITHOUT ROWID
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_blobs_hash ON blobs (hash)')
+            self._conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+
+    def add(self, record: dict):
+        """
+        记录一个备份
+
+        Args:
+            record: 备份信息，键见 COLUMNS；清单备份可带 'blobs'（引用的文件块哈希）
+        """
+        with self._lock, self._conn:
+            self._insert(record)
+
+    def remove(self, name: str):
+        """删除备份记录"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM backups WHERE name = ?', (name,))
+            self._conn.execute('DELETE FROM blobs WHERE name = ?', (name,))
+
+    def blobs(self, name: str) -> Set[str]:
+        """备份引用的文件块哈希"""
+        with self._lock:
+            rows = self._conn.execute('SELECT hash FROM blobs WHERE name = ?', (name,)).fetchall()
+        return {row[0] for row in rows}
+
+    def referenced(self, hashes: Iterable[str]) -> Set[str]:
+        """给定哈希中仍被某个备份引用的部分"""
+        hashes = list(hashes)
+        found = set()
+        with self._lock:
+            # 分批查询，避免超过 SQLite 的参数个数限制
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                placeholders = ', '.join('?' for _ in batch)
+                rows = self._conn.execute(
+                    f'SELECT DISTINCT hash FROM blobs WHERE hash IN ({placeholders})', batch
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def get(self, name: str) -> Optional[dict]:
+        """按名称查找备份记录"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM backups WHERE name = ?', (name,)).fetchone()
+        return dict(row) if row else None
+
+    def query(self, account: str = None, region: str = None, server: str = None,
+              role: str = None, limit: int = None, offset: int = 0) -> List[dict]:
+        """
+        按角色筛选备份，按时间从新到旧排列
+
+        Args:
+            account: 账号，None 表示不限
+            region: 大区
+            server: 服务器
+            role: 角色名
+            limit: 限制返回数量
+            offset: 跳过的数量
+
+        Returns:
+            备份记录列表
+        """
+        conditions = []
+        params = []
+        for column, value in (('account', account), ('region', region),
+                              ('server', server), ('role', role)):
+            if value:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+
+        sql = 'SELECT * FROM backups'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY timestamp DESC'
+        if limit:
+            sql += ' LIMIT ? OFFSET ?'
+            params.extend([limit, offset])
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self) -> int:
+        """备份数量"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM backups').fetchone()[0]
+
+    def total_size(self) -> int:
+        """所有备份的总大小"""
+        with self._lock:
+            return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM backups').fetchone()[0]
+
+    def roles(self) -> List[tuple]:
+        """有备份的角色 [(account, region, server, role)]"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT DISTINCT account, region, server, role FROM backups'
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def oldest(self, limit: int, offset: int = 0) -> List[dict]:
+        """按时间从旧到新取备份记录"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM backups ORDER BY timestamp ASC LIMIT ? OFFSET ?', (limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def replace_all(self, records: List[dict]):
+        """用给定记录替换整个目录（重建时使用）"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM backups')
+            self._conn.execute('DELETE FROM blobs')
+            for record in records:
+                self._insert(record)
+        self.is_new = False
+
+    def clear(self):
+        """清空目录"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM backups')
+            self._conn.execute('DELETE FROM blobs')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _insert(self, record: dict):
+        placeholders = ', '.join('?' for _ in self.COLUMNS)
+        self._conn.execute(
+            f'INSERT OR REPLACE INTO backups ({", ".join(self.COLUMNS)}) VALUES ({placeholders})',
+            [record.get(column) for column in self.COLUMNS]
+        )
+        blobs = record.get('blobs')
+        if blobs:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO blobs (name, hash) VALUES (?, ?)',
+                [(record['name'], digest) for digest in set(blobs)]
+            )
+
@@ -2,17 +2,57 @@
 备份管理模块
 处理角色数据的备份和还原
 """
+import contextlib
+import hashlib
+import json
+import os
 import shutil
+import threading
+from collections import Counter
 from pathlib import Path
 from datetime import datetime
-from typing import List
+from typing import Callable, ContextManager, Iterable, List, Optional, Set, Tuple
 from .models import RoleInfo, BackupInfo
+from .backup_archive import (
+    ARCHIVE_FORMATS, FORMAT_STORE, archive_suffix, extract_archive, latest_dictionary,
+    load_dictionary, read_header, resolve_format, save_dictionary, train_dictionary, write_archive
+)
+from .backup_catalog import BackupCatalog
+from .blob_store import BlobStore
+from .file_cloner import STRATEGIES, STRATEGY_HARDLINK, STRATEGY_REFLINK, clone_file
+from .hash_cache import HashCache
+from .io_scheduler import io_scheduler
+from .metrics import metrics, timed
+from .progress import ProgressReporter
+from .retention import RetentionPolicy, role_key, select_expired, unique_roles
+from .tree_diff import scan_tree
 
 
 class BackupManager:
-    """备份管理器"""
-
-    def __init__(self, userdata_path: str, max_backups: int = None, backup_dir: str = None):
+    """
+    备份管理器
+
+    默认以内容寻址方式保存：文件内容按哈希存入 objects/，每个备份只是
+    manifests/ 下的一份清单。也可以把每个备份写成 archives/ 下的单个
+    压缩文件（tar.zst 或 zip），归档开头记录与清单相同的备份信息。
+    旧版本产生的整目录备份仍可列出、还原和删除。
+    所有备份都记录在 SQLite 目录（catalog.sqlite3）中，列出和筛选备份只查询目录。
+    """
+
+    OBJECTS_DIR = 'objects'
+    MANIFESTS_DIR = 'manifests'
+    ARCHIVES_DIR = 'archives'
+    DICTIONARIES_DIR = 'dictionaries'
+    CATALOG_FILE = 'catalog.sqlite3'
+    MANIFEST_VERSION = 1
+    # 旧版整目录备份在目录中的格式名
+    FORMAT_LEGACY = 'legacy'
+
+    def __init__(self, userdata_path: str, max_backups: int = None, backup_dir: str = None,
+                 clone_strategy: str = STRATEGY_REFLINK, backup_format: str = FORMAT_STORE,
+                 compression_level: int = 3, use_dictionary: bool = False,
+                 hash_cache: HashCache = None, retention: RetentionPolicy = None,
+                 defer_retention: bool = False):
         """
         初始化备份管理器
 
@@ -20,6 +60,14 @@ class BackupManager:
             userdata_path: userdata 目录路径
             max_backups: 每个角色最多保留的备份数量，None表示不限制
             backup_dir: 自定义备份目录路径，如果不指定则使用默认路径
+            clone_strategy: 默认克隆策略，见 file_cloner.STRATEGIES
+            backup_format: 默认备份格式，见 backup_archive.FORMATS
+            compression_level: 归档压缩级别（zstd 1-22，zip 最大 9）
+            use_dictionary: tar.zst 归档是否使用训练好的压缩字典
+            hash_cache: 文件哈希缓存，未变化的角色文件和归档不再重复计算哈希
+            retention: 保留策略，默认只按 max_backups 保留
+            defer_retention: 为 True 时备份后只记录角色，由 apply_retention() 批量清理；
+                否则每次备份后立即清理该角色的旧备份
         """
         self.userdata_path = Path(userdata_path)
 
@@ -30,148 +78,525 @@ class BackupManager:
             self.backup_dir = self.userdata_path.parent / "userdata_backup"
 
         self.max_backups = max_backups
+        self.clone_strategy = clone_strategy
+        self.backup_format = backup_format
+        self.compression_level = compression_level
+        self.use_dictionary = use_dictionary
+        self.hash_cache = hash_cache or HashCache()
+        self.retention = retention or RetentionPolicy(keep_last=max_backups)
+        self.defer_retention = defer_retention
+        # 有新备份、等待按保留策略清理的角色
+        self._pending_roles = set()
+        self._retention_lock = threading.Lock()
 
         # 确保备份目录存在
         self.backup_dir.mkdir(parents=True, exist_ok=True)
 
-    def backup_role(self, role: RoleInfo) -> dict:
+        self.manifests_dir = self.backup_dir / self.MANIFESTS_DIR
+        self.manifests_dir.mkdir(exist_ok=True)
+        self.blob_store = BlobStore(str(self.backup_dir / self.OBJECTS_DIR))
+        self.archives_dir = self.backup_dir / self.ARCHIVES_DIR
+        self.archives_dir.mkdir(exist_ok=True)
+        self.dictionaries_dir = self.backup_dir / self.DICTIONARIES_DIR
+
+        self.catalog = BackupCatalog(str(self.backup_dir / self.CATALOG_FILE))
+        if self.catalog.is_new:
+            self.rebuild_catalog()
+
+    @timed('backup')
+    def backup_role(self, role: RoleInfo, clone_strategy: str = None,
+                    progress: Callable = None, backup_format: str = None) -> dict:
         """
         备份角色数据
 
+        hardlink 策略下文件块与角色文件共用数据，角色文件被原地修改时
+        备份也会随之改变，只适合游戏以替换方式写入文件的场景。
+
         Args:
             role: 角色信息
+            clone_strategy: 克隆策略，默认使用 self.clone_strategy
+            progress: 进度回调 (current, total, message, files_done, bytes_done)，按文件计步
+            backup_format: 备份格式，默认使用 self.backup_format；归档格式不使用克隆策略
 
         Returns:
-            操作结果 {'success': bool, 'message': str, 'backup_path': str}
+            操作结果 {'success': bool, 'message': str, 'backup_path': str,
+                      'mechanisms': {机制: 新写入的文件块数}}
         """
+        strategy = clone_strategy or self.clone_strategy
+        if strategy not in STRATEGIES:
+            return {'success': False, 'message': f'不支持的克隆策略: {strategy}'}
+        try:
+            backup_format = resolve_format(backup_format or self.backup_format)
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}
+
         try:
             role_path = Path(role.path)
 
             if not role_path.exists():
                 return {'success': False, 'message': '角色路径不存在'}
 
-            # 生成备份名称
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_name = f"{role.account}_{role.region}_{role.server}_{role.role}_{timestamp}"
-            backup_path = self.backup_dir / backup_name
+            # 生成备份名称，精确到微秒，同一秒内的多次备份不会重名
+            now = datetime.now()
+            timestamp = now.strftime("%Y%m%d_%H%M%S_%f")
+            backup_name = f"{self._role_prefix(role)}{timestamp}"
+            manifest_path = self._manifest_path(backup_name)
+
+            if self._backup_exists(backup_name):
+                return {'success': False, 'message': f'备份已存在: {backup_name}'}
 
-            # 复制到备份目录
-            shutil.copytree(role_path, backup_path)
+            file_entries, dir_set = scan_tree(role_path)
+            reporter = ProgressReporter(progress, len(file_entries), f"正在备份: {role}", op='backup')
+
+            if backup_format in ARCHIVE_FORMATS:
+                archive_path, header = self._backup_to_archive(
+                    role, role_path, backup_name, now, file_entries, dir_set, backup_format, reporter
+                )
+                self.catalog.add(self._catalog_record(header, archive_path))
+                self._after_backup(role)
+                return {
+                    'success': True,
+                    'message': '备份成功',
+                    'backup_path': str(archive_path),
+                    'mechanisms': {}
+                }
+
+            # 文件内容存入文件块存储，备份本身只记录清单
+            files = []
+            total_size = 0
+            digests = []
+            mechanisms = Counter()
+            try:
+                for rel in sorted(file_entries):
+                    entry = file_entries[rel]
+                    with io_scheduler.slot(role_path / rel, self.blob_store.root, size=entry.size):
+                        digest = self.hash_cache.hash_file(role_path / rel, entry)
+                        digest, mechanism = self.blob_store.put_file(role_path / rel, strategy, digest)
+                    digests.append(digest)
+                    if mechanism:
+                        mechanisms[mechanism] += 1
+                    files.append({
+                        'path': rel,
+                        'hash': digest,
+                        'size': entry.size,
+                        'mtime_ns': entry.mtime_ns
+                    })
+                    total_size += entry.size
+                    reporter.file_done(entry.size, advance=1)
+
+                manifest = {
+                    'version': self.MANIFEST_VERSION,
+                    'name': backup_name,
+                    'role': role.to_dict(),
+                    'created_at': now.strftime("%Y-%m-%d %H:%M:%S"),
+                    'timestamp': now.timestamp(),
+                    'size': total_size,
+                    'file_count': len(files),
+                    'dirs': sorted(dir_set),
+                    'files': files
+                }
+                self._write_manifest(manifest_path, manifest)
+                self.catalog.add(self._catalog_record(manifest, manifest_path))
+            finally:
+                self.blob_store.release(digests)
 
             # 清理旧备份
-            self.cleanup_old_backups(role)
+            self._after_backup(role)
 
             return {
                 'success': True,
                 'message': '备份成功',
-                'backup_path': str(backup_path)
+                'backup_path': str(manifest_path),
+                'mechanisms': dict(mechanisms)
             }
 
         except Exception as e:
             return {'success': False, 'message': f'备份失败: {str(e)}'}
 
-    def cleanup_old_backups(self, role: RoleInfo):
+    def _backup_to_archive(self, role: RoleInfo, role_path: Path, backup_name: str, now: datetime,
+                           file_entries: dict, dir_set: set, backup_format: str,
+                           reporter: ProgressReporter) -> Tuple[Path, dict]:
+        """
+        将角色目录写成单个归档文件
+
+        Returns:
+            (归档文件路径, 写在归档开头的备份信息)
+        """
+        header = {
+            'version': self.MANIFEST_VERSION,
+            'name': backup_name,
+            'format': backup_format,
+            'role': role.to_dict(),
+            'created_at': now.strftime("%Y-%m-%d %H:%M:%S"),
+            'timestamp': now.timestamp(),
+            'size': sum(entry.size for entry in file_entries.values()),
+            'file_count': len(file_entries),
+            'dirs': sorted(dir_set),
+            'files': [
+                {'path': rel, 'size': entry.size, 'mtime_ns': entry.mtime_ns}
+                for rel, entry in sorted(file_entries.items())
+            ]
+        }
+
+        dictionary = None
+        if self.use_dictionary:
+            dict_path = latest_dictionary(self.dictionaries_dir)
+            if dict_path:
+                dictionary = load_dictionary(dict_path)
+
+        archive_path = self.archives_dir / f"{backup_name}{archive_suffix(backup_format)}"
+        write_archive(archive_path, role_path, file_entries, header, backup_format,
+                      self.compression_level, dictionary, reporter)
+        return archive_path, header
+
+    def train_dictionary(self, roles: List[RoleInfo], dict_size: int = 112640) -> dict:
         """
-        清理旧备份，只保留最近的 max_backups 个（如果设置了限制）
+        用角色文件训练 tar.zst 备份使用的压缩字典
+
+        Args:
+            roles: 提供样本文件的角色
+            dict_size: 字典大小（字节）
+
+        Returns:
+            操作结果 {'success': bool, 'message': str, 'dict_id': int}
+        """
+        try:
+            samples = []
+            for role in roles:
+                role_path = Path(role.path)
+                files, _ = scan_tree(role_path)
+                samples.extend(role_path / rel for rel, entry in files.items() if entry.size)
+
+            dictionary = train_dictionary(samples, dict_size)
+            save_dictionary(dictionary, self.dictionaries_dir)
+            return {
+                'success': True,
+                'message': f'压缩字典训练完成（{len(samples)} 个样本文件）',
+                'dict_id': dictionary.dict_id()
+            }
+
+        except Exception as e:
+            return {'success': False, 'message': f'训练压缩字典失败: {str(e)}'}
+
+    def cleanup_old_backups(self, role: RoleInfo) -> dict:
+        """
+        按保留策略清理单个角色的旧备份
 
         Args:
             role: 角色信息
+
+        Returns:
+            结果格式同 apply_retention
         """
-        # 如果不限制备份数量，则不清理
-        if self.max_backups is None:
-            return
+        return self.apply_retention([role])
 
-        prefix = f"{role.account}_{role.region}_{role.server}_{role.role}_"
-        backups = sorted(
-            [d for d in self.backup_dir.iterdir()
-             if d.is_dir() and d.name.startswith(prefix)],
-            key=lambda x: x.stat().st_mtime,
-            reverse=True
-        )
+    def _after_backup(self, role: RoleInfo):
+        """备份完成后清理旧备份，或记录下来等待批量清理"""
+        if self.defer_retention:
+            with self._retention_lock:
+                self._pending_roles.add(role_key(role))
+        else:
+            self.apply_retention([role])
 
-        # 删除超过限制的旧备份
-        for old_backup in backups[self.max_backups:]:
-            try:
-                shutil.rmtree(old_backup)
-            except Exception as e:
-                print(f"删除旧备份失败: {e}")
+    def has_pending_retention(self) -> bool:
+        """是否有等待批量清理的角色"""
+        with self._retention_lock:
+            return bool(self._pending_roles) and not self.retention.is_empty
+
+    def apply_retention(self, roles: Iterable = None, dry_run: bool = False,
+                        progress: Callable = None,
+                        lease: Callable[[tuple], Optional[ContextManager]] = None) -> dict:
+        """
+        按保留策略清理旧备份
+
+        只查询给定角色的备份（目录按角色建有索引），全局配额从最旧的备份开始检查，
+        清单备份删除后只回收它们引用过、且不再被其他备份引用的文件块，
+        开销与过期的备份数成正比，与备份总数无关。
+
+        Args:
+            roles: 要检查的角色（RoleInfo 或 (account, region, server, role)），
+                默认为备份后等待清理的角色
+            dry_run: 只列出将被删除的备份，不实际删除
+            progress: 进度回调 (current, total, message, files_done, bytes_done)，按备份计步
+            lease: 删除某个角色的备份前获取该角色写锁的函数，参数为角色键
+                (account, region, server, role)，返回在删除期间持有的上下文管理器；
+                角色正被使用（如正在从其备份还原）时返回 None，该角色的备份本次跳过，
+                留待下次清理
+
+        Returns:
+            {'success': bool, 'message': str, 'removed': [备份名称], 'size': 删除的备份大小,
+             'blobs': {'removed': int, 'freed': int}, 'errors': [dict], 'skipped': [备份名称],
+             'dry_run': bool}
+        """
+        if roles is None:
+            with self._retention_lock:
+                keys = list(self._pending_roles)
+                self._pending_roles.clear()
+        else:
+            keys = unique_roles(roles)
+
+        policy = self.retention
+        result = {'success': True, 'message': '没有需要清理的备份', 'removed': [], 'size': 0,
+                  'blobs': {'removed': 0, 'freed': 0}, 'errors': [], 'skipped': [], 'dry_run': dry_run}
+        if policy.is_empty:
+            return result
 
-    def list_backups(self, limit: int = None) -> List[BackupInfo]:
+        try:
+            expired = []
+            for key in keys:
+                expired.extend(select_expired(self.catalog.query(*key), policy))
+            if policy.max_total_size:
+                expired.extend(self._over_total_quota(expired, policy.max_total_size))
+        except Exception as e:
+            return {**result, 'success': False, 'message': f'清理旧备份失败: {str(e)}'}
+
+        if dry_run:
+            result['removed'] = [r['name'] for r in expired]
+            result['size'] = sum(r['size'] for r in expired)
+            result['message'] = f'将删除 {len(expired)} 个备份'
+            return result
+
+        by_role = {}
+        for record in expired:
+            by_role.setdefault(role_key(record), []).append(record)
+
+        reporter = ProgressReporter(progress, len(expired), '正在清理旧备份')
+        candidates = set()
+        # 清理旧备份不着急，让出磁盘给复制、备份和还原
+        with io_scheduler.background():
+            for key, records in by_role.items():
+                held = lease(key) if lease else contextlib.nullcontext()
+                if held is None:
+                    result['skipped'].extend(r['name'] for r in records)
+                    with self._retention_lock:
+                        self._pending_roles.add(key)
+                    reporter.step(advance=len(records))
+                    continue
+                with held:
+                    for record in records:
+                        try:
+                            candidates |= self._delete_record(record)
+                            result['removed'].append(record['name'])
+                            result['size'] += record['size']
+                        except Exception as e:
+                            print(f"删除旧备份失败: {e}")
+                            result['errors'].append({'name': record['name'], 'error': str(e)})
+                        reporter.step()
+
+            result['blobs'] = self._release_blobs(candidates)
+        result['message'] = f"已删除 {len(result['removed'])} 个旧备份"
+        if result['skipped']:
+            result['message'] += f"，{len(result['skipped'])} 个备份所属角色正在使用，留待下次清理"
+        return result
+
+    def _over_total_quota(self, expired: List[dict], max_total_size: int) -> List[dict]:
+        """
+        所有备份总大小超过配额时，从最旧的备份开始补充过期备份（跳过各角色最新的备份）
+
+        Args:
+            expired: 已按角色规则选出的过期备份
+            max_total_size: 总大小配额
+        """
+        names = {r['name'] for r in expired}
+        excess = self.catalog.total_size() - sum(r['size'] for r in expired) - max_total_size
+        extra = []
+        offset = 0
+        while excess > 0:
+            batch = self.catalog.oldest(50, offset)
+            if not batch:
+                break
+            offset += len(batch)
+            for record in batch:
+                if excess <= 0:
+                    break
+                if record['name'] in names:
+                    continue
+                newest = self.catalog.query(*role_key(record), limit=1)
+                if newest and newest[0]['name'] == record['name']:
+                    continue
+                extra.append(record)
+                names.add(record['name'])
+                excess -= record['size']
+        return extra
+
+    @timed('delete')
+    def _delete_record(self, record: dict) -> Set[str]:
+        """
+        删除备份文件及其目录记录
+
+        Returns:
+            清单备份引用过的文件块哈希，需要交给 _release_blobs 回收
         """
-        列出所有备份
+        blobs = self.catalog.blobs(record['name']) if record['format'] == FORMAT_STORE else set()
+        self._remove_backup(record)
+        self.catalog.remove(record['name'])
+        return blobs
+
+    def _release_blobs(self, candidates: Set[str]) -> dict:
+        """回收候选文件块中不再被任何备份引用的部分"""
+        if not candidates:
+            return {'removed': 0, 'freed': 0}
+        # 引用检查在存储锁内进行，与删除之间不会插入完成的新备份
+        with io_scheduler.slot(self.blob_store.root, measure=False):
+            return self.blob_store.discard(candidates, self.catalog.referenced)
+
+    def list_backups(self, limit: int = None, role: RoleInfo = None) -> List[BackupInfo]:
+        """
+        列出所有备份（从备份目录查询，不遍历磁盘）
 
         Args:
             limit: 限制返回数量
+            role: 只列出该角色的备份
 
         Returns:
-            备份信息列表
+            备份信息列表，按时间从新到旧排列
         """
         backups = []
 
         try:
-            backup_dirs = sorted(
-                [d for d in self.backup_dir.iterdir() if d.is_dir()],
-                key=lambda x: x.stat().st_mtime,
-                reverse=True
-            )
-
-            if limit:
-                backup_dirs = backup_dirs[:limit]
-
-            for backup_dir in backup_dirs:
-                size = self._get_dir_size(backup_dir)
-                created_at = datetime.fromtimestamp(
-                    backup_dir.stat().st_mtime
-                ).strftime("%Y-%m-%d %H:%M:%S")
-
-                # 从文件夹名称解析角色信息
-                parts = backup_dir.name.rsplit('_', 2)
-                role_info = parts[0] if parts else backup_dir.name
-
-                backup = BackupInfo(
-                    name=backup_dir.name,
-                    path=str(backup_dir),
-                    size=size,
-                    created_at=created_at,
-                    role_info=role_info
-                )
-                backups.append(backup)
+            if role:
+                records = self.catalog.query(role.account, role.region, role.server, role.role, limit=limit)
+            else:
+                records = self.catalog.query(limit=limit)
+
+            for record in records:
+                backups.append(BackupInfo(
+                    name=record['name'],
+                    path=record['path'],
+                    size=record['size'],
+                    created_at=record['created_at'],
+                    role_info=f"{record['account']}_{record['region']}_{record['server']}_{record['role']}",
+                    file_count=record['file_count'],
+                    format=record['format'],
+                    role={key: record[key] for key in ('account', 'region', 'server', 'role')}
+                ))
 
         except Exception as e:
             print(f"列出备份失败: {e}")
 
         return backups
 
-    def restore_backup(self, backup_name: str, target_role: RoleInfo) -> dict:
+    def rebuild_catalog(self) -> dict:
+        """
+        从磁盘上的清单、归档和旧版目录备份重建备份目录
+
+        Returns:
+            操作结果 {'success': bool, 'message': str, 'count': int}
+        """
+        try:
+            records = []
+            for entry in self._iter_backups():
+                try:
+                    records.append(self._entry_record(entry))
+                except Exception as e:
+                    print(f"读取备份信息失败: {e}")
+
+            self.catalog.replace_all(records)
+            return {'success': True, 'message': f'已重建备份目录，共 {len(records)} 个备份', 'count': len(records)}
+
+        except Exception as e:
+            return {'success': False, 'message': f'重建备份目录失败: {str(e)}', 'count': 0}
+
+    @timed('restore')
+    def restore_backup(self, backup_name: str, target_role: RoleInfo,
+                       clone_strategy: str = None, progress: Callable = None) -> dict:
         """
         还原备份
 
         Args:
             backup_name: 备份名称
             target_role: 目标角色
+            clone_strategy: 克隆策略，默认使用 self.clone_strategy；
+                还原出的文件不会使用硬链接
+            progress: 进度回调 (current, total, message, files_done, bytes_done)，按文件计步
 
         Returns:
-            操作结果 {'success': bool, 'message': str}
+            操作结果 {'success': bool, 'message': str, 'mechanisms': {机制: 文件数}}
         """
+        strategy = clone_strategy or self.clone_strategy
+        if strategy not in STRATEGIES:
+            return {'success': False, 'message': f'不支持的克隆策略: {strategy}'}
+        if strategy == STRATEGY_HARDLINK:
+            strategy = STRATEGY_REFLINK
+
+        mechanisms = Counter()
+
         try:
+            manifest_path = self._manifest_path(backup_name)
+            archive_path = self._archive_path(backup_name)
             backup_path = self.backup_dir / backup_name
             target_path = Path(target_role.path)
 
-            if not backup_path.exists():
+            if archive_path:
+                # 先读取备份信息，确认归档可读（压缩字典存在）再删除目标
+                header = read_header(archive_path, self.dictionaries_dir)
+
+                if target_path.exists():
+                    with metrics.timer('delete'), io_scheduler.slot(target_path, measure=False):
+                        shutil.rmtree(target_path)
+                target_path.mkdir(parents=True)
+
+                reporter = ProgressReporter(progress, header['file_count'], f"正在还原: {target_role}",
+                                            op='restore')
+                extract_archive(archive_path, target_path, self.dictionaries_dir, reporter)
+                return {'success': True, 'message': '还原成功', 'mechanisms': {}}
+
+            if manifest_path.exists():
+                manifest = self._read_manifest(manifest_path)
+
+                # 先确认所有文件块都在，避免删除目标后才发现备份不完整
+                missing = [f['path'] for f in manifest['files']
+                           if not self.blob_store.has(f['hash'])]
+                if missing:
+                    return {'success': False, 'message': f'备份数据缺失: {missing[0]}'}
+
+                # 删除目标目录
+                if target_path.exists():
+                    with metrics.timer('delete'), io_scheduler.slot(target_path, measure=False):
+                        shutil.rmtree(target_path)
+
+                target_path.mkdir(parents=True)
+                for rel_dir in manifest['dirs']:
+                    (target_path / rel_dir).mkdir(parents=True, exist_ok=True)
+
+                reporter = ProgressReporter(progress, len(manifest['files']),
+                                            f"正在还原: {target_role}", op='restore')
+                for entry in manifest['files']:
+                    file_path = target_path / entry['path']
+                    with io_scheduler.slot(self.blob_store.blob_path(entry['hash']), file_path,
+                                           size=entry['size']):
+                        mechanism = self.blob_store.restore_file(entry['hash'], file_path, strategy)
+                    mechanisms[mechanism] += 1
+                    os.utime(file_path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+                    reporter.file_done(entry['size'], advance=1)
+
+                return {'success': True, 'message': '还原成功', 'mechanisms': dict(mechanisms)}
+
+            if not self._is_legacy_backup(backup_path):
                 return {'success': False, 'message': '备份不存在'}
 
             # 删除目标目录
             if target_path.exists():
-                shutil.rmtree(target_path)
+                with metrics.timer('delete'), io_scheduler.slot(target_path, measure=False):
+                    shutil.rmtree(target_path)
 
             # 复制备份到目标
-            shutil.copytree(backup_path, target_path)
+            reporter = ProgressReporter(progress, 0, f"正在还原: {target_role}", op='restore')
+
+            def copy_function(src, dst):
+                size = os.path.getsize(src)
+                with io_scheduler.slot(src, dst, size=size):
+                    mechanisms[clone_file(src, dst, strategy)] += 1
+                reporter.file_done(size, advance=1)
+
+            shutil.copytree(backup_path, target_path, copy_function=copy_function)
 
-            return {'success': True, 'message': '还原成功'}
+            return {'success': True, 'message': '还原成功', 'mechanisms': dict(mechanisms)}
 
         except Exception as e:
             return {'success': False, 'message': f'还原失败: {str(e)}'}
 
+    @timed('delete')
     def delete_backup(self, backup_name: str) -> dict:
         """
         删除备份
@@ -183,27 +608,249 @@ class BackupManager:
             操作结果 {'success': bool, 'message': str}
         """
         try:
+            manifest_path = self._manifest_path(backup_name)
             backup_path = self.backup_dir / backup_name
 
-            if not backup_path.exists():
+            archive_path = self._archive_path(backup_name)
+
+            if archive_path:
+                archive_path.unlink()
+            elif manifest_path.exists():
+                blobs = self.catalog.blobs(backup_name)
+                manifest_path.unlink()
+                self.catalog.remove(backup_name)
+                self._release_blobs(blobs)
+            elif self._is_legacy_backup(backup_path):
+                shutil.rmtree(backup_path)
+            else:
+                self.catalog.remove(backup_name)
                 return {'success': False, 'message': '备份不存在'}
 
-            shutil.rmtree(backup_path)
+            self.catalog.remove(backup_name)
 
             return {'success': True, 'message': '删除成功'}
 
         except Exception as e:
             return {'success': False, 'message': f'删除失败: {str(e)}'}
 
+    def clear_all_backups(self) -> dict:
+        """
+        清空所有备份
 
-    @staticmethod
-    def _get_dir_size(path: Path) -> int:
-        """获取目录大小（字节）"""
-        total = 0
+        Returns:
+            操作结果 {'success': bool, 'message': str}
+        """
         try:
-            for entry in path.rglob('*'):
-                if entry.is_file():
-                    total += entry.stat().st_size
-        except Exception:
-            pass
-        return total
+            count = 0
+            for entry in list(self._iter_backups()):
+                self._remove_backup(entry)
+                count += 1
+
+            self.blob_store.clear()
+            self.catalog.clear()
+
+            return {'success': True, 'message': f'已删除 {count} 个备份'}
+
+        except Exception as e:
+            return {'success': False, 'message': f'清空失败: {str(e)}'}
+
+    def collect_garbage(self) -> dict:
+        """
+        删除不再被任何备份清单引用的文件块
+
+        读取所有清单并遍历整个文件块存储，用于修复；删除备份时只回收该备份引用过的文件块。
+
+        Returns:
+            {'removed': int, 'freed': int}
+        """
+        referenced = set()
+        for manifest_path in self.manifests_dir.glob('*.json'):
+            try:
+                manifest = self._read_manifest(manifest_path)
+            except Exception as e:
+                # 清单损坏时无法确定引用关系，放弃本次回收以免误删
+                print(f"读取备份清单失败: {e}")
+                return {'removed': 0, 'freed': 0}
+            referenced.update(f['hash'] for f in manifest['files'])
+
+        return self.blob_store.gc(referenced)
+
+    def _iter_backups(self):
+        """
+        遍历所有备份（清单备份和旧版目录备份）
+
+        Yields:
+            {'name': str, 'format': str, 'path': Path, 'timestamp': float, 'manifest': Optional[dict]}，
+            归档备份的 manifest 是归档开头的备份信息
+        """
+        for manifest_path in self.manifests_dir.glob('*.json'):
+            try:
+                manifest = self._read_manifest(manifest_path)
+            except Exception as e:
+                print(f"读取备份清单失败: {e}")
+                continue
+            yield {
+                'name': manifest_path.stem,
+                'format': FORMAT_STORE,
+                'path': manifest_path,
+                'timestamp': manifest.get('timestamp', manifest_path.stat().st_mtime),
+                'manifest': manifest
+            }
+
+        for archive_path in self.archives_dir.iterdir():
+            backup_format = self._archive_format(archive_path)
+            if not backup_format:
+                continue
+            try:
+                header = read_header(archive_path, self.dictionaries_dir)
+            except Exception as e:
+                print(f"读取备份归档失败: {e}")
+                continue
+            yield {
+                'name': archive_path.name[:-len(archive_suffix(backup_format))],
+                'format': backup_format,
+                'path': archive_path,
+                'timestamp': header.get('timestamp', archive_path.stat().st_mtime),
+                'manifest': header
+            }
+
+        for d in self.backup_dir.iterdir():
+            if self._is_legacy_backup(d):
+                yield {
+                    'name': d.name,
+                    'format': self.FORMAT_LEGACY,
+                    'path': d,
+                    'timestamp': d.stat().st_mtime,
+                    'manifest': None
+                }
+
+    def _remove_backup(self, entry: dict):
+        """
+        删除单个备份的文件，清单备份的文件块由 collect_garbage 回收
+
+        Args:
+            entry: _iter_backups() 的条目或备份目录记录
+        """
+        path = Path(entry['path'])
+        if entry['format'] == self.FORMAT_LEGACY:
+            with io_scheduler.slot(path, measure=False):
+                shutil.rmtree(path)
+        elif path.exists():
+            with io_scheduler.slot(path):
+                path.unlink()
+
+    def _catalog_record(self, manifest: dict, path: Path) -> dict:
+        """由备份清单或归档备份信息生成备份目录记录"""
+        role = manifest['role']
+        backup_format = manifest.get('format', FORMAT_STORE)
+        blobs = None
+        if backup_format == FORMAT_STORE:
+            checksum = self._manifest_checksum(manifest)
+            blobs = {f['hash'] for f in manifest['files']}
+        else:
+            checksum = self.hash_cache.hash_file(path)
+
+        return {
+            'blobs': blobs,
+            'name': manifest['name'],
+            'account': role['account'],
+            'region': role['region'],
+            'server': role['server'],
+            'role': role['role'],
+            'format': backup_format,
+            'path': str(path),
+            'created_at': manifest['created_at'],
+            'timestamp': manifest['timestamp'],
+            'file_count': manifest['file_count'],
+            'size': manifest['size'],
+            'checksum': checksum
+        }
+
+    def _entry_record(self, entry: dict) -> dict:
+        """由磁盘上的备份生成备份目录记录"""
+        if entry['manifest'] is not None:
+            manifest = dict(entry['manifest'])
+            manifest.setdefault('name', entry['name'])
+            return self._catalog_record(manifest, entry['path'])
+
+        # 旧版目录备份没有记录角色信息，只能从名称推断：
+        # [账号]_[大区]_[服务器]_[角色]_[日期]_[时间]，名称中含下划线时可能不准确
+        prefix = entry['name'].rsplit('_', 2)[0]
+        parts = prefix.split('_', 3)
+        parts += [''] * (4 - len(parts))
+        files, _ = scan_tree(entry['path'])
+
+        return {
+            'name': entry['name'],
+            'account': parts[0],
+            'region': parts[1],
+            'server': parts[2],
+            'role': parts[3],
+            'format': self.FORMAT_LEGACY,
+            'path': str(entry['path']),
+            'created_at': datetime.fromtimestamp(entry['timestamp']).strftime("%Y-%m-%d %H:%M:%S"),
+            'timestamp': entry['timestamp'],
+            'file_count': len(files),
+            'size': sum(f.size for f in files.values()),
+            'checksum': None
+        }
+
+    @staticmethod
+    def _manifest_checksum(manifest: dict) -> str:
+        """清单备份的校验和：所有文件路径和内容哈希的哈希"""
+        h = hashlib.blake2b(digest_size=20)
+        for entry in manifest['files']:
+            h.update(f"{entry['path']}\0{entry['hash']}\n".encode('utf-8'))
+        return h.hexdigest()
+
+    def _is_legacy_backup(self, path: Path) -> bool:
+        """是否为旧版整目录备份"""
+        return (path.is_dir()
+                and path.parent == self.backup_dir
+                and path.name not in (self.OBJECTS_DIR, self.MANIFESTS_DIR,
+                                      self.ARCHIVES_DIR, self.DICTIONARIES_DIR))
+
+    def _manifest_path(self, backup_name: str) -> Path:
+        """获取备份清单路径"""
+        return self.manifests_dir / f"{backup_name}.json"
+
+    def _archive_path(self, backup_name: str):
+        """获取已存在的备份归档路径，不存在时返回 None"""
+        for backup_format in ARCHIVE_FORMATS:
+            path = self.archives_dir / f"{backup_name}{archive_suffix(backup_format)}"
+            if path.is_file():
+                return path
+        return None
+
+    @staticmethod
+    def _archive_format(path: Path):
+        """根据扩展名判断归档格式，不是归档时返回 None"""
+        for backup_format in ARCHIVE_FORMATS:
+            if path.name.endswith(archive_suffix(backup_format)):
+                return backup_format
+        return None
+
+    def _backup_exists(self, backup_name: str) -> bool:
+        """同名备份是否已存在（任意格式）"""
+        return (self._manifest_path(backup_name).exists()
+                or self._archive_path(backup_name) is not None
+                or (self.backup_dir / backup_name).exists())
+
+    @staticmethod
+    def _role_prefix(role: RoleInfo) -> str:
+        """备份名称中的角色前缀"""
+        return f"{role.account}_{role.region}_{role.server}_{role.role}_"
+
+    @staticmethod
+    def _read_manifest(path: Path) -> dict:
+        """读取备份清单"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_manifest(path: Path, manifest: dict):
+        """写入备份清单（先写临时文件再替换，保证清单完整）"""
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
@@ -0,0 +1,141 @@
+"""
+角色扫描基准测试
+对比旧的 Path.iterdir() 扫描和新的 os.scandir 并行扫描的系统调用次数与耗时
+
+用法（在项目根目录执行）:
+    python -m backend.benchmarks.scan_benchmark [--userdata 路径] [--repeat 5] [--json 输出文件]
+
+不指定 --userdata 时会在临时目录生成一份模拟的 userdata 目录
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from backend.role_scanner import RoleScanner
+
+
+def legacy_scan_all_roles(userdata_path: Path) -> list:
+    """改造前的扫描实现，作为对比基线"""
+    roles = []
+    for account_folder in userdata_path.iterdir():
+        if not account_folder.is_dir():
+            continue
+        subdirs = [d for d in account_folder.iterdir() if d.is_dir()]
+        if len(subdirs) == 0:
+            continue
+        for region_folder in account_folder.iterdir():
+            if not region_folder.is_dir():
+                continue
+            for server_folder in region_folder.iterdir():
+                if not server_folder.is_dir():
+                    continue
+                for role_folder in server_folder.iterdir():
+                    if not role_folder.is_dir():
+                        continue
+                    roles.append(str(role_folder))
+    return roles
+
+
+def build_userdata(root: Path, accounts: int = 20, regions: int = 2, servers: int = 3,
+                   roles: int = 4, files_per_role: int = 10):
+    """生成模拟的 userdata 目录"""
+    for a in range(accounts):
+        for r in range(regions):
+            for s in range(servers):
+                for n in range(roles):
+                    role_dir = root / f"account{a}" / f"region{r}" / f"server{s}" / f"role{n}"
+                    role_dir.mkdir(parents=True)
+                    for i in range(files_per_role):
+                        (role_dir / f"file{i}.dat").write_bytes(b'x')
+        # 每个账号旁边放一个只有文件的服务器数据文件夹
+        server_data = root / f"server_data{a}"
+        server_data.mkdir()
+        (server_data / "data.bin").write_bytes(b'x')
+
+
+@contextmanager
+def count_syscalls():
+    """统计 os.stat / os.lstat / os.scandir / os.listdir 的调用次数"""
+    names = ('stat', 'lstat', 'scandir', 'listdir')
+    originals = {name: getattr(os, name) for name in names}
+    counts = {name: 0 for name in names}
+    lock = threading.Lock()
+
+    def wrap(name):
+        original = originals[name]
+
+        def wrapper(*args, **kwargs):
+            with lock:
+                counts[name] += 1
+            return original(*args, **kwargs)
+        return wrapper
+
+    for name in names:
+        setattr(os, name, wrap(name))
+    try:
+        yield counts
+    finally:
+        for name, original in originals.items():
+            setattr(os, name, original)
+
+
+def measure(func, repeat: int) -> dict:
+    """运行 repeat 次，记录耗时和单次运行的系统调用次数"""
+    with count_syscalls() as counts:
+        result = func()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'roles': len(result),
+        'syscalls': dict(counts, total=sum(counts.values())),
+        'min_ms': min(timings) * 1000,
+        'median_ms': statistics.median(timings) * 1000
+    }
+
+
+def run(userdata: Path, repeat: int) -> dict:
+    scanner = RoleScanner(str(userdata))
+    return {
+        'before': measure(lambda: legacy_scan_all_roles(userdata), repeat),
+        'after': measure(scanner.scan_all_roles, repeat)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='角色扫描基准测试')
+    parser.add_argument('--userdata', help='userdata 目录，不指定时自动生成')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数')
+    parser.add_argument('--json', help='结果输出文件')
+    args = parser.parse_args()
+
+    if args.userdata:
+        results = run(Path(args.userdata), args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            build_userdata(Path(tmp))
+            results = run(Path(tmp), args.repeat)
+
+    for name, result in results.items():
+        syscalls = result['syscalls']
+        print(f"{name:>6}: {result['roles']} 个角色, 系统调用 {syscalls['total']} "
+              f"(stat {syscalls['stat']}, scandir {syscalls['scandir']}, listdir {syscalls['listdir']}), "
+              f"耗时 min {result['min_ms']:.2f} ms / median {result['median_ms']:.2f} ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
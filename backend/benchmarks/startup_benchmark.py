@@ -0,0 +1,207 @@
+"""
+启动基准测试
+启动后端进程，测量从启动进程到 /api/health 第一次返回成功、以及到达各启动阶段的耗时
+
+用法（在项目根目录执行）:
+    python -m backend.benchmarks.startup_benchmark [--repeat 5] [--dev] [--json 结果文件]
+    python -m backend.benchmarks.suite --compare 旧结果.json 新结果.json
+
+后端在临时工作目录中运行，配置、角色索引和哈希缓存都写在那里；哈希缓存预先写入
+--hash-cache-entries 条模拟记录，计时前先启动一次生成角色索引，计时的是已有索引和
+哈希缓存时的启动。备份目录仍是项目根目录下的 backups。
+
+除各启动阶段外，还报告后端自己记录的时间点（开始监听端口、哈希缓存读入完成等），
+这些时间从后端进程开始计时，不含解释器启动。
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+from backend.benchmarks.suite import RESULT_VERSION, git_commit, summarize
+from backend.benchmarks.userdata_generator import (
+    add_spec_arguments, generate_game_dir, spec_from_args
+)
+from backend.hash_cache import HashCache
+from backend.startup import STAGES, STAGE_READY, STAGE_STARTING
+
+APP_SCRIPT = Path(__file__).resolve().parent.parent / 'app.py'
+# 轮询健康检查的间隔（秒）
+POLL_INTERVAL = 0.005
+# 单次启动的最长等待时间（秒）
+START_TIMEOUT = 60
+HEALTH_OK = 'health_ok'
+# 后端记录的时间点在结果中的前缀
+MARK_PREFIX = 'mark:'
+
+
+def free_port() -> int:
+    """取一个当前空闲的本地端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def health(port: int) -> dict:
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=1) as response:
+        return json.load(response)
+
+
+def populate_hash_cache(path: Path, entries: int):
+    """写入 entries 条模拟记录，模拟长期使用后的哈希缓存"""
+    # 由 HashCache 创建表结构
+    HashCache(str(path), max_entries=entries).close()
+    conn = sqlite3.connect(str(path))
+    try:
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO hashes (dev, ino, size, mtime_ns, digest, used) VALUES (?, ?, ?, ?, ?, ?)',
+                ((1, str(i), 4096, i * 1000, hashlib.blake2b(str(i).encode(), digest_size=20).hexdigest(), i)
+                 for i in range(1, entries + 1))
+            )
+    finally:
+        conn.close()
+
+
+def start_once(workdir: Path, dev: bool = False) -> Dict[str, float]:
+    """
+    启动一次后端，直到启动阶段为 ready 后结束进程
+
+    Returns:
+        {'health_ok': 毫秒, 阶段: 毫秒, 'mark:时间点': 毫秒, ...}，阶段均从启动进程开始计时，
+        为第一次在健康检查中看到该阶段的时间；时间点为后端自己记录的时间
+    """
+    port = free_port()
+    command = [sys.executable, '-B', str(APP_SCRIPT), '--port', str(port)]
+    if dev:
+        command.append('--dev')
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=str(workdir), stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    timings = {}
+    try:
+        while True:
+            elapsed = (time.perf_counter() - started) * 1000
+            if elapsed > START_TIMEOUT * 1000:
+                raise TimeoutError(f'{START_TIMEOUT} 秒内未完成启动')
+            if process.poll() is not None:
+                raise RuntimeError(f'后端进程已退出，返回码 {process.returncode}')
+            try:
+                status = health(port)
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            timings.setdefault(HEALTH_OK, elapsed)
+            stage = status.get('stage', STAGE_READY)
+            # 两次轮询之间可能跨过多个阶段
+            for name in STAGES[:STAGES.index(stage) + 1]:
+                timings.setdefault(name, elapsed)
+            if status.get('error'):
+                raise RuntimeError(f"启动失败: {status['error']}")
+            if stage == STAGE_READY:
+                for name, elapsed in status.get('timings_ms', {}).items():
+                    if name not in STAGES:
+                        timings[MARK_PREFIX + name] = elapsed
+                return timings
+            time.sleep(POLL_INTERVAL)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run(args: argparse.Namespace) -> dict:
+    """
+    运行启动基准测试
+
+    Returns:
+        可写入 JSON 的结果，格式与 suite 相同，可用 suite --compare 对比
+    """
+    runs: List[Dict[str, float]] = []
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        workdir = Path(tmp)
+        dataset = generate_game_dir(workdir / 'game', spec_from_args(args))
+        config = {'userdata_path': dataset['userdata']}
+        if args.hash_cache_entries:
+            # 容量与写入的记录数一致，启动时全部读入
+            config['hash_cache_entries'] = args.hash_cache_entries
+            populate_hash_cache(workdir / 'jx3_hash_cache.sqlite3', args.hash_cache_entries)
+        with open(workdir / 'jx3_sync_config.json', 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False)
+
+        # 第一次启动生成角色索引
+        start_once(workdir, args.dev)
+        for _ in range(args.repeat):
+            runs.append(start_once(workdir, args.dev))
+
+    # 每次启动都记录到的时间点
+    marks = sorted(set.intersection(*(
+        {name for name in timings if name.startswith(MARK_PREFIX)} for timings in runs
+    ))) if runs else []
+
+    results = {}
+    for name in (HEALTH_OK, *STAGES, *marks):
+        if name == STAGE_STARTING:
+            continue
+        result = summarize([timings[name] for timings in runs])
+        if name == HEALTH_OK:
+            result['description'] = '健康检查第一次返回成功'
+        elif name.startswith(MARK_PREFIX):
+            result['description'] = f'后端记录的时间点 {name[len(MARK_PREFIX):]}（从后端进程开始计时）'
+        else:
+            result['description'] = f'启动阶段到达 {name}'
+        results[f'startup[{name}]'] = result
+        print(f"{'startup[' + name + ']':<32} min {result['min_ms']:9.2f} ms  "
+              f"median {result['median_ms']:9.2f} ms  stdev {result['stdev_ms']:8.2f} ms")
+
+    return {
+        'version': RESULT_VERSION,
+        'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'server': 'dev' if args.dev else 'default',
+        'spec': spec_from_args(args).to_dict(),
+        'hash_cache_entries': args.hash_cache_entries,
+        'dataset': {key: dataset[key] for key in ('roles', 'files', 'bytes')},
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='后端启动基准测试')
+    parser.add_argument('--repeat', type=int, default=5, help='计时次数')
+    parser.add_argument('--dev', action='store_true', help='使用 Flask 开发服务器启动')
+    parser.add_argument('--workdir', help='生成模拟目录的位置，默认系统临时目录')
+    parser.add_argument('--json', help='结果输出文件')
+    parser.add_argument('--hash-cache-entries', type=int, default=200000,
+                        help='预先写入哈希缓存的模拟记录数，0 表示不写入')
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,419 @@
+"""
+后端热点路径基准测试
+在生成的模拟游戏目录上测量扫描、过滤、复制、备份、还原和路径解析的耗时，
+结果写入 JSON，可与其他提交的结果对比
+
+用法（在项目根目录执行）:
+    python -m backend.benchmarks.suite [--repeat 5] [--only copy_role,backup_role] [--json 结果文件]
+    python -m backend.benchmarks.suite --compare 旧结果.json 新结果.json
+
+规模参数（--accounts、--roles、--files-per-role 等）见 userdata_generator。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from backend.backup_archive import FORMAT_STORE, FORMAT_TAR_ZSTD, FORMAT_ZIP, HAS_ZSTD
+from backend.backup_manager import BackupManager
+from backend.hash_cache import HashCache
+from backend.path_resolver import PathResolver
+from backend.role_copier import RoleCopier
+from backend.role_scanner import RoleScanner
+from backend.benchmarks.userdata_generator import (
+    UserdataSpec, add_spec_arguments, generate_game_dir, spec_from_args
+)
+
+RESULT_VERSION = 1
+# 复制到多个角色时的目标数量
+MULTI_TARGETS = 4
+
+
+@dataclass
+class Env:
+    """基准测试共用的目录和服务实例"""
+    root: Path
+    exe: Path
+    userdata: Path
+    scanner: RoleScanner
+    copier: RoleCopier
+    backups: BackupManager
+    roles: list = field(default_factory=list)
+    shortcut: Optional[Path] = None
+
+    @property
+    def source(self):
+        return self.roles[0]
+
+    @property
+    def targets(self):
+        return self.roles[1:1 + MULTI_TARGETS]
+
+
+@dataclass
+class Benchmark:
+    """
+    单个基准测试
+
+    setup 在计时前执行一次，返回每轮计时调用的函数，或 (计时函数, 每轮结束后不计时
+    的还原函数)；返回 None 表示当前环境不支持
+    """
+    name: str
+    setup: Callable[[Env], Optional[Callable[[], object]]]
+    description: str = ''
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str, description: str = ''):
+    """注册基准测试"""
+    def decorator(setup):
+        BENCHMARKS.append(Benchmark(name, setup, description))
+        return setup
+    return decorator
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测代码的调试输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# ===== 基准测试 =====
+
+@benchmark('scan_all_roles', '完整遍历 userdata')
+def bench_scan(env: Env):
+    scanner = RoleScanner(str(env.userdata))
+    return scanner.scan_all_roles
+
+
+@benchmark('scan_all_roles[index]', '使用持久化索引，目录没有变化')
+def bench_scan_index(env: Env):
+    scanner = RoleScanner(str(env.userdata), index_file=str(env.root / 'role_index.json'))
+    scanner.scan_all_roles()
+    return scanner.scan_all_roles
+
+
+@benchmark('filter_roles', '按账号和服务器过滤')
+def bench_filter(env: Env):
+    account = env.source.account
+    server = env.source.server
+    return lambda: env.scanner.filter_roles(env.roles, account=account, server=server)
+
+
+def _copy_role(mode: str):
+    def setup(env: Env):
+        target = env.targets[0]
+        return lambda: env.copier.copy_role(env.source, target, mode)
+    return setup
+
+
+for _mode in (RoleCopier.MODE_STAGED, RoleCopier.MODE_FULL, RoleCopier.MODE_INCREMENTAL):
+    benchmark(f'copy_role[{_mode}]', f'复制到单个角色（{_mode}）')(_copy_role(_mode))
+
+
+def _copy_to_multiple(mode: str):
+    def setup(env: Env):
+        return lambda: env.copier.copy_to_multiple(env.source, env.targets, mode)
+    return setup
+
+
+for _mode in (RoleCopier.MODE_STAGED, RoleCopier.MODE_INCREMENTAL):
+    benchmark(f'copy_to_multiple[{_mode}]',
+              f'复制到 {MULTI_TARGETS} 个角色（{_mode}）')(_copy_to_multiple(_mode))
+
+
+def _delete_latest_backup(env: Env):
+    """删除源角色最新的备份，备份名称精确到秒，不删除时同一秒内无法再次备份"""
+    latest = env.backups.list_backups(limit=1, role=env.source)
+    if latest:
+        env.backups.delete_backup(latest[0].name)
+
+
+def _backup_role(backup_format: str):
+    def setup(env: Env):
+        if backup_format == FORMAT_TAR_ZSTD and not HAS_ZSTD:
+            return None
+        return (lambda: env.backups.backup_role(env.source, backup_format=backup_format),
+                lambda: _delete_latest_backup(env))
+    return setup
+
+
+for _format in (FORMAT_STORE, FORMAT_ZIP, FORMAT_TAR_ZSTD):
+    benchmark(f'backup_role[{_format}]', f'备份单个角色（{_format}）')(_backup_role(_format))
+
+
+@benchmark('list_backups', '列出所有备份')
+def bench_list_backups(env: Env):
+    for role in env.roles[:MULTI_TARGETS]:
+        env.backups.backup_role(role)
+    return env.backups.list_backups
+
+
+@benchmark('list_backups[role]', '列出单个角色的备份')
+def bench_list_role_backups(env: Env):
+    env.backups.backup_role(env.source)
+    return lambda: env.backups.list_backups(role=env.source)
+
+
+@benchmark('restore_backup', '还原最新的备份到另一个角色')
+def bench_restore(env: Env):
+    env.backups.backup_role(env.source, backup_format=FORMAT_STORE)
+    name = env.backups.list_backups(limit=1, role=env.source)[0].name
+    target = env.targets[-1]
+    return lambda: env.backups.restore_backup(name, target)
+
+
+@benchmark('resolve_game_path[exe]', '从启动器路径向上查找')
+def bench_resolve_exe(env: Env):
+    def run():
+        with quiet():
+            return PathResolver.resolve_game_path(str(env.exe))
+    return run
+
+
+@benchmark('resolve_game_path[search]', '从安装目录上层向下查找')
+def bench_resolve_search(env: Env):
+    start = env.root / 'Game'
+
+    def run():
+        with quiet():
+            return PathResolver.resolve_game_path(str(start))
+    return run
+
+
+@benchmark('parse_shortcut', '解析启动器快捷方式（不使用缓存）')
+def bench_parse_shortcut(env: Env):
+    path = str(env.shortcut)
+
+    def run():
+        PathResolver.clear_shortcut_cache()
+        with quiet():
+            return PathResolver.parse_shortcut(path)
+    return run
+
+
+@benchmark('parse_shortcut[cached]', '再次解析未修改的快捷方式')
+def bench_parse_shortcut_cached(env: Env):
+    path = str(env.shortcut)
+    with quiet():
+        PathResolver.parse_shortcut(path)
+    return lambda: PathResolver.parse_shortcut(path)
+
+
+# ===== 运行 =====
+
+def _check(result):
+    """被测操作返回失败结果时中止，避免把提前返回的失败路径当作耗时"""
+    if isinstance(result, dict) and result.get('success') is False:
+        raise RuntimeError(result.get('message') or result.get('error') or '操作失败')
+    return result
+
+
+def measure(func: Callable[[], object], repeat: int, warmup: int,
+            reset: Callable[[], object] = None) -> dict:
+    """运行 warmup 次预热，再计时 repeat 次；reset 在每轮之后执行，不计入耗时"""
+    for _ in range(warmup):
+        _check(func())
+        if reset:
+            reset()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+        _check(result)
+        if reset:
+            reset()
+
+    return summarize(timings)
+
+
+def summarize(timings: List[float]) -> dict:
+    """多次计时（毫秒）的统计，格式与结果文件中的单个基准测试相同"""
+    return {
+        'repeat': len(timings),
+        'min_ms': min(timings),
+        'median_ms': statistics.median(timings),
+        'mean_ms': statistics.mean(timings),
+        'stdev_ms': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'max_ms': max(timings)
+    }
+
+
+def create_env(root: Path, spec: UserdataSpec) -> tuple:
+    """生成模拟游戏目录并创建服务实例"""
+    stats = generate_game_dir(root, spec)
+    userdata = Path(stats['userdata'])
+    hash_cache = HashCache()
+    scanner = RoleScanner(str(userdata), hash_cache=hash_cache)
+    env = Env(
+        root=root,
+        exe=Path(stats['exe']),
+        userdata=userdata,
+        scanner=scanner,
+        copier=RoleCopier(hash_cache=hash_cache),
+        backups=BackupManager(str(userdata), backup_dir=str(root / 'backups'), hash_cache=hash_cache),
+        shortcut=Path(stats['shortcut'])
+    )
+    env.roles = sorted(scanner.scan_all_roles(), key=lambda role: role.path)
+    if len(env.roles) < MULTI_TARGETS + 1:
+        raise ValueError(f'至少需要 {MULTI_TARGETS + 1} 个角色')
+    return env, stats
+
+
+def git_commit() -> Optional[str]:
+    """当前提交，不在 git 仓库中时返回 None"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=Path(__file__).parent, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def run(spec: UserdataSpec, repeat: int, warmup: int, only: List[str] = None,
+        workdir: str = None) -> dict:
+    """
+    运行基准测试
+
+    每个基准测试使用一份新生成的目录，互不影响。
+
+    Args:
+        spec: 模拟 userdata 的规模
+        repeat: 计时次数
+        warmup: 预热次数
+        only: 只运行名称匹配的基准测试（名称或方括号前的部分）
+        workdir: 生成目录的位置，默认系统临时目录
+
+    Returns:
+        可写入 JSON 的结果
+    """
+    selected = [b for b in BENCHMARKS
+                if not only or b.name in only or b.name.split('[')[0] in only]
+    results = {}
+    dataset = None
+
+    for bench in selected:
+        with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+            env, dataset = create_env(Path(tmp), spec)
+            func = bench.setup(env)
+            reset = None
+            if isinstance(func, tuple):
+                func, reset = func
+            if func is None:
+                results[bench.name] = {'skipped': True, 'description': bench.description}
+                print(f"{bench.name:<32} 跳过")
+                continue
+            result = measure(func, repeat, warmup, reset)
+            result['description'] = bench.description
+            results[bench.name] = result
+            print(f"{bench.name:<32} min {result['min_ms']:9.2f} ms  "
+                  f"median {result['median_ms']:9.2f} ms  stdev {result['stdev_ms']:8.2f} ms")
+
+    return {
+        'version': RESULT_VERSION,
+        'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'spec': spec.to_dict(),
+        'dataset': {key: dataset[key] for key in ('roles', 'files', 'bytes')} if dataset else None,
+        'results': results
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.05) -> List[dict]:
+    """
+    对比两次结果的中位数耗时
+
+    Args:
+        threshold: 变化超过此比例时标记为变快或变慢
+
+    Returns:
+        每个基准测试的对比结果
+    """
+    rows = []
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name)
+        if not old or old.get('skipped') or result.get('skipped'):
+            continue
+        change = (result['median_ms'] - old['median_ms']) / old['median_ms'] if old['median_ms'] else 0.0
+        status = 'same'
+        if change <= -threshold:
+            status = 'faster'
+        elif change >= threshold:
+            status = 'slower'
+        rows.append({
+            'name': name,
+            'baseline_ms': old['median_ms'],
+            'current_ms': result['median_ms'],
+            'change': change,
+            'status': status
+        })
+    return rows
+
+
+def print_comparison(baseline: dict, current: dict, threshold: float):
+    if baseline.get('spec') != current.get('spec'):
+        print('警告: 两次结果的数据规模不同，对比结果仅供参考')
+    print(f"基线 {baseline.get('commit')} ({baseline.get('created_at')}) -> "
+          f"当前 {current.get('commit')} ({current.get('created_at')})")
+    labels = {'faster': '变快', 'slower': '变慢', 'same': ''}
+    for row in compare(baseline, current, threshold):
+        print(f"{row['name']:<32} {row['baseline_ms']:9.2f} ms -> {row['current_ms']:9.2f} ms  "
+              f"{row['change'] * 100:+7.1f}%  {labels[row['status']]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='后端热点路径基准测试')
+    parser.add_argument('--repeat', type=int, default=5, help='计时次数')
+    parser.add_argument('--warmup', type=int, default=1, help='预热次数')
+    parser.add_argument('--only', help='只运行指定的基准测试，逗号分隔')
+    parser.add_argument('--list', action='store_true', help='列出所有基准测试')
+    parser.add_argument('--workdir', help='生成模拟目录的位置，默认系统临时目录')
+    parser.add_argument('--json', help='结果输出文件')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='对比两个结果文件，不运行基准测试')
+    parser.add_argument('--threshold', type=float, default=0.05, help='对比时视为变化的比例')
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    if args.list:
+        for bench in BENCHMARKS:
+            print(f"{bench.name:<32} {bench.description}")
+        return
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.compare[1], encoding='utf-8') as f:
+            current = json.load(f)
+        print_comparison(baseline, current, args.threshold)
+        return
+
+    only = [name.strip() for name in args.only.split(',')] if args.only else None
+    results = run(spec_from_args(args), args.repeat, args.warmup, only, args.workdir)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+模拟 userdata 生成器
+按指定的账号/大区/服务器/角色数量和文件数量、大小分布生成一份接近真实的游戏目录，
+供基准测试使用
+
+用法（在项目根目录执行）:
+    python -m backend.benchmarks.userdata_generator 输出目录 [--accounts 5] [--roles 4] ...
+
+输出目录下生成：
+    SeasunGame.exe
+    SeasunGame.lnk（指向 SeasunGame.exe 的快捷方式）
+    Game/JX3/bin/zhcn_hd/userdata/<账号>/<大区>/<服务器>/<角色>/...
+"""
+import argparse
+import json
+import math
+import random
+import struct
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+
+from backend import shell_link
+
+# 角色目录中的常见文件，其余文件放在插件目录下
+ROLE_FILES = ('userpreferences.jx3dat', 'custom.dat', 'hotkey.jx3dat', 'chat.jx3dat', 'ui.ini')
+ADDON_FILE_EXTS = ('.jx3dat', '.lua', '.ini', '.dat')
+# 生成文件内容时重复的随机块大小：块越小压缩率越高，接近文本配置文件
+PATTERN_SIZE = 4096
+
+
+@dataclass
+class UserdataSpec:
+    """
+    模拟 userdata 的规模和文件分布
+
+    文件大小服从对数正态分布：中位数为 median_file_size，sigma 越大大文件越多，
+    超过 max_file_size 的截断。每个角色的文件数在 files_per_role 上下浮动
+    files_jitter 的比例。shared_ratio 比例的插件文件在所有角色中内容相同
+    （同一插件的默认配置），用于体现备份去重的效果。
+    """
+    accounts: int = 5
+    regions: int = 2
+    servers: int = 2
+    roles: int = 3
+    # 只有文件、没有角色的服务器数据文件夹数量
+    server_data_folders: int = 2
+    files_per_role: int = 60
+    files_jitter: float = 0.3
+    addons_per_role: int = 8
+    median_file_size: int = 2048
+    size_sigma: float = 1.5
+    max_file_size: int = 8 * 1024 * 1024
+    shared_ratio: float = 0.5
+    seed: int = 20240501
+
+    @property
+    def role_count(self) -> int:
+        return self.accounts * self.regions * self.servers * self.roles
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @staticmethod
+    def from_dict(data: dict) -> 'UserdataSpec':
+        names = {f.name for f in fields(UserdataSpec)}
+        return UserdataSpec(**{key: value for key, value in (data or {}).items() if key in names})
+
+
+def _file_size(rng: random.Random, spec: UserdataSpec) -> int:
+    size = int(rng.lognormvariate(math.log(max(spec.median_file_size, 1)), spec.size_sigma))
+    return max(1, min(size, spec.max_file_size))
+
+
+def _content(rng: random.Random, size: int) -> bytes:
+    """生成 size 字节的内容：重复的随机块，压缩率与配置文件相近"""
+    length = min(size, PATTERN_SIZE)
+    pattern = rng.getrandbits(length * 8).to_bytes(length, 'little')
+    repeat, remainder = divmod(size, len(pattern))
+    return pattern * repeat + pattern[:remainder]
+
+
+def _role_layout(rng: random.Random, spec: UserdataSpec) -> list:
+    """单个角色的文件列表 [(相对路径, 是否共享)]"""
+    jitter = int(spec.files_per_role * spec.files_jitter)
+    count = max(1, spec.files_per_role + rng.randint(-jitter, jitter))
+    layout = [(name, False) for name in ROLE_FILES[:count]]
+    addons = max(1, spec.addons_per_role)
+    for i in range(count - len(layout)):
+        addon = i % addons
+        ext = ADDON_FILE_EXTS[i % len(ADDON_FILE_EXTS)]
+        rel = f"interface/addon{addon:02d}/data/file{i:04d}{ext}"
+        layout.append((rel, rng.random() < spec.shared_ratio))
+    return layout
+
+
+def generate_userdata(userdata: Path, spec: UserdataSpec = None) -> dict:
+    """
+    生成模拟的 userdata 目录
+
+    相同的 spec（含 seed）总是生成相同的目录结构和文件内容。
+
+    Args:
+        userdata: userdata 目录，不存在时创建
+        spec: 规模和文件分布
+
+    Returns:
+        统计信息：角色数、文件数、总字节数
+    """
+    spec = spec or UserdataSpec()
+    rng = random.Random(spec.seed)
+    # 共享文件按相对路径生成一次内容，所有角色使用同一份
+    shared = {}
+    files = 0
+    total_bytes = 0
+
+    for a in range(spec.accounts):
+        account = userdata / f"account{a:03d}"
+        for r in range(spec.regions):
+            for s in range(spec.servers):
+                for n in range(spec.roles):
+                    role_dir = account / f"region{r}" / f"server{s}" / f"role{a:03d}_{r}{s}{n}"
+                    for rel, is_shared in _role_layout(rng, spec):
+                        path = role_dir / rel
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        if is_shared:
+                            if rel not in shared:
+                                shared[rel] = _content(rng, _file_size(rng, spec))
+                            data = shared[rel]
+                        else:
+                            data = _content(rng, _file_size(rng, spec))
+                        path.write_bytes(data)
+                        files += 1
+                        total_bytes += len(data)
+
+    for i in range(spec.server_data_folders):
+        folder = userdata / f"server_data{i}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / 'serverlist.dat').write_bytes(_content(rng, 512))
+
+    return {'roles': spec.role_count, 'files': files, 'bytes': total_bytes}
+
+
+def _unicode_z(value: str) -> bytes:
+    return value.encode('utf-16-le') + b'\0\0'
+
+
+def _counted(value: str) -> bytes:
+    """StringData：字符数 + UTF-16 内容"""
+    return struct.pack('<H', len(value)) + value.encode('utf-16-le')
+
+
+def build_shortcut(target: str, relative_path: str = None, working_dir: str = None,
+                   env_target: str = None) -> bytes:
+    """
+    生成 MS-SHLLINK 格式的快捷方式内容
+
+    包含 LinkInfo（本地路径，同时写入 ANSI 和 Unicode 版本）、相对路径、工作目录，
+    以及可选的环境变量数据块，不包含 IDList
+
+    Args:
+        target: 目标的绝对路径
+        relative_path: 相对于快捷方式所在目录的路径
+        working_dir: 工作目录
+        env_target: 含环境变量的目标路径，如 %ProgramFiles%\\SeasunGame\\SeasunGame.exe
+    """
+    flags = shell_link.HAS_LINK_INFO | shell_link.IS_UNICODE
+    if relative_path:
+        flags |= shell_link.HAS_RELATIVE_PATH
+    if working_dir:
+        flags |= shell_link.HAS_WORKING_DIR
+    if env_target:
+        flags |= shell_link.HAS_EXP_STRING
+
+    header = struct.pack('<I16sIIqqqIIIHHII', shell_link.HEADER_SIZE, shell_link.LINK_CLSID, flags,
+                         0x20, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0)
+
+    # VolumeID：大小、驱动器类型（固定磁盘）、序列号、卷标偏移，卷标为空
+    volume_id = struct.pack('<IIII', 0x11, 3, 0, 0x10) + b'\0'
+    local_base_path = target.encode(shell_link.ANSI_ENCODING, errors='replace') + b'\0'
+    header_size = shell_link.LINK_INFO_UNICODE_HEADER_SIZE
+    volume_offset = header_size
+    local_offset = volume_offset + len(volume_id)
+    suffix_offset = local_offset + len(local_base_path)
+    local_unicode_offset = suffix_offset + 1
+    suffix_unicode_offset = local_unicode_offset + len(_unicode_z(target))
+    body = volume_id + local_base_path + b'\0' + _unicode_z(target) + _unicode_z('')
+    link_info = struct.pack('<9I', header_size + len(body), header_size,
+                            shell_link.VOLUME_ID_AND_LOCAL_BASE_PATH, volume_offset, local_offset, 0,
+                            suffix_offset, local_unicode_offset, suffix_unicode_offset) + body
+
+    strings = b''
+    if relative_path:
+        strings += _counted(relative_path)
+    if working_dir:
+        strings += _counted(working_dir)
+
+    extra = b''
+    if env_target:
+        ansi = env_target.encode(shell_link.ANSI_ENCODING, errors='replace')[:shell_link.ENVIRONMENT_ANSI_SIZE - 1]
+        extra = struct.pack('<II', shell_link.ENVIRONMENT_VARIABLE_BLOCK_SIZE,
+                            shell_link.ENVIRONMENT_VARIABLE_BLOCK)
+        extra += ansi.ljust(shell_link.ENVIRONMENT_ANSI_SIZE, b'\0')
+        extra += _unicode_z(env_target).ljust(shell_link.ENVIRONMENT_VARIABLE_BLOCK_SIZE - 8
+                                              - shell_link.ENVIRONMENT_ANSI_SIZE, b'\0')
+    # 终止块
+    extra += b'\0' * 4
+
+    return header + link_info + strings + extra
+
+
+def generate_game_dir(root: Path, spec: UserdataSpec = None) -> dict:
+    """
+    生成带有启动器、启动器快捷方式和 userdata 的模拟游戏目录
+
+    Returns:
+        统计信息，另含 exe（启动器路径）、shortcut（快捷方式路径）和 userdata（userdata 路径）
+    """
+    root = Path(root)
+    userdata = root / 'Game' / 'JX3' / 'bin' / 'zhcn_hd' / 'userdata'
+    userdata.mkdir(parents=True, exist_ok=True)
+    exe = root / 'SeasunGame.exe'
+    exe.write_bytes(b'MZ')
+    shortcut = root / 'SeasunGame.lnk'
+    shortcut.write_bytes(build_shortcut(str(exe.resolve()), relative_path=f'.\\{exe.name}',
+                                        working_dir=str(root.resolve())))
+
+    stats = generate_userdata(userdata, spec)
+    return {**stats, 'exe': str(exe), 'shortcut': str(shortcut), 'userdata': str(userdata)}
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser):
+    """把 UserdataSpec 的字段添加为命令行参数"""
+    defaults = UserdataSpec()
+    for f in fields(UserdataSpec):
+        value = getattr(defaults, f.name)
+        parser.add_argument(f"--{f.name.replace('_', '-')}", type=type(value), default=value,
+                            dest=f.name, help=f'默认 {value}')
+
+
+def spec_from_args(args: argparse.Namespace) -> UserdataSpec:
+    return UserdataSpec(**{f.name: getattr(args, f.name) for f in fields(UserdataSpec)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成模拟的游戏目录和 userdata')
+    parser.add_argument('output', help='输出目录')
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    stats = generate_game_dir(Path(args.output), spec_from_args(args))
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+内容寻址存储模块
+按文件内容哈希存储备份数据，相同内容只保存一份
+"""
+import hashlib
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Set, Tuple
+
+from .file_cloner import STRATEGY_COPY, STRATEGY_HARDLINK, STRATEGY_REFLINK, clone_file
+
+
+class BlobStore:
+    """内容寻址的文件块存储"""
+
+    HASH_NAME = 'blake2b'
+    DIGEST_SIZE = 20
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root: str):
+        """
+        初始化存储
+
+        Args:
+            root: 存储根目录，文件块按 <前两位>/<完整哈希> 存放
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        # 正在写入中的备份引用的文件块，垃圾回收时不能删除
+        self._lock = threading.Lock()
+        self._pinned = Counter()
+
+    @classmethod
+    def hash_file(cls, path: Path) -> str:
+        """计算文件内容哈希"""
+        h = hashlib.blake2b(digest_size=cls.DIGEST_SIZE)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.CHUNK_SIZE), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def blob_path(self, digest: str) -> Path:
+        """获取文件块路径"""
+        return self.root / digest[:2] / digest
+
+    def has(self, digest: str) -> bool:
+        """文件块是否存在"""
+        return self.blob_path(digest).is_file()
+
+    def put_file(self, path: Path, strategy: str = STRATEGY_COPY,
+                 digest: str = None) -> Tuple[str, Optional[str]]:
+        """
+        存入文件，内容已存在时跳过写入
+
+        调用方需在写完清单后调用 release() 释放引用
+
+        Args:
+            path: 源文件路径
+            strategy: 写入文件块时使用的克隆策略
+            digest: 已知的内容哈希（如来自哈希缓存），为空时读取文件计算
+
+        Returns:
+            (哈希, 写入机制)，内容已存在时写入机制为 None。源文件在计算哈希之后被修改时，
+            返回的是实际写入内容的哈希，可能与传入的 digest 不同
+        """
+        digest = digest or self.hash_file(path)
+
+        with self._lock:
+            self._pinned[digest] += 1
+            if self.has(digest):
+                return digest, None
+
+        blob = self.blob_path(digest)
+        blob.parent.mkdir(exist_ok=True)
+
+        # 先写临时文件再原子重命名，避免中断时留下不完整的文件块
+        tmp = blob.with_name(f"{digest}.{threading.get_ident()}.tmp")
+        try:
+            mechanism = clone_file(path, tmp, strategy)
+            # 哈希和复制之间源文件可能被游戏改写，按实际写入的内容命名，文件块内容总与名称一致
+            actual = self.hash_file(tmp)
+            if actual != digest:
+                with self._lock:
+                    self._pinned[actual] += 1
+                self.release([digest])
+                digest = actual
+                blob = self.blob_path(digest)
+                blob.parent.mkdir(exist_ok=True)
+                if self.has(digest):
+                    return digest, None
+            os.replace(tmp, blob)
+        except Exception:
+            self.release([digest])
+            raise
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+        return digest, mechanism
+
+    def release(self, digests: Iterable[str]):
+        """释放 put_file 产生的引用"""
+        with self._lock:
+            for digest in digests:
+                self._pinned[digest] -= 1
+                if self._pinned[digest] <= 0:
+                    del self._pinned[digest]
+
+    def restore_file(self, digest: str, target: Path, strategy: str = STRATEGY_COPY) -> str:
+        """
+        将文件块还原到目标路径
+
+        还原出的文件会被游戏修改，不能与文件块共用硬链接，
+        硬链接策略按 reflink 处理。
+
+        Returns:
+            实际使用的机制
+        """
+        if strategy == STRATEGY_HARDLINK:
+            strategy = STRATEGY_REFLINK
+        return clone_file(self.blob_path(digest), target, strategy)
+
+    def iter_blobs(self) -> Iterator[Path]:
+        """遍历所有文件块"""
+        for bucket in self.root.iterdir():
+            if not bucket.is_dir():
+                continue
+            for blob in bucket.iterdir():
+                if blob.is_file() and not blob.name.endswith('.tmp'):
+                    yield blob
+
+    def gc(self, referenced: Iterable[str]) -> dict:
+        """
+        删除未被引用的文件块
+
+        Args:
+            referenced: 仍被备份清单引用的哈希集合
+
+        Returns:
+            {'removed': int, 'freed': int}
+        """
+        referenced = set(referenced)
+        removed = 0
+        freed = 0
+
+        # 整个回收过程持有锁，保证新备份引用的文件块不会被误删
+        with self._lock:
+            for blob in list(self.iter_blobs()):
+                digest = blob.name
+                if digest in referenced or digest in self._pinned:
+                    continue
+                try:
+                    size = blob.stat().st_size
+                    blob.unlink()
+                    removed += 1
+                    freed += size
+                except OSError as e:
+                    print(f"删除文件块失败: {e}")
+
+            for bucket in self.root.iterdir():
+                if bucket.is_dir() and not any(bucket.iterdir()):
+                    bucket.rmdir()
+
+        return {'removed': removed, 'freed': freed}
+
+    def discard(self, digests: Iterable[str],
+                referenced: Callable[[Set[str]], Set[str]] = None) -> dict:
+        """
+        删除指定的文件块，正在被写入中的备份引用的除外
+
+        新备份在写入清单和备份目录之前一直占用文件块的引用，因此在锁内先排除被占用的文件块、
+        再查询 referenced，两步之间不会有备份完成写入，查询结果与删除是一致的
+
+        Args:
+            digests: 候选哈希
+            referenced: 返回候选中仍被备份引用的哈希，在锁内调用；为空表示候选已确认不再被引用
+
+        Returns:
+            {'removed': int, 'freed': int}
+        """
+        removed = 0
+        freed = 0
+        with self._lock:
+            digests = {digest for digest in digests if digest not in self._pinned}
+            if referenced and digests:
+                digests -= referenced(digests)
+            for digest in digests:
+                blob = self.blob_path(digest)
+                try:
+                    size = blob.stat().st_size
+                    blob.unlink()
+                    removed += 1
+                    freed += size
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"删除文件块失败: {e}")
+
+        return {'removed': removed, 'freed': freed}
+
+    def clear(self) -> dict:
+        """
+        清空存储，正在被写入中的备份引用的文件块及其临时文件保留
+
+        Returns:
+            {'removed': int, 'freed': int}
+        """
+        return self.gc(())
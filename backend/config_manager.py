@@ -3,12 +3,21 @@
 处理应用配置的保存和加载
 """
 import json
+import os
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
+
+from .sync_profile import SyncProfile
 
 
 class ConfigManager:
-    """配置管理器"""
+    """
+    配置管理器
+
+    多个请求线程可能同时读写配置，修改和保存都在锁内进行，
+    保存时先写临时文件再替换，不会留下写了一半的配置文件。
+    """
 
     DEFAULT_CONFIG = {
         'game_path': '',
@@ -16,6 +25,35 @@ class ConfigManager:
         'auto_backup': True,
         'confirm_before_copy': True,
         'max_backups': 5,
+        'copy_mode': 'staged',
+        'copy_use_hash': False,
+        'copy_workers': 4,
+        'copy_clone_strategy': 'reflink',
+        'backup_clone_strategy': 'reflink',
+        'backup_format': 'store',
+        'backup_compression_level': 3,
+        'backup_use_dictionary': False,
+        'watch_roles': True,
+        'job_workers': 2,
+        # 按磁盘设备限制并发的文件操作数，上限在 1 和最大值之间按实测延迟自动调整
+        'io_scheduler_enabled': True,
+        'io_initial_concurrency': 4,
+        'io_max_concurrency': 16,
+        # 多线程服务器的工作线程数
+        'server_threads': 8,
+        # 角色被其他操作占用时最多等待的秒数，0 表示立即返回 409，null 表示一直等待
+        'role_lock_timeout': 30,
+        # 文件哈希缓存最多保存的记录数
+        'hash_cache_entries': 200000,
+        # 是否记录运行指标（/api/metrics），关闭后几乎没有开销
+        'metrics_enabled': True,
+        # 性能分析所有请求：false、'cpu' 或 'full'（同时记录内存）；单个请求可用 X-Profile 请求头开启
+        'profile_requests': False,
+        'profile_max_captures': 20,
+        # 备份保留策略，见 RetentionPolicy；为空时保留所有备份
+        'retention': {},
+        # 同步方案 {名称: {'include': [...], 'exclude': [...], 'description': str}}
+        'sync_profiles': {},
         'version': '1.0.0'
     }
 
@@ -28,6 +66,7 @@ class ConfigManager:
         """
         self.config_file = Path(config_file)
         self.config = self.DEFAULT_CONFIG.copy()
+        self._lock = threading.RLock()
         self.load()
 
     def load(self) -> dict:
@@ -41,6 +80,7 @@ class ConfigManager:
             try:
                 with open(self.config_file, 'r', encoding='utf-8') as f:
                     loaded = json.load(f)
+                with self._lock:
                     self.config.update(loaded)
             except Exception as e:
                 print(f"加载配置失败: {e}")
@@ -55,8 +95,11 @@ class ConfigManager:
             是否保存成功
         """
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
+            with self._lock:
+                tmp = self.config_file.with_suffix('.tmp')
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(self.config, f, indent=2, ensure_ascii=False)
+                os.replace(tmp, self.config_file)
             return True
         except Exception as e:
             print(f"保存配置失败: {e}")
@@ -68,12 +111,53 @@ class ConfigManager:
 
     def set(self, key: str, value):
         """设置配置项"""
-        self.config[key] = value
+        with self._lock:
+            self.config[key] = value
 
     def update(self, **kwargs):
         """批量更新配置"""
-        self.config.update(kwargs)
+        with self._lock:
+            self.config.update(kwargs)
 
     def reset(self):
         """重置为默认配置"""
-        self.config = self.DEFAULT_CONFIG.copy()
+        with self._lock:
+            self.config = self.DEFAULT_CONFIG.copy()
+
+    def get_sync_profiles(self) -> Dict[str, SyncProfile]:
+        """获取所有同步方案，格式无效的方案会被跳过"""
+        profiles = {}
+        for name, data in (self.config.get('sync_profiles') or {}).items():
+            try:
+                profiles[name] = SyncProfile.from_dict({**data, 'name': name})
+            except ValueError as e:
+                print(f"同步方案无效 {name}: {e}")
+        return profiles
+
+    def get_sync_profile(self, name: str) -> Optional[SyncProfile]:
+        """按名称获取同步方案"""
+        return self.get_sync_profiles().get(name)
+
+    def set_sync_profile(self, profile: SyncProfile):
+        """添加或修改同步方案（需调用 save 保存）"""
+        data = profile.to_dict()
+        del data['name']
+        with self._lock:
+            profiles = dict(self.config.get('sync_profiles') or {})
+            profiles[profile.name] = data
+            self.config['sync_profiles'] = profiles
+
+    def delete_sync_profile(self, name: str) -> bool:
+        """
+        删除同步方案（需调用 save 保存）
+
+        Returns:
+            方案是否存在
+        """
+        with self._lock:
+            profiles = dict(self.config.get('sync_profiles') or {})
+            if name not in profiles:
+                return False
+            del profiles[name]
+            self.config['sync_profiles'] = profiles
+        return True
@@ -0,0 +1,148 @@
+"""
+文件克隆模块
+同一文件系统上优先共享数据块（reflink），失败时回退到硬链接或普通复制
+"""
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+
+# 克隆策略
+STRATEGY_COPY = 'copy'          # 普通复制
+STRATEGY_REFLINK = 'reflink'    # reflink -> copy_file_range -> 普通复制
+STRATEGY_HARDLINK = 'hardlink'  # reflink -> 硬链接 -> copy_file_range -> 普通复制
+STRATEGIES = (STRATEGY_COPY, STRATEGY_REFLINK, STRATEGY_HARDLINK)
+
+# 实际使用的机制
+MECHANISM_REFLINK = 'reflink'
+MECHANISM_COPY_FILE_RANGE = 'copy_file_range'
+MECHANISM_HARDLINK = 'hardlink'
+MECHANISM_COPY = 'copy'
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# 已知不支持 reflink / copy_file_range 的 (源设备, 目标设备)，避免反复尝试
+_unsupported_lock = threading.Lock()
+_reflink_unsupported = set()
+_copy_range_unsupported = set()
+
+
+def try_reflink(src, dst) -> bool:
+    """
+    只尝试 reflink，不回退到其他机制
+
+    Args:
+        src: 源文件
+        dst: 目标文件（不存在）
+
+    Returns:
+        是否成功共享数据块
+    """
+    src = Path(src)
+    dst = Path(dst)
+    devices = (os.stat(src).st_dev, os.stat(dst.parent).st_dev)
+    if devices[0] != devices[1]:
+        return False
+    if _try_reflink(src, dst, devices):
+        shutil.copystat(src, dst)
+        return True
+    return False
+
+
+def _try_reflink(src: Path, dst: Path, devices: tuple) -> bool:
+    """尝试 FICLONE ioctl，失败时删除已创建的目标文件"""
+    if not HAS_FCNTL or not sys.platform.startswith('linux'):
+        return False
+    if devices in _reflink_unsupported:
+        return False
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return True
+        except OSError:
+            with _unsupported_lock:
+                _reflink_unsupported.add(devices)
+    dst.unlink()
+    return False
+
+
+def _try_copy_file_range(src: Path, dst: Path, devices: tuple) -> bool:
+    """尝试 copy_file_range，由内核完成复制，部分文件系统会共享数据块"""
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    if devices in _copy_range_unsupported:
+        return False
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+            return True
+        except OSError:
+            with _unsupported_lock:
+                _copy_range_unsupported.add(devices)
+    dst.unlink()
+    return False
+
+
+def clone_file(src, dst, strategy: str = STRATEGY_REFLINK) -> str:
+    """
+    克隆单个文件，并保留修改时间等元数据
+
+    硬链接与源文件共享同一份数据，源文件被原地修改时链接也会随之改变，
+    因此只应用于只读的备份快照，不能用于角色之间的复制。
+
+    Args:
+        src: 源文件
+        dst: 目标文件（不能已存在为目录）
+        strategy: 克隆策略，见 STRATEGIES
+
+    Returns:
+        实际使用的机制
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f'不支持的克隆策略: {strategy}')
+
+    src = Path(src)
+    dst = Path(dst)
+
+    # 先删除已有文件而不是原地覆盖，避免改写与备份共享数据的硬链接
+    if dst.is_file() or dst.is_symlink():
+        dst.unlink()
+
+    if strategy != STRATEGY_COPY:
+        devices = (os.stat(src).st_dev, os.stat(dst.parent).st_dev)
+        same_device = devices[0] == devices[1]
+
+        if same_device and _try_reflink(src, dst, devices):
+            shutil.copystat(src, dst)
+            return MECHANISM_REFLINK
+
+        # copy_file_range 在多数文件系统上仍会复制数据，因此排在硬链接之后
+        if strategy == STRATEGY_HARDLINK and same_device:
+            try:
+                os.link(src, dst)
+                return MECHANISM_HARDLINK
+            except OSError:
+                pass
+
+        if _try_copy_file_range(src, dst, devices):
+            shutil.copystat(src, dst)
+            return MECHANISM_COPY_FILE_RANGE
+
+    shutil.copy2(src, dst)
+    return MECHANISM_COPY
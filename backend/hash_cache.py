@@ -0,0 +1,225 @@
+"""
+文件哈希缓存模块
+记录文件内容哈希，文件未变化时直接返回上次的结果，不再读取文件内容
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from .blob_store import BlobStore
+from .metrics import STAT_CALLS, metrics
+
+
+class HashCache:
+    """
+    文件哈希缓存
+
+    以 (设备号, inode, 大小, 修改时间) 判断文件是否变化：文件被重命名或移动后
+    仍能命中，内容被修改后修改时间或大小变化，自然失效。超过容量时淘汰最久未
+    使用的记录。
+
+    指定 db_path 时持久化到 SQLite：创建时（lazy 时为 load() 或第一次使用时）读入内存，
+    新记录和访问顺序攒批写回，close() 或 flush() 时落盘，磁盘上同样只保留最近使用的
+    max_entries 条。
+    哈希算法与 BlobStore 相同（blake2b）。
+    """
+
+    SCHEMA_VERSION = 1
+    # 积累多少条未写入的记录后自动写回
+    FLUSH_THRESHOLD = 2000
+    # 修改时间距今不足此值（纳秒）的文件可能仍在写入，同一时间戳内再次修改无法察觉，不缓存
+    RACY_WINDOW_NS = 2 * 10 ** 9
+
+    def __init__(self, db_path: str = None, max_entries: int = 200000, lazy: bool = False):
+        """
+        Args:
+            db_path: 数据库文件路径，为空时只缓存在内存中
+            max_entries: 最多缓存的记录数（内存和磁盘相同）
+            lazy: 创建时不读取数据库，推迟到 load() 或第一次使用时
+        """
+        self.db_path = Path(db_path) if db_path else None
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # key -> [哈希, 最近使用序号]
+        self._entries = OrderedDict()
+        self._dirty = set()
+        self._seq = 0
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._loaded = False
+        if not lazy:
+            self.load()
+
+    def load(self):
+        """读入数据库中的记录，已经读过时直接返回"""
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                if self.db_path:
+                    self._open()
+                self._loaded = True
+
+    def _open(self):
+        try:
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            with self._conn:
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+                if version not in (0, self.SCHEMA_VERSION):
+                    self._conn.execute('DROP TABLE IF EXISTS hashes')
+                self._conn.execute('''
+                    CREATE TABLE IF NOT EXISTS hashes (
+                        dev INTEGER NOT NULL,
+                        ino TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL,
+                        digest TEXT NOT NULL,
+                        used INTEGER NOT NULL,
+                        PRIMARY KEY (dev, ino)
+                    )
+                ''')
+                self._conn.execute('CREATE INDEX IF NOT EXISTS idx_hashes_used ON hashes (used)')
+                self._conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+
+            rows = self._conn.execute(
+                'SELECT dev, ino, size, mtime_ns, digest, used FROM hashes ORDER BY used DESC LIMIT ?',
+                (self.max_entries,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"加载哈希缓存失败: {e}")
+            if self._conn:
+                self._conn.close()
+            self._conn = None
+            return
+
+        for dev, ino, size, mtime_ns, digest, used in reversed(rows):
+            self._entries[(dev, ino, size, mtime_ns)] = [digest, used]
+        if rows:
+            self._seq = rows[0][5]
+
+    @staticmethod
+    def _key(path, entry) -> tuple:
+        """
+        缓存键
+
+        entry 可以是 os.stat_result、带 dev/ino/size/mtime_ns 属性的 FileEntry，
+        或 None（此时调用 stat）。文件系统不提供 inode 时用路径代替。
+        """
+        if entry is None:
+            metrics.inc(STAT_CALLS, source='hash_cache')
+            entry = os.stat(path)
+        if hasattr(entry, 'st_ino'):
+            dev, ino, size, mtime_ns = entry.st_dev, entry.st_ino, entry.st_size, entry.st_mtime_ns
+        else:
+            dev, ino, size, mtime_ns = entry.dev, entry.ino, entry.size, entry.mtime_ns
+        # inode 可能超出 SQLite 整数范围（如 Windows 的 128 位文件 ID），统一存为文本
+        ino = str(ino) if ino else os.fspath(path)
+        return dev, ino, size, mtime_ns
+
+    def hash_file(self, path: Path, entry=None) -> str:
+        """
+        获取文件内容哈希
+
+        Args:
+            path: 文件路径
+            entry: 已有的文件信息（os.stat_result 或 FileEntry），提供时不再调用 stat
+
+        Returns:
+            与 BlobStore.hash_file 相同的哈希
+        """
+        key = self._key(path, entry)
+        self.load()
+        with self._lock:
+            record = self._entries.get(key)
+            if record is not None:
+                self.hits += 1
+                self._touch(key, record)
+                return record[0]
+            self.misses += 1
+
+        digest = BlobStore.hash_file(path)
+        if time.time_ns() - key[3] < self.RACY_WINDOW_NS:
+            return digest
+
+        with self._lock:
+            record = [digest, 0]
+            self._entries[key] = record
+            self._touch(key, record)
+            while len(self._entries) > self.max_entries:
+                old, _ = self._entries.popitem(last=False)
+                self._dirty.discard(old)
+            if len(self._dirty) >= self.FLUSH_THRESHOLD:
+                self.flush()
+        return digest
+
+    def _touch(self, key: tuple, record: list):
+        """标记为最近使用，调用方需持有锁"""
+        self._seq += 1
+        record[1] = self._seq
+        self._entries.move_to_end(key)
+        if self._conn:
+            self._dirty.add(key)
+
+    def flush(self):
+        """把新记录和访问顺序写入磁盘，并按最近使用顺序裁剪到容量以内"""
+        with self._lock:
+            if not self._conn or not self._dirty:
+                return
+            # 按使用顺序写入：同一文件（dev, ino 相同）有多条记录时保留最新的
+            rows = sorted(((*key, *self._entries[key]) for key in self._dirty),
+                          key=lambda row: row[5])
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        'INSERT OR REPLACE INTO hashes (dev, ino, size, mtime_ns, digest, used) '
+                        'VALUES (?, ?, ?, ?, ?, ?)', rows
+                    )
+                    self._conn.execute(
+                        'DELETE FROM hashes WHERE rowid IN '
+                        '(SELECT rowid FROM hashes ORDER BY used DESC LIMIT -1 OFFSET ?)',
+                        (self.max_entries,)
+                    )
+            except sqlite3.Error as e:
+                print(f"保存哈希缓存失败: {e}")
+                return
+            self._dirty.clear()
+
+    def stats(self) -> dict:
+        """缓存统计"""
+        self.load()
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'persistent': self._conn is not None
+            }
+
+    def clear(self):
+        """清空缓存和计数"""
+        self.load()
+        with self._lock:
+            self._entries.clear()
+            self._dirty.clear()
+            self.hits = 0
+            self.misses = 0
+            if self._conn:
+                with self._conn:
+                    self._conn.execute('DELETE FROM hashes')
+
+    def close(self):
+        """写回未保存的记录并关闭数据库"""
+        with self._lock:
+            self.flush()
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+            self._loaded = True
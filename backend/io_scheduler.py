@@ -0,0 +1,301 @@
+"""
+I/O 调度模块
+按文件所在的设备（st_dev）分别限制并发的文件操作数，并根据实测延迟调整上限；
+交互操作优先于后台操作（清理旧备份、删除旧目录等）
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .metrics import IO_WAIT, metrics
+
+# 优先级，数值越小越优先
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BACKGROUND: 'background'}
+
+# 工作量折算：每个文件操作算 1 个单位（打开、寻道等固定开销），另按大小每 UNIT_BYTES 算 1 个单位
+UNIT_BYTES = 512 * 1024
+# 每个统计窗口至少包含的操作数和时长（秒）
+WINDOW_OPS = 32
+WINDOW_SECONDS = 0.5
+# 相邻两个窗口的吞吐量相差在该比例以内视为没有变化
+THROUGHPUT_TOLERANCE = 0.05
+# 设备缓存最多记录的目录数
+DEVICE_CACHE_SIZE = 4096
+
+# 关闭时 slot() 返回的空上下文
+_NULL_SLOT = nullcontext()
+
+
+class DeviceQueue:
+    """
+    单个设备的并发限制
+
+    等待者按 (优先级, 到达顺序) 排队；后台操作最多占用一半的并发数，
+    给交互操作留出余量。
+
+    并发数用满时，每个统计窗口按实测延迟算出吞吐量（并发数 / 单位工作量的延迟），
+    与上一个窗口比较后把上限加一或减一（爬山法）：吞吐量上升则继续同方向调整，
+    下降则反向；没有明显变化说明增加并发只会拉长延迟，往小调整。机械硬盘上并发
+    增加会因寻道变慢，上限会收敛到很小的值；固态硬盘则会增加到吞吐量不再上升为止。
+    """
+
+    def __init__(self, device: int, initial: int, maximum: int):
+        self.device = device
+        self.limit = float(max(1, min(initial, maximum)))
+        self.maximum = maximum
+        self.active = 0
+        self.active_background = 0
+        self.last_latency: Optional[float] = None
+        self.last_throughput: Optional[float] = None
+        self.ops = 0
+        self._direction = 1
+        self._cond = threading.Condition()
+        self._waiters: List[tuple] = []
+        self._seq = itertools.count()
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_started = time.monotonic()
+        self._window_ops = 0
+        self._window_work = 0.0
+        self._window_latency = 0.0
+        self._window_saturated = False
+
+    def _can_run(self, priority: int) -> bool:
+        limit = int(self.limit)
+        if self.active >= limit:
+            return False
+        return priority == PRIORITY_INTERACTIVE or self.active_background < max(1, limit // 2)
+
+    def acquire(self, priority: int):
+        with self._cond:
+            if not self._waiters and self._can_run(priority):
+                self._grant(priority)
+                return
+            waiter = (priority, next(self._seq))
+            heapq.heappush(self._waiters, waiter)
+            # 有操作在排队，说明并发数已经不够用
+            self._window_saturated = True
+            try:
+                while self._waiters[0] is not waiter or not self._can_run(priority):
+                    self._cond.wait()
+            except BaseException:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiters)
+            self._grant(priority)
+            # 可能还有空位给下一个等待者
+            self._cond.notify_all()
+
+    def _grant(self, priority: int):
+        self.active += 1
+        if priority != PRIORITY_INTERACTIVE:
+            self.active_background += 1
+        if self.active >= int(self.limit):
+            self._window_saturated = True
+
+    def release(self, priority: int, seconds: float = None, size: int = 0):
+        """释放名额，seconds 为 None 时（操作未执行）不计入统计"""
+        with self._cond:
+            self.active -= 1
+            if priority != PRIORITY_INTERACTIVE:
+                self.active_background -= 1
+            self._cond.notify_all()
+            if seconds is None:
+                return
+            self.ops += 1
+            self._window_ops += 1
+            self._window_work += 1 + size / UNIT_BYTES
+            self._window_latency += seconds
+            if self._window_ops >= WINDOW_OPS and \
+                    time.monotonic() - self._window_started >= WINDOW_SECONDS:
+                self._adjust()
+
+    def _adjust(self):
+        elapsed = time.monotonic() - self._window_started
+        self.last_latency = self._window_latency / self._window_work
+        # 并发数没有用满时吞吐量取决于提交的操作而不是设备，不据此调整
+        if self._window_saturated:
+            throughput = self._window_work / elapsed
+            previous = self.last_throughput
+            if previous is not None:
+                if throughput < previous * (1 - THROUGHPUT_TOLERANCE):
+                    self._direction = -self._direction
+                elif throughput <= previous * (1 + THROUGHPUT_TOLERANCE):
+                    # 吞吐量不变时减少并发以缩短延迟；已经是 1 时向上试探
+                    self._direction = 1 if self.limit <= 1 else -1
+            self.limit = max(1.0, min(float(self.maximum), self.limit + self._direction))
+            self.last_throughput = throughput
+        self._reset_window()
+
+    def to_dict(self) -> dict:
+        with self._cond:
+            return {
+                'device': self.device,
+                'limit': int(self.limit),
+                'active': self.active,
+                'waiting': len(self._waiters),
+                'ops': self.ops,
+                'latency_ms_per_unit': round(self.last_latency * 1000, 3) if self.last_latency else None,
+                'throughput_units_per_second': round(self.last_throughput, 1) if self.last_throughput else None
+            }
+
+
+class _Slot:
+    """持有一个或多个设备的并发名额，退出时记录耗时"""
+
+    __slots__ = ('queues', 'priority', 'size', 'measure', 'started')
+
+    def __init__(self, queues: List[DeviceQueue], priority: int, size: int, measure: bool):
+        self.queues = queues
+        self.priority = priority
+        self.size = size
+        self.measure = measure
+
+    def __enter__(self):
+        waited = time.perf_counter()
+        acquired = []
+        try:
+            # 按设备号顺序获取，同时占用两个设备的操作之间不会互相等待
+            for queue in self.queues:
+                queue.acquire(self.priority)
+                acquired.append(queue)
+        except BaseException:
+            for queue in acquired:
+                queue.release(self.priority)
+            raise
+        self.started = time.perf_counter()
+        metrics.observe(IO_WAIT, self.started - waited, priority=PRIORITY_NAMES[self.priority])
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started if self.measure else None
+        for queue in reversed(self.queues):
+            queue.release(self.priority, seconds, self.size)
+        return False
+
+
+class IOScheduler:
+    """
+    按设备限制并发的文件操作调度器
+
+    用法：
+        with io_scheduler.slot(src, dst, size=entry.size):
+            clone_file(src, dst)
+
+    源和目标在不同设备上时同时占用两个设备的名额；同一设备上只占用一个。
+    设备按路径的上级目录识别并缓存，不存在的路径向上查找。
+    """
+
+    def __init__(self, enabled: bool = True, initial: int = 4, maximum: int = 16):
+        """
+        Args:
+            enabled: 关闭时 slot() 直接返回空上下文
+            initial: 每个设备的初始并发数
+            maximum: 每个设备的最大并发数
+        """
+        self.enabled = enabled
+        self.initial = initial
+        self.maximum = maximum
+        self._lock = threading.Lock()
+        self._queues: Dict[int, DeviceQueue] = {}
+        self._devices: Dict[str, int] = {}
+        self._local = threading.local()
+
+    def configure(self, enabled: bool = None, initial: int = None, maximum: int = None):
+        """修改设置，已有设备的当前并发数限制在新的最大值以内"""
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if initial is not None:
+                self.initial = max(1, int(initial))
+            if maximum is not None:
+                self.maximum = max(1, int(maximum))
+            for queue in self._queues.values():
+                queue.maximum = self.maximum
+                queue.limit = min(queue.limit, float(self.maximum))
+
+    @property
+    def priority(self) -> int:
+        """当前线程的优先级"""
+        return getattr(self._local, 'priority', PRIORITY_INTERACTIVE)
+
+    @contextmanager
+    def background(self):
+        """with 块中当前线程提交的操作按后台优先级调度"""
+        previous = self.priority
+        self._local.priority = PRIORITY_BACKGROUND
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def device_of(self, path) -> Optional[int]:
+        """路径所在的设备号，按上级目录缓存；找不到存在的上级目录时返回 None"""
+        directory = Path(path).parent
+        key = str(directory)
+        device = self._devices.get(key)
+        if device is not None:
+            return device
+
+        for candidate in (directory, *directory.parents):
+            try:
+                device = os.stat(candidate).st_dev
+                break
+            except OSError:
+                continue
+        else:
+            return None
+
+        with self._lock:
+            if len(self._devices) >= DEVICE_CACHE_SIZE:
+                self._devices.clear()
+            self._devices[key] = device
+        return device
+
+    def _queue(self, device: int) -> DeviceQueue:
+        queue = self._queues.get(device)
+        if queue is None:
+            with self._lock:
+                queue = self._queues.get(device)
+                if queue is None:
+                    queue = self._queues[device] = DeviceQueue(device, self.initial, self.maximum)
+        return queue
+
+    def slot(self, *paths, size: int = 0, priority: int = None, measure: bool = True):
+        """
+        获取路径所在设备的并发名额
+
+        Args:
+            paths: 操作涉及的路径（源、目标）
+            size: 传输的字节数，用于折算延迟
+            priority: 优先级，默认使用当前线程的优先级
+            measure: 是否计入延迟统计；删除整个目录等耗时与文件数相关的批量操作不计入
+        """
+        if not self.enabled:
+            return _NULL_SLOT
+        devices = sorted({device for device in map(self.device_of, paths) if device is not None})
+        if not devices:
+            return _NULL_SLOT
+        if priority is None:
+            priority = self.priority
+        return _Slot([self._queue(device) for device in devices], priority, size, measure)
+
+    def stats(self) -> List[dict]:
+        """各设备的当前并发上限、排队数和延迟"""
+        with self._lock:
+            queues = list(self._queues.values())
+        return [queue.to_dict() for queue in queues]
+
+
+# 全局调度器，复制、备份和还原共用，由 app 根据配置设置
+io_scheduler = IOScheduler()
@@ -0,0 +1,308 @@
+"""
+后台任务模块
+在后台线程池中执行复制、备份、还原等耗时操作，并提供进度查询和取消
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List, Optional
+
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+    def __init__(self):
+        super().__init__('任务已取消')
+
+
+class Job:
+    """
+    后台任务
+
+    report() 可直接作为 RoleCopier / BackupManager 的 progress 回调，
+    任务被取消后下一次回调会抛出 JobCancelled 中止操作。
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    FINISHED = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+
+    # 瞬时吞吐量的统计窗口（秒）
+    THROUGHPUT_WINDOW = 1.0
+
+    def __init__(self, kind: str, description: str = ''):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.description = description
+        self.status = self.STATUS_PENDING
+        self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result = None
+        self.error: Optional[str] = None
+
+        self.current = 0
+        self.total = 0
+        self.message = ''
+        self.files_done = 0
+        self.bytes_done = 0
+        self.throughput = 0.0
+
+        self._cancel_event = threading.Event()
+        self._cond = threading.Condition()
+        self._version = 0
+        self._window_start = 0.0
+        self._window_bytes = 0
+        # 操作标识 -> 已累加的 (文件数, 字节数)
+        self._operations = {}
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in self.FINISHED
+
+    def cancel(self):
+        """请求取消，正在运行的任务在下一次进度回调时中止"""
+        self._cancel_event.set()
+        with self._cond:
+            if self.status == self.STATUS_PENDING:
+                self._finish(self.STATUS_CANCELLED, error='任务已取消')
+
+    def check_cancelled(self):
+        """任务已被取消时抛出 JobCancelled"""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def report(self, current: int, total: int, message: str,
+               files_done: int = 0, bytes_done: int = 0, operation=None):
+        """
+        进度回调
+
+        Args:
+            files_done: 本次操作已写入的文件数
+            bytes_done: 本次操作已写入的字节数
+            operation: 操作标识（见 ProgressReporter）；同一任务中可能先后执行多个操作
+                （如先备份再复制），每个操作的计数从 0 开始，按操作分别计算增量后累加
+        """
+        self.check_cancelled()
+
+        now = time.monotonic()
+        with self._cond:
+            self.current = current
+            self.total = total
+            self.message = message
+
+            # 计数只增不减，晚到的旧进度不会重复累加
+            last_files, last_bytes = self._operations.get(operation, (0, 0))
+            files_done = max(files_done, last_files)
+            bytes_done = max(bytes_done, last_bytes)
+            delta = bytes_done - last_bytes
+            self.files_done += files_done - last_files
+            self.bytes_done += delta
+            self._window_bytes += delta
+            self._operations[operation] = (files_done, bytes_done)
+
+            elapsed = now - self._window_start
+            if elapsed >= self.THROUGHPUT_WINDOW:
+                self.throughput = self._window_bytes / elapsed
+                self._window_start = now
+                self._window_bytes = 0
+            elif not self.throughput and elapsed > 0:
+                # 第一个统计窗口结束前先给出估计值
+                self.throughput = self._window_bytes / elapsed
+
+            self._bump()
+
+    def wait_for_update(self, version: int, timeout: float) -> int:
+        """
+        等待任务状态更新
+
+        Args:
+            version: 调用方已看到的版本号
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            当前版本号
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != version or self.finished, timeout)
+            return self._version
+
+    def to_dict(self) -> dict:
+        with self._cond:
+            elapsed = None
+            average = 0.0
+            if self.started_at:
+                elapsed = (self.finished_at or time.monotonic()) - self.started_at
+                if elapsed > 0:
+                    average = self.bytes_done / elapsed
+
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'description': self.description,
+                'status': self.status,
+                'created_at': self.created_at,
+                'elapsed': elapsed,
+                'version': self._version,
+                'progress': {
+                    'current': self.current,
+                    'total': self.total,
+                    'message': self.message,
+                    'files_done': self.files_done,
+                    'bytes_done': self.bytes_done,
+                    'throughput': self.throughput,
+                    'average_throughput': average
+                },
+                'result': self.result,
+                'error': self.error
+            }
+
+    def _start(self) -> bool:
+        with self._cond:
+            if self.status != self.STATUS_PENDING:
+                return False
+            self.status = self.STATUS_RUNNING
+            self.started_at = time.monotonic()
+            self._window_start = self.started_at
+            self._bump()
+            return True
+
+    def _finish(self, status: str, result=None, error: str = None):
+        with self._cond:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.monotonic()
+            self._bump()
+
+    def _bump(self):
+        self._version += 1
+        self._cond.notify_all()
+
+
+class JobManager:
+    """后台任务管理器"""
+
+    def __init__(self, max_workers: int = 2, keep_finished: int = 50):
+        """
+        初始化任务管理器
+
+        Args:
+            max_workers: 同时执行的任务数
+            keep_finished: 保留的已结束任务数量
+        """
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, func: Callable[[Job], object], description: str = '') -> Job:
+        """
+        提交任务
+
+        Args:
+            kind: 任务类型，如 copy_multiple / backup / restore
+            func: 任务函数，接收 Job，返回值作为任务结果
+            description: 任务说明
+
+        Returns:
+            新建的任务
+        """
+        job = Job(kind, description)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, func)
+        return job
+
+    @contextmanager
+    def track(self, kind: str, description: str = ''):
+        """
+        在当前线程中执行操作，同时登记为任务以便查询进度和取消
+
+        用于必须在请求线程中完成的流式操作（如导出、导入角色包）。
+        with 块中可以设置 job.result 作为任务结果；块内抛出异常或生成器
+        被关闭（客户端断开）时任务标记为失败或已取消。
+
+        Yields:
+            已开始运行的任务
+        """
+        job = Job(kind, description)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job._start()
+
+        try:
+            yield job
+        except JobCancelled as e:
+            job._finish(Job.STATUS_CANCELLED, error=str(e))
+            raise
+        except GeneratorExit:
+            job._finish(Job.STATUS_CANCELLED, error='连接已断开')
+            raise
+        except Exception as e:
+            job._finish(Job.STATUS_FAILED, error=str(e))
+            raise
+        else:
+            job._finish(Job.STATUS_SUCCEEDED, job.result)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Job]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        取消任务
+
+        Returns:
+            任务是否存在且尚未结束
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel()
+        return True
+
+    def shutdown(self):
+        """取消所有任务并关闭线程池"""
+        for job in self.list_jobs():
+            job.cancel()
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _run(job: Job, func: Callable[[Job], object]):
+        if not job._start():
+            return
+
+        try:
+            result = func(job)
+            if job.cancel_requested:
+                job._finish(Job.STATUS_CANCELLED, result, '任务已取消')
+            else:
+                job._finish(Job.STATUS_SUCCEEDED, result)
+        except JobCancelled as e:
+            job._finish(Job.STATUS_CANCELLED, error=str(e))
+        except Exception as e:
+            job._finish(Job.STATUS_FAILED, error=str(e))
+
+    def _prune(self):
+        """删除最早结束的任务，只保留 keep_finished 个"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
@@ -0,0 +1,224 @@
+"""
+运行指标模块
+记录接口延迟、各阶段耗时和计数器，导出为 Prometheus 文本格式或 JSON
+"""
+import functools
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, Tuple
+
+PREFIX = 'jx3sync'
+
+# 耗时直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 指标名称 -> (类型, 说明)
+HTTP_DURATION = 'http_request_duration_seconds'
+PHASE_DURATION = 'phase_duration_seconds'
+BYTES = 'bytes_total'
+FILES = 'files_total'
+STAT_CALLS = 'stat_calls_total'
+ERRORS = 'errors_total'
+IO_WAIT = 'io_wait_seconds'
+DEFINITIONS = {
+    HTTP_DURATION: ('histogram', '接口请求耗时（秒），按路由、方法和状态码'),
+    PHASE_DURATION: ('histogram', '各阶段耗时（秒）：scan、backup、delete、copy、restore，外层阶段包含内层阶段'),
+    BYTES: ('counter', '写入的字节数，按操作'),
+    FILES: ('counter', '写入的文件数，按操作'),
+    STAT_CALLS: ('counter', 'stat 调用次数，按调用位置'),
+    ERRORS: ('counter', '失败次数，按阶段'),
+    IO_WAIT: ('histogram', '文件操作等待设备并发名额的时间（秒），按优先级'),
+}
+
+# 关闭时 timer() 返回的空上下文，不分配对象
+_NULL_TIMER = nullcontext()
+
+
+class _Timer:
+    """计时上下文，退出时记录耗时，抛出异常时同时计入错误数"""
+
+    __slots__ = ('metrics', 'phase', 'started')
+
+    def __init__(self, metrics: 'Metrics', phase: str):
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(PHASE_DURATION, time.perf_counter() - self.started, phase=self.phase)
+        if exc_type is not None:
+            self.metrics.inc(ERRORS, phase=self.phase)
+        return False
+
+
+class Metrics:
+    """
+    线程安全的指标集合
+
+    关闭时 inc() / observe() 直接返回，timer() 返回共享的空上下文，
+    被测代码只多一次属性判断。
+    """
+
+    def __init__(self, enabled: bool = True, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        # (名称, 标签) -> 值
+        self._counters: Dict[tuple, float] = {}
+        # (名称, 标签) -> [各桶计数..., 总和, 次数]
+        self._histograms: Dict[tuple, list] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """计数器增加 value"""
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """直方图记录一个观测值"""
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            record = self._histograms.get(key)
+            if record is None:
+                record = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    record[i] += 1
+                    break
+            record[-2] += value
+            record[-1] += 1
+
+    def timer(self, phase: str):
+        """
+        阶段计时
+
+        用法：
+            with metrics.timer('delete'):
+                shutil.rmtree(path)
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, phase)
+
+    def reset(self):
+        """清空所有指标"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+    def _snapshot(self) -> Tuple[dict, dict]:
+        with self._lock:
+            return dict(self._counters), {key: list(value) for key, value in self._histograms.items()}
+
+    def to_dict(self) -> dict:
+        """
+        导出为 JSON 友好的字典
+
+        直方图的 buckets 为累计计数 {上限: 次数}，与 Prometheus 相同
+        """
+        counters, histograms = self._snapshot()
+        result = {
+            'enabled': self.enabled,
+            'started_at': self.started_at,
+            'counters': {},
+            'histograms': {}
+        }
+        for (name, labels), value in sorted(counters.items()):
+            result['counters'].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        for (name, labels), record in sorted(histograms.items()):
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets, record):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets['+Inf'] = record[-1]
+            result['histograms'].setdefault(name, []).append({
+                'labels': dict(labels),
+                'count': record[-1],
+                'sum': record[-2],
+                'buckets': buckets
+            })
+        return result
+
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式（0.0.4）"""
+        counters, histograms = self._snapshot()
+        lines = []
+        described = set()
+
+        def describe(name: str):
+            if name in described:
+                return
+            described.add(name)
+            kind, help_text = DEFINITIONS.get(name, ('untyped', ''))
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            describe(name)
+            lines.append(f"{PREFIX}_{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), record in sorted(histograms.items()):
+            describe(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets, record):
+                cumulative += count
+                lines.append(f"{PREFIX}_{name}_bucket{_format_labels(labels + (('le', str(bound)),))} "
+                             f"{cumulative}")
+            lines.append(f"{PREFIX}_{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {record[-1]}")
+            lines.append(f"{PREFIX}_{name}_sum{_format_labels(labels)} {_format_value(record[-2])}")
+            lines.append(f"{PREFIX}_{name}_count{_format_labels(labels)} {record[-1]}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels) + '}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# 全局指标，由 app 根据配置开关
+metrics = Metrics()
+
+
+def timed(phase: str):
+    """
+    阶段计时装饰器，关闭指标时直接调用原函数
+
+    被装饰的函数返回 {'success': False, ...} 时计入该阶段的错误数
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            with _Timer(metrics, phase):
+                result = func(*args, **kwargs)
+            if isinstance(result, dict) and result.get('success') is False:
+                metrics.inc(ERRORS, phase=phase)
+            return result
+        return wrapper
+    return decorator
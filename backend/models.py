@@ -40,6 +40,9 @@ class BackupInfo:
     size: int
     created_at: str
     role_info: str
+    file_count: int = 0
+    format: str = ''
+    role: Optional[dict] = None
 
     def to_dict(self):
         return {
@@ -47,5 +50,8 @@ class BackupInfo:
             'path': self.path,
             'size': self.size,
             'created_at': self.created_at,
-            'role_info': self.role_info
+            'role_info': self.role_info,
+            'file_count': self.file_count,
+            'format': self.format,
+            'role': self.role
         }
@@ -3,47 +3,110 @@
 处理快捷方式解析和游戏路径定位
 """
 import os
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
-try:
-    import win32com.client
-    import pythoncom
-    HAS_WIN32 = True
-except ImportError:
-    HAS_WIN32 = False
+from .shell_link import ShellLinkError, read_shell_link
+
+# pywin32 导入较慢，第一次需要通过 COM 解析快捷方式时才导入；None 表示尚未尝试
+_win32 = None
+
+
+def _load_win32():
+    """
+    按需导入 pywin32
+
+    Returns:
+        (win32com.client, pythoncom)，未安装时返回 None
+    """
+    global _win32
+    if _win32 is None:
+        try:
+            import win32com.client
+            import pythoncom
+            _win32 = (win32com.client, pythoncom)
+        except ImportError:
+            _win32 = False
+    return _win32 or None
 
 
 class PathResolver:
     """路径解析器"""
 
+    # 快捷方式解析结果缓存：规范化路径 -> (修改时间, 大小, 目标路径)
+    _shortcut_cache: Dict[str, Tuple[int, int, str]] = {}
+    _shortcut_lock = threading.Lock()
+    SHORTCUT_CACHE_SIZE = 256
+
     @staticmethod
     def parse_shortcut(lnk_path: str) -> Optional[str]:
         """
         解析快捷方式获取目标路径
 
+        直接读取 .lnk 文件解析（见 shell_link），只有 IDList 等无法直接得到路径的
+        快捷方式才通过 COM（需要 pywin32）解析。结果按 (路径, 修改时间, 大小) 缓存。
+
         Args:
             lnk_path: 快捷方式文件路径
 
         Returns:
             目标程序路径，失败返回 None
         """
-        if not HAS_WIN32:
-            raise ImportError("需要安装 pywin32 库来解析快捷方式")
+        key = os.path.normcase(os.path.abspath(lnk_path))
+        try:
+            st = os.stat(key)
+        except OSError as e:
+            print(f"[ERROR] 解析快捷方式失败: {e}")
+            return None
+
+        cached = PathResolver._shortcut_cache.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
 
+        target_path = None
         try:
-            print(f"[DEBUG] 尝试解析快捷方式: {lnk_path}")
-            print(f"[DEBUG] 文件存在: {os.path.exists(lnk_path)}")
+            target_path = read_shell_link(lnk_path).target_path(os.path.abspath(lnk_path))
+        except (OSError, ShellLinkError) as e:
+            print(f"[DEBUG] 直接解析快捷方式失败: {e}")
 
+        if not target_path:
+            target_path = PathResolver._parse_shortcut_com(lnk_path)
+        if not target_path:
+            return None
+
+        print(f"[DEBUG] 解析成功，目标路径: {target_path}")
+        with PathResolver._shortcut_lock:
+            if len(PathResolver._shortcut_cache) >= PathResolver.SHORTCUT_CACHE_SIZE:
+                PathResolver._shortcut_cache.clear()
+            PathResolver._shortcut_cache[key] = (st.st_mtime_ns, st.st_size, target_path)
+        return target_path
+
+    @staticmethod
+    def clear_shortcut_cache():
+        """清空快捷方式解析缓存"""
+        with PathResolver._shortcut_lock:
+            PathResolver._shortcut_cache.clear()
+
+    @staticmethod
+    def _parse_shortcut_com(lnk_path: str) -> Optional[str]:
+        """
+        通过 WScript.Shell 解析快捷方式，未安装 pywin32 时返回 None
+        """
+        win32 = _load_win32()
+        if not win32:
+            print("[ERROR] 解析快捷方式失败: 需要安装 pywin32 库")
+            return None
+        client, pythoncom = win32
+
+        try:
             # 初始化 COM（在多线程环境中需要）
             pythoncom.CoInitialize()
 
             try:
-                shell = win32com.client.Dispatch("WScript.Shell")
+                shell = client.Dispatch("WScript.Shell")
                 shortcut = shell.CreateShortCut(lnk_path)
                 target_path = shortcut.TargetPath
-
-                print(f"[DEBUG] 解析成功，目标路径: {target_path}")
                 return target_path if target_path else None
             finally:
                 # 清理 COM
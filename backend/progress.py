@@ -0,0 +1,71 @@
+"""
+进度汇报模块
+汇总多线程下的文件级进度，转换为 progress_callback 调用
+"""
+import threading
+from typing import Callable, Optional
+
+from .metrics import BYTES, FILES, metrics
+
+
+class ProgressReporter:
+    """
+    线程安全的进度汇总
+
+    回调参数为 (current, total, message, files_done, bytes_done, operation=...)：
+    current/total 是操作的主要步骤（如目标角色数或文件数），
+    files_done/bytes_done 是本次操作已写入的文件数和字节数，没有回调时也会统计；
+    operation 是本次操作的标识，同一任务先后执行多个操作时据此分别累加。
+    回调在持有锁时调用，多个线程汇报的进度按顺序到达，计数不会倒退；回调应尽快返回。
+    回调可以抛出异常来中止操作（例如任务被取消）。
+    指定 op 时写入的文件数和字节数同时计入运行指标。
+    """
+
+    def __init__(self, callback: Optional[Callable], total: int = 0, message: str = '',
+                 op: str = None):
+        self.callback = callback
+        self.op = op
+        self.total = total
+        self.current = 0
+        self.message = message
+        self.files_done = 0
+        self.bytes_done = 0
+        self.operation = object()
+        self._lock = threading.Lock()
+
+    def file_done(self, size: int, advance: int = 0):
+        """
+        记录写入了一个文件
+
+        Args:
+            size: 文件大小
+            advance: 主要步骤同时前进的数量，按文件计步时传 1
+        """
+        if self.op and metrics.enabled:
+            metrics.inc(FILES, op=self.op)
+            metrics.inc(BYTES, size, op=self.op)
+        with self._lock:
+            self.current += advance
+            self.files_done += 1
+            self.bytes_done += size
+            self._notify()
+
+    def step(self, message: str = None, advance: int = 1):
+        """主要步骤前进"""
+        if not self.callback:
+            return
+        with self._lock:
+            self.current += advance
+            if message is not None:
+                self.message = message
+            self._notify()
+
+    def set_message(self, message: str):
+        """更新当前状态说明，不推进步骤"""
+        self.step(message, advance=0)
+
+    def _notify(self):
+        """调用回调，调用方需持有锁"""
+        if self.callback:
+            self.callback(self.current, self.total, self.message, self.files_done, self.bytes_done,
+                          operation=self.operation)
@@ -0,0 +1,305 @@
+"""
+请求性能分析模块
+用 cProfile 和 tracemalloc 记录单个请求（或它提交的后台任务），
+保存为 .prof 文件、火焰图可用的折叠栈和摘要
+"""
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+# 分析模式
+MODE_CPU = 'cpu'          # 只记录 CPU 耗时
+MODE_FULL = 'full'        # 同时记录内存
+MODES = (MODE_CPU, MODE_FULL)
+
+# 保存的文件格式
+FORMAT_PROF = 'prof'            # pstats / snakeviz 可读
+FORMAT_COLLAPSED = 'collapsed'  # flamegraph.pl / speedscope 可读的折叠栈
+FORMAT_SUMMARY = 'json'
+FORMATS = (FORMAT_PROF, FORMAT_COLLAPSED, FORMAT_SUMMARY)
+
+# 折叠栈的最大深度和最小耗时（秒），更深或更短的调用路径不展开
+MAX_STACK_DEPTH = 80
+MIN_STACK_SECONDS = 1e-5
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 10
+
+# tracemalloc 是全局的，同一时间只有一个分析记录内存
+_memory_lock = threading.Lock()
+
+
+def parse_mode(value) -> Optional[str]:
+    """
+    解析请求头或配置中的分析模式
+
+    Returns:
+        cpu / full，不分析时返回 None
+    """
+    if value is None or value is False:
+        return None
+    value = str(value).strip().lower()
+    if value in ('', '0', 'false', 'off', 'no'):
+        return None
+    if value == MODE_CPU:
+        return MODE_CPU
+    return MODE_FULL
+
+
+def _frame_label(func: tuple) -> str:
+    filename, line, name = func
+    label = name if filename == '~' else f"{name} ({os.path.basename(filename)}:{line})"
+    # 折叠栈用分号分隔帧
+    return label.replace(';', ',')
+
+
+def collapsed_stacks(stats: pstats.Stats) -> List[str]:
+    """
+    由 cProfile 的调用关系估算折叠栈
+
+    cProfile 只记录调用者-被调用者的汇总，同一函数从不同路径调用时按调用边的
+    累计耗时比例分摊自身耗时，结果是近似的火焰图。
+
+    Returns:
+        ["帧1;帧2;帧3 微秒数", ...]
+    """
+    entries = stats.stats
+    children = defaultdict(list)
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children[caller].append((func, edge[3]))
+
+    totals = Counter()
+
+    def walk(func, path: list, on_path: set, fraction: float):
+        _, _, tt, ct, _ = entries[func]
+        path.append(_frame_label(func))
+        on_path.add(func)
+        self_time = tt * fraction
+        if self_time > 0:
+            totals[';'.join(path)] += self_time
+        if len(path) < MAX_STACK_DEPTH:
+            for child, edge_ct in children.get(func, ()):
+                child_ct = entries[child][3]
+                if child in on_path or child_ct <= 0:
+                    continue
+                child_fraction = fraction * min(1.0, edge_ct / child_ct)
+                if child_ct * child_fraction >= MIN_STACK_SECONDS:
+                    walk(child, path, on_path, child_fraction)
+        path.pop()
+        on_path.discard(func)
+
+    roots = [func for func, value in entries.items() if not value[4]]
+    for root in roots:
+        walk(root, [], set(), 1.0)
+
+    return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in totals.items()
+            if round(seconds * 1e6) > 0]
+
+
+def top_functions(stats: pstats.Stats, limit: int = TOP_FUNCTIONS) -> List[dict]:
+    """按累计耗时排列的函数"""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{
+        'function': func[2],
+        'file': func[0],
+        'line': func[1],
+        'calls': nc,
+        'total_time': round(tt, 6),
+        'cumulative_time': round(ct, 6)
+    } for func, (cc, nc, tt, ct, _) in rows]
+
+
+class Capture:
+    """
+    一次性能分析
+
+    只记录调用 start() 的线程；内存记录需要获得全局锁，拿不到时（另一个分析正在
+    记录内存）只记录 CPU。
+    """
+
+    def __init__(self, store: 'RequestProfiler', label: dict, mode: str = MODE_FULL):
+        self.store = store
+        self.label = label
+        self.mode = mode
+        self.id = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}-{uuid.uuid4().hex[:6]}"
+        self.profile = cProfile.Profile()
+        self.memory = False
+        self._owns_tracemalloc = False
+        self._started = 0.0
+
+    def start(self) -> 'Capture':
+        if self.mode == MODE_FULL and _memory_lock.acquire(blocking=False):
+            self.memory = True
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+            tracemalloc.clear_traces()
+        self._started = time.perf_counter()
+        try:
+            self.profile.enable()
+        except ValueError:
+            # 当前线程已有其他分析器（如调试器）在运行
+            self._release_memory()
+            raise
+        return self
+
+    def _release_memory(self):
+        if not self.memory:
+            return
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        self.memory = False
+        _memory_lock.release()
+
+    def stop(self, extra: dict = None) -> Optional[dict]:
+        """
+        结束分析并保存
+
+        Args:
+            extra: 写入摘要的附加信息（如状态码）
+
+        Returns:
+            摘要，保存失败时返回 None
+        """
+        self.profile.disable()
+        duration = time.perf_counter() - self._started
+
+        memory = None
+        if self.memory:
+            try:
+                current, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+                memory = {
+                    'peak_bytes': peak,
+                    'current_bytes': current,
+                    # 请求结束时仍未释放的内存，按分配位置排列
+                    'top_allocations': [{
+                        'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                        'size': stat.size,
+                        'count': stat.count
+                    } for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]]
+                }
+            finally:
+                self._release_memory()
+
+        summary = {
+            'id': self.id,
+            'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'mode': self.mode,
+            **self.label,
+            **(extra or {}),
+            'duration_ms': round(duration * 1000, 3),
+            'memory': memory
+        }
+        return self.store.save(self, summary)
+
+
+class RequestProfiler:
+    """
+    性能分析记录的保存和查询
+
+    每次分析保存三个文件：<id>.prof、<id>.collapsed、<id>.json（摘要），
+    超过 max_captures 时删除最早的记录。
+    """
+
+    def __init__(self, directory: str, max_captures: int = 20, mode: str = None):
+        """
+        Args:
+            directory: 保存目录
+            max_captures: 最多保留的记录数
+            mode: 分析所有请求时的模式，None 表示只分析带请求头的请求
+        """
+        self.directory = Path(directory)
+        self.max_captures = max_captures
+        self.mode = mode
+        self._lock = threading.Lock()
+
+    def start(self, label: dict, mode: str = MODE_FULL) -> Capture:
+        """开始分析当前线程"""
+        return Capture(self, label, mode).start()
+
+    def save(self, capture: Capture, summary: dict) -> Optional[dict]:
+        stats = pstats.Stats(capture.profile)
+        summary['top_functions'] = top_functions(stats)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            capture.profile.dump_stats(str(self._path(capture.id, FORMAT_PROF)))
+            with open(self._path(capture.id, FORMAT_COLLAPSED), 'w', encoding='utf-8') as f:
+                f.write('\n'.join(collapsed_stacks(stats)) + '\n')
+            with open(self._path(capture.id, FORMAT_SUMMARY), 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"保存性能分析失败: {e}")
+            return None
+
+        self._prune()
+        return summary
+
+    def _path(self, capture_id: str, fmt: str) -> Path:
+        return self.directory / f"{capture_id}.{fmt}"
+
+    def _ids(self) -> List[str]:
+        """所有记录 ID，从新到旧"""
+        if not self.directory.is_dir():
+            return []
+        return sorted((p.stem for p in self.directory.glob(f'*.{FORMAT_SUMMARY}')), reverse=True)
+
+    def _prune(self):
+        with self._lock:
+            for capture_id in self._ids()[self.max_captures:]:
+                self.delete(capture_id)
+
+    def list_captures(self) -> List[dict]:
+        """所有记录的摘要（不含函数和内存明细），从新到旧"""
+        captures = []
+        for capture_id in self._ids():
+            summary = self.get(capture_id)
+            if summary:
+                memory = summary.get('memory')
+                summary.pop('top_functions', None)
+                summary['memory'] = {'peak_bytes': memory['peak_bytes']} if memory else None
+                captures.append(summary)
+        return captures
+
+    def get(self, capture_id: str) -> Optional[dict]:
+        """读取摘要，记录不存在时返回 None"""
+        path = self.file_path(capture_id, FORMAT_SUMMARY)
+        if not path:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def file_path(self, capture_id: str, fmt: str) -> Optional[Path]:
+        """
+        记录文件路径，ID 或格式无效、文件不存在时返回 None
+        """
+        if fmt not in FORMATS or not capture_id or '/' in capture_id or '\\' in capture_id \
+                or capture_id.startswith('.'):
+            return None
+        path = self._path(capture_id, fmt)
+        return path if path.is_file() else None
+
+    def delete(self, capture_id: str):
+        for fmt in FORMATS:
+            path = self.file_path(capture_id, fmt)
+            if path:
+                path.unlink(missing_ok=True)
+
+    def clear(self) -> int:
+        """删除所有记录，返回删除的数量"""
+        ids = self._ids()
+        for capture_id in ids:
+            self.delete(capture_id)
+        return len(ids)
@@ -0,0 +1,140 @@
+"""
+备份保留策略模块
+按数量、按小时/天/周（祖父-父-子）和按大小配额决定哪些备份可以删除
+"""
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    备份保留策略
+
+    数量规则：保留最近 keep_last 个，再加上最近 keep_hourly 个小时、keep_daily 天、
+    keep_weekly 周中每个时间段的最新备份，其余备份过期。没有设置任何数量规则时
+    不按数量删除。
+
+    大小规则：单个角色的备份总大小超过 max_role_size、所有备份总大小超过
+    max_total_size 时，从最旧的备份开始删除。0 表示不限制。
+
+    每个角色最新的一个备份始终保留。
+    """
+    keep_last: Optional[int] = None
+    keep_hourly: int = 0
+    keep_daily: int = 0
+    keep_weekly: int = 0
+    max_role_size: int = 0
+    max_total_size: int = 0
+
+    def __post_init__(self):
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if value is None and f.name == 'keep_last':
+                continue
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise ValueError(f'保留策略的 {f.name} 必须是非负整数')
+
+    @property
+    def has_count_rules(self) -> bool:
+        return (self.keep_last is not None or self.keep_hourly > 0
+                or self.keep_daily > 0 or self.keep_weekly > 0)
+
+    @property
+    def is_empty(self) -> bool:
+        """策略不会删除任何备份"""
+        return not (self.has_count_rules or self.max_role_size or self.max_total_size)
+
+    def to_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    @staticmethod
+    def from_dict(data: dict) -> 'RetentionPolicy':
+        """
+        从字典创建，忽略未知的键
+
+        Raises:
+            ValueError: 格式无效
+        """
+        if not data:
+            return RetentionPolicy()
+        if not isinstance(data, dict):
+            raise ValueError('保留策略格式无效')
+        names = {f.name for f in fields(RetentionPolicy)}
+        return RetentionPolicy(**{key: value for key, value in data.items() if key in names})
+
+
+# 时间段划分：按小时、天、ISO 周
+def _hour(ts: float):
+    return datetime.fromtimestamp(ts).strftime('%Y%m%d%H')
+
+
+def _day(ts: float):
+    return datetime.fromtimestamp(ts).strftime('%Y%m%d')
+
+
+def _week(ts: float):
+    return datetime.fromtimestamp(ts).isocalendar()[:2]
+
+
+def _keep_per_period(records: List[dict], count: int, period) -> Set[str]:
+    """最近 count 个时间段中，每个时间段保留最新的一个备份"""
+    kept = set()
+    seen = set()
+    for record in records:
+        if len(seen) >= count:
+            break
+        key = period(record['timestamp'])
+        if key not in seen:
+            seen.add(key)
+            kept.add(record['name'])
+    return kept
+
+
+def select_expired(records: List[dict], policy: RetentionPolicy) -> List[dict]:
+    """
+    选出单个角色中按数量规则和角色配额过期的备份
+
+    Args:
+        records: 同一角色的备份记录（含 name、timestamp、size），按时间从新到旧排列
+        policy: 保留策略
+
+    Returns:
+        过期的备份记录，按时间从新到旧排列
+    """
+    if not records:
+        return []
+
+    kept = {r['name'] for r in records}
+    if policy.has_count_rules:
+        kept = {r['name'] for r in records[:policy.keep_last or 0]}
+        kept |= _keep_per_period(records, policy.keep_hourly, _hour)
+        kept |= _keep_per_period(records, policy.keep_daily, _day)
+        kept |= _keep_per_period(records, policy.keep_weekly, _week)
+
+    if policy.max_role_size:
+        total = 0
+        for record in records:
+            if record['name'] not in kept:
+                continue
+            total += record['size']
+            if total > policy.max_role_size:
+                kept.discard(record['name'])
+
+    # 最新的备份始终保留
+    kept.add(records[0]['name'])
+    return [r for r in records if r['name'] not in kept]
+
+
+def role_key(record) -> tuple:
+    """备份记录或角色信息对应的角色键"""
+    if isinstance(record, dict):
+        return record['account'], record['region'], record['server'], record['role']
+    return record.account, record.region, record.server, record.role
+
+
+def unique_roles(roles: Iterable) -> List[tuple]:
+    """去重并保持顺序的角色键列表"""
+    return list(dict.fromkeys(role_key(role) if not isinstance(role, tuple) else role
+                              for role in roles))
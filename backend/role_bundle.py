@@ -0,0 +1,628 @@
+"""
+角色包模块
+把一个或多个角色目录流式打包为 tar / zip（角色包），并把上传的角色包流式写入目标角色
+
+角色包结构：
+    bundle.json          清单：角色信息、目录列表、每个文件的大小/修改时间/哈希
+    roles/<序号>/<相对路径>  文件内容
+
+清单始终是第一个成员，接收方读到清单后即可判断哪些文件已经存在、无需写入。
+导出时还可以指定接收方已有的哈希，这些文件只出现在清单中（omitted），不传输内容，
+导入时从目标角色中已有的相同内容复制。
+"""
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from .blob_store import BlobStore
+from .hash_cache import HashCache
+from .models import RoleInfo
+from .progress import ProgressReporter
+from .staged_swap import TEMP_MARKER
+from .sync_profile import SyncProfile
+from .tree_diff import FileEntry, scan_tree
+
+
+BUNDLE_VERSION = 1
+MANIFEST_NAME = 'bundle.json'
+ROLES_DIR = 'roles'
+
+# 角色包格式
+FORMAT_TAR = 'tar'
+FORMAT_ZIP = 'zip'
+FORMATS = (FORMAT_TAR, FORMAT_ZIP)
+CONTENT_TYPES = {FORMAT_TAR: 'application/x-tar', FORMAT_ZIP: 'application/zip'}
+
+# 每次读写的块大小，导出和导入占用的内存都以此为上限
+CHUNK_SIZE = 1024 * 1024
+# zip 需要随机访问，导入时上传内容超过此大小后写入临时文件
+ZIP_SPOOL_SIZE = 16 * 1024 * 1024
+
+
+def resolve_format(bundle_format: str) -> str:
+    """
+    校验角色包格式
+
+    Raises:
+        ValueError: 不支持的格式
+    """
+    bundle_format = bundle_format or FORMAT_TAR
+    if bundle_format not in FORMATS:
+        raise ValueError(f'不支持的角色包格式: {bundle_format}')
+    return bundle_format
+
+
+def _member_name(index: int, rel: str) -> str:
+    return f"{ROLES_DIR}/{index}/{rel}"
+
+
+def _parse_member_name(name: str):
+    """
+    解析成员名称
+
+    Returns:
+        (角色序号, 相对路径)，不是角色文件时返回 None
+    """
+    path = PurePosixPath(name)
+    if path.is_absolute() or '..' in path.parts:
+        raise ValueError(f'角色包中包含不安全的路径: {name}')
+    parts = path.parts
+    if len(parts) < 3 or parts[0] != ROLES_DIR or not parts[1].isdigit():
+        return None
+    return int(parts[1]), '/'.join(parts[2:])
+
+
+# ===== 导出 =====
+
+def build_manifest(roles: List[RoleInfo], hash_cache: HashCache, profile: SyncProfile = None,
+                   skip_hashes: Iterable[str] = None, progress: Callable = None) -> dict:
+    """
+    生成角色包清单
+
+    未变化的文件直接取哈希缓存，只有新文件需要读取内容。
+
+    Args:
+        roles: 要导出的角色
+        hash_cache: 文件哈希缓存
+        profile: 同步方案，指定时只导出匹配的文件
+        skip_hashes: 接收方已有的哈希，这些文件不传输内容
+        progress: 进度回调
+
+    Returns:
+        清单字典（不包含本机路径）
+
+    Raises:
+        ValueError: 角色目录不存在
+    """
+    skip = set(skip_hashes or ())
+    reporter = ProgressReporter(progress, len(roles), '正在计算文件哈希...')
+    entries = []
+    file_count = 0
+    total_size = 0
+
+    for index, role in enumerate(roles):
+        root = Path(role.path)
+        if not root.is_dir():
+            raise ValueError(f'角色目录不存在: {role}')
+
+        files, dirs = scan_tree(root)
+        if profile:
+            files, dirs = profile.filter_tree(files)
+
+        file_list = []
+        for rel in sorted(files):
+            entry = files[rel]
+            digest = hash_cache.hash_file(root / rel, entry)
+            item = {'path': rel, 'size': entry.size, 'mtime_ns': entry.mtime_ns, 'hash': digest}
+            if digest in skip:
+                item['omitted'] = True
+            else:
+                total_size += entry.size
+            file_list.append(item)
+
+        file_count += len(file_list)
+        entries.append({
+            'index': index,
+            'role': {key: value for key, value in role.to_dict().items() if key != 'path'},
+            # 完整的角色包导入时会删除目标中多余的文件
+            'complete': profile is None,
+            'dirs': sorted(dirs, key=lambda d: (d.count('/'), d)),
+            'files': file_list
+        })
+        reporter.step(f"已计算哈希: {role}")
+
+    return {
+        'version': BUNDLE_VERSION,
+        'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'profile': profile.name if profile else None,
+        'file_count': file_count,
+        # 需要传输的字节数，不含 omitted 文件
+        'total_size': total_size,
+        'roles': entries
+    }
+
+
+def _iter_file(path: Path, size: int) -> Iterator[bytes]:
+    """
+    按块读取文件，正好返回 size 字节
+
+    文件在导出过程中被修改时截断或补零，保证归档结构正确，
+    接收方校验哈希时会发现内容不一致。
+    """
+    remaining = size
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    while remaining > 0:
+        pad = min(CHUNK_SIZE, remaining)
+        remaining -= pad
+        yield bytes(pad)
+
+
+def _iter_members(roles: List[RoleInfo], manifest: dict):
+    """需要传输内容的文件：(成员名称, 本机路径, 清单中的文件信息)"""
+    for entry in manifest['roles']:
+        root = Path(roles[entry['index']].path)
+        for item in entry['files']:
+            if not item.get('omitted'):
+                yield _member_name(entry['index'], item['path']), root / item['path'], item
+
+
+def _manifest_bytes(manifest: dict) -> bytes:
+    return json.dumps(manifest, ensure_ascii=False).encode('utf-8')
+
+
+def _iter_tar(roles: List[RoleInfo], manifest: dict, reporter: ProgressReporter) -> Iterator[bytes]:
+    """逐个生成 tar 头和数据块，不经过 tarfile 的缓冲"""
+    def header(name: str, size: int, mtime: float) -> bytes:
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = mtime
+        info.mode = 0o644
+        return info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+
+    def padding(size: int) -> bytes:
+        return bytes(-size % tarfile.BLOCKSIZE)
+
+    data = _manifest_bytes(manifest)
+    yield header(MANIFEST_NAME, len(data), datetime.now().timestamp())
+    yield data + padding(len(data))
+
+    for name, path, item in _iter_members(roles, manifest):
+        yield header(name, item['size'], item['mtime_ns'] / 1e9)
+        yield from _iter_file(path, item['size'])
+        yield padding(item['size'])
+        reporter.file_done(item['size'], advance=1)
+
+    # 结束标记：两个空块
+    yield bytes(tarfile.BLOCKSIZE * 2)
+
+
+class _ChunkBuffer:
+    """只能追加写入的缓冲区，zipfile 写入后由生成器取走"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_info(name: str, size: int, mtime: float) -> zipfile.ZipInfo:
+    # zip 只能记录 1980 年以后的时间
+    date_time = datetime.fromtimestamp(max(mtime, 315532800)).timetuple()[:6]
+    info = zipfile.ZipInfo(name, date_time)
+    info.file_size = size
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def _iter_zip(roles: List[RoleInfo], manifest: dict, reporter: ProgressReporter) -> Iterator[bytes]:
+    """zipfile 写入不可定位的流时使用数据描述符，每写一块就把压缩结果交给调用方"""
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        zf.writestr(_zip_info(MANIFEST_NAME, 0, datetime.now().timestamp()), _manifest_bytes(manifest))
+        yield buffer.drain()
+
+        for name, path, item in _iter_members(roles, manifest):
+            with zf.open(_zip_info(name, item['size'], item['mtime_ns'] / 1e9), 'w') as out:
+                for chunk in _iter_file(path, item['size']):
+                    out.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            yield buffer.drain()
+            reporter.file_done(item['size'], advance=1)
+    # 中央目录
+    yield buffer.drain()
+
+
+def stream_bundle(roles: List[RoleInfo], manifest: dict, bundle_format: str = FORMAT_TAR,
+                  progress: Callable = None) -> Iterator[bytes]:
+    """
+    流式生成角色包
+
+    直接从磁盘按块读取文件，不生成临时文件，内存占用与角色大小无关。
+
+    Args:
+        roles: 要导出的角色，顺序与 build_manifest 相同
+        manifest: build_manifest 生成的清单
+        bundle_format: tar 或 zip
+        progress: 进度回调
+
+    Yields:
+        角色包数据块
+    """
+    bundle_format = resolve_format(bundle_format)
+    reporter = ProgressReporter(progress, sum(1 for _ in _iter_members(roles, manifest)),
+                                '正在导出角色...', op='export')
+    writer = _iter_tar if bundle_format == FORMAT_TAR else _iter_zip
+    for chunk in writer(roles, manifest, reporter):
+        if chunk:
+            yield chunk
+
+
+# ===== 导入 =====
+
+def _read_tar(stream) -> Iterator[tuple]:
+    """顺序读取 tar 流：(成员名称, 文件对象)，未读取的内容在取下一个成员时跳过"""
+    with tarfile.open(fileobj=stream, mode='r|') as tf:
+        for member in tf:
+            if member.isfile():
+                yield member.name, tf.extractfile(member)
+
+
+def _read_zip(stream) -> Iterator[tuple]:
+    """zip 的目录在文件末尾，先把上传内容写入（超过阈值时落盘的）临时文件再按顺序读取"""
+    with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE) as spool:
+        shutil.copyfileobj(stream, spool, CHUNK_SIZE)
+        spool.seek(0)
+        with zipfile.ZipFile(spool) as zf:
+            for info in zf.infolist():
+                if not info.is_dir():
+                    with zf.open(info) as f:
+                        yield info.filename, f
+
+
+def _temp_path(path: Path) -> Path:
+    """同目录下的临时文件，写完后重命名替换目标"""
+    return path.with_name(f"{path.name}{TEMP_MARKER}{uuid.uuid4().hex[:8]}")
+
+
+class _RoleImport:
+    """单个角色的导入状态"""
+
+    def __init__(self, entry: dict, target: Optional[RoleInfo]):
+        self.entry = entry
+        self.target = target
+        self.root = Path(target.path) if target else None
+        self.files: Dict[str, dict] = {item['path']: item for item in entry['files']}
+        self.current: Dict[str, FileEntry] = {}
+        self.current_dirs = set()
+        # 已经是最新内容、不需要写入的文件
+        self.up_to_date = set()
+        self.written = set()
+        self.failed: List[dict] = []
+        self.bytes_written = 0
+        self.deleted = 0
+        self.backup = None
+        self.error: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return self.target is not None and self.error is None
+
+    def to_dict(self) -> dict:
+        return {
+            'role': self.entry['role'],
+            'target': self.target.to_dict() if self.target else None,
+            'success': self.active and not self.failed,
+            'error': self.error,
+            'written': len(self.written),
+            'skipped': len(self.up_to_date),
+            'deleted': self.deleted,
+            'bytes_written': self.bytes_written,
+            'failed': self.failed,
+            'backup': self.backup
+        }
+
+
+def _same_content(state: _RoleImport, rel: str, digest: str, hash_cache: HashCache) -> bool:
+    """目标中同一路径的文件内容是否与清单相同，大小不同时不计算哈希"""
+    entry = state.current.get(rel)
+    if entry is None or entry.size != state.files[rel]['size']:
+        return False
+    return hash_cache.hash_file(state.root / rel, entry) == digest
+
+
+def _prepare_role(state: _RoleImport, hash_cache: HashCache):
+    """
+    扫描目标角色，找出内容相同的文件，并用本地已有的内容补齐 omitted 文件
+
+    omitted 文件先全部复制为临时文件再统一替换，避免先写入的文件覆盖后面要用到的来源。
+    """
+    state.root.mkdir(parents=True, exist_ok=True)
+    state.current, state.current_dirs = scan_tree(state.root)
+    for rel_dir in state.entry['dirs']:
+        (state.root / _safe_rel(rel_dir)).mkdir(parents=True, exist_ok=True)
+
+    by_hash = None
+    pending = []
+    try:
+        for rel, item in state.files.items():
+            _safe_rel(rel)
+            if _same_content(state, rel, item['hash'], hash_cache):
+                state.up_to_date.add(rel)
+                continue
+            if not item.get('omitted'):
+                continue
+
+            if by_hash is None:
+                by_hash = {}
+                for other, entry in state.current.items():
+                    by_hash.setdefault(hash_cache.hash_file(state.root / other, entry), other)
+            source = by_hash.get(item['hash'])
+            if source is None:
+                state.failed.append({'path': rel, 'error': '角色包中没有该文件的内容，目标中也不存在'})
+                continue
+
+            dest = state.root / rel
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            temp = _temp_path(dest)
+            shutil.copyfile(state.root / source, temp)
+            os.utime(temp, ns=(item['mtime_ns'], item['mtime_ns']))
+            pending.append((temp, dest, rel))
+
+        for temp, dest, rel in pending:
+            os.replace(temp, dest)
+            state.written.add(rel)
+        pending.clear()
+    finally:
+        for temp, _, _ in pending:
+            temp.unlink(missing_ok=True)
+
+
+def _safe_rel(rel: str) -> str:
+    path = PurePosixPath(rel)
+    if not rel or path.is_absolute() or '..' in path.parts:
+        raise ValueError(f'角色包中包含不安全的路径: {rel}')
+    return str(path)
+
+
+def _write_member(state: _RoleImport, rel: str, f, item: dict) -> Optional[str]:
+    """
+    把成员内容写入临时文件，校验哈希后替换目标文件
+
+    Returns:
+        失败原因，成功时返回 None
+    """
+    dest = state.root / rel
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    temp = _temp_path(dest)
+    h = hashlib.blake2b(digest_size=BlobStore.DIGEST_SIZE)
+    size = 0
+    try:
+        with open(temp, 'wb') as out:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                h.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        if size != item['size'] or h.hexdigest() != item['hash']:
+            return '内容与清单中的哈希不一致'
+        os.utime(temp, ns=(item['mtime_ns'], item['mtime_ns']))
+        # 重命名替换而不是原地覆盖，避免改写与备份共享数据的硬链接
+        os.replace(temp, dest)
+        return None
+    finally:
+        temp.unlink(missing_ok=True)
+
+
+def _prune_role(state: _RoleImport):
+    """删除目标中清单以外的文件和空目录，使目标与角色包一致"""
+    for rel in state.current:
+        if rel not in state.files:
+            (state.root / rel).unlink(missing_ok=True)
+            state.deleted += 1
+
+    keep = set(state.entry['dirs'])
+    for rel_dir in sorted(state.current_dirs - keep, key=lambda d: d.count('/'), reverse=True):
+        try:
+            (state.root / rel_dir).rmdir()
+        except OSError:
+            pass
+
+
+def validate_manifest(manifest) -> dict:
+    """
+    校验清单
+
+    Raises:
+        ValueError: 清单格式无效或版本不支持
+    """
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('roles'), list):
+        raise ValueError('角色包清单格式无效')
+    if manifest.get('version') != BUNDLE_VERSION:
+        raise ValueError(f"不支持的角色包版本: {manifest.get('version')}")
+    return manifest
+
+
+def read_manifest(data: bytes) -> dict:
+    """
+    解析并校验清单
+
+    Raises:
+        ValueError: 清单格式无效或版本不支持
+    """
+    try:
+        manifest = json.loads(data)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f'角色包清单格式无效: {e}')
+    return validate_manifest(manifest)
+
+
+def check_bundle(manifest: dict, resolve_target: Callable[[dict, int], Optional[RoleInfo]],
+                 hash_cache: HashCache) -> dict:
+    """
+    接收方检查清单中哪些内容已经存在，结果可作为导出时的 skip_hashes
+
+    Args:
+        manifest: 角色包清单（可以由发送方单独导出）
+        resolve_target: (清单中的角色信息, 序号) -> 目标角色，返回 None 表示不导入该角色
+        hash_cache: 文件哈希缓存
+
+    Returns:
+        {'have': 已有的哈希列表, 'need_count': 仍需传输的文件数, 'need_size': 仍需传输的字节数}
+    """
+    wanted = {}
+    have = set()
+    for index, entry in enumerate(manifest['roles']):
+        target = resolve_target(entry['role'], index)
+        if target is None:
+            continue
+        for item in entry['files']:
+            wanted.setdefault(item['hash'], item['size'])
+        root = Path(target.path)
+        files, _ = scan_tree(root)
+        sizes = {item['size'] for item in entry['files']}
+        for rel, file_entry in files.items():
+            # 大小不在清单中的文件不可能命中，不需要计算哈希
+            if file_entry.size in sizes:
+                have.add(hash_cache.hash_file(root / rel, file_entry))
+
+    have &= wanted.keys()
+    need = {digest: size for digest, size in wanted.items() if digest not in have}
+    return {
+        'have': sorted(have),
+        'need_count': len(need),
+        'need_size': sum(need.values())
+    }
+
+
+def import_bundle(stream, bundle_format: str,
+                  resolve_target: Callable[[dict, int], Optional[RoleInfo]],
+                  hash_cache: HashCache, before_write: Callable = None,
+                  prune: bool = True, progress: Callable = None) -> dict:
+    """
+    把角色包流式写入目标角色
+
+    tar 格式边接收边写入；zip 需要随机访问，先写入临时文件。
+    目标中内容相同的文件不会被写入，每个文件写入临时文件并校验哈希后再替换。
+
+    Args:
+        stream: 角色包数据流（可读的文件对象）
+        bundle_format: tar 或 zip
+        resolve_target: (清单中的角色信息, 序号) -> 目标角色，返回 None 表示不导入该角色
+        hash_cache: 文件哈希缓存
+        before_write: 写入每个目标前调用 (目标, 更新状态说明的函数)，
+            返回 success 为 False 的结果时跳过该目标（如备份失败）
+        prune: 完整的角色包是否删除目标中多余的文件
+        progress: 进度回调
+
+    Returns:
+        导入结果
+
+    Raises:
+        ValueError: 角色包格式无效
+    """
+    bundle_format = resolve_format(bundle_format)
+    reader = _read_tar if bundle_format == FORMAT_TAR else _read_zip
+    reporter = ProgressReporter(progress, 0, '正在读取角色包...', op='import')
+    states: List[_RoleImport] = []
+    bytes_skipped = 0
+
+    try:
+        members = reader(stream)
+        first = next(members, None)
+        if first is None or first[0] != MANIFEST_NAME:
+            raise ValueError('角色包缺少清单')
+        manifest = read_manifest(first[1].read())
+        reporter.total = manifest.get('file_count', 0)
+
+        for index, entry in enumerate(manifest['roles']):
+            state = _RoleImport(entry, resolve_target(entry['role'], index))
+            states.append(state)
+            if state.target is None:
+                continue
+            if before_write:
+                result = before_write(state.target, reporter.set_message)
+                if result is not None and not result.get('success'):
+                    state.error = result.get('message', '写入前准备失败')
+                    continue
+                state.backup = result
+            reporter.set_message(f"正在比较: {state.target}")
+            try:
+                _prepare_role(state, hash_cache)
+            except (OSError, ValueError) as e:
+                state.error = str(e)
+                continue
+            for rel in state.up_to_date | state.written:
+                bytes_skipped += state.files[rel]['size']
+            reporter.step(f"正在导入: {state.target}", advance=len(state.up_to_date) + len(state.written))
+
+        for name, f in members:
+            parsed = _parse_member_name(name)
+            if parsed is None or parsed[0] >= len(states):
+                continue
+            state = states[parsed[0]]
+            rel = _safe_rel(parsed[1])
+            item = state.files.get(rel)
+            # 未导入的角色、已是最新的文件不读取内容，tar 流直接跳过
+            if not state.active or item is None or rel in state.up_to_date or rel in state.written:
+                continue
+
+            try:
+                error = _write_member(state, rel, f, item)
+            except OSError as e:
+                error = str(e)
+            if error:
+                state.failed.append({'path': rel, 'error': error})
+                reporter.step(advance=1)
+                continue
+            state.written.add(rel)
+            state.bytes_written += item['size']
+            reporter.file_done(item['size'], advance=1)
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError) as e:
+        raise ValueError(f'角色包格式无效: {e}')
+
+    for state in states:
+        if not state.active:
+            continue
+        failed = {item['path'] for item in state.failed}
+        for rel in state.files:
+            if rel not in state.up_to_date and rel not in state.written and rel not in failed:
+                state.failed.append({'path': rel, 'error': '角色包中缺少该文件'})
+        # 有文件失败时不删除，避免目标只剩下一半内容
+        if prune and state.entry.get('complete') and not state.failed:
+            _prune_role(state)
+
+    results = [state.to_dict() for state in states]
+    imported = [r for r in results if r['target']]
+    return {
+        'success': bool(imported) and all(r['success'] for r in imported),
+        'roles': results,
+        'files_written': sum(r['written'] for r in results),
+        'files_skipped': sum(r['skipped'] for r in results),
+        'bytes_written': sum(r['bytes_written'] for r in results),
+        'bytes_skipped': bytes_skipped
+    }
@@ -2,38 +2,108 @@
 角色复制模块
 处理角色数据的复制操作
 """
+import os
 import shutil
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Callable, Optional
 from .models import RoleInfo
+from .file_cloner import STRATEGIES, STRATEGY_HARDLINK, STRATEGY_REFLINK, clone_file
+from .hash_cache import HashCache
+from .io_scheduler import io_scheduler
+from .metrics import metrics, timed
+from .progress import ProgressReporter
+from .source_snapshot import SourceSnapshot
+from .staged_swap import StagedSwap
+from .sync_plan import SyncPlan, TargetPlan, ThroughputMeter
+from .sync_profile import SyncProfile
+from .tree_diff import TreeDiff, diff_trees, scan_tree
 
 
 class RoleCopier:
     """角色复制器"""
 
-    def __init__(self):
+    # 复制模式：full 删除目标后整体复制；incremental 只同步有差异的文件；
+    # staged 在临时目录中生成完整副本后用重命名替换目标，失败时目标保持原样
+    MODE_FULL = 'full'
+    MODE_INCREMENTAL = 'incremental'
+    MODE_STAGED = 'staged'
+    MODES = (MODE_FULL, MODE_INCREMENTAL, MODE_STAGED)
+    # staged 模式替换下的旧目录保留的时间（秒），期间可以用 undo_staged() 撤销
+    UNDO_TTL = 600
+
+    def __init__(self, max_workers: int = 4, clone_strategy: str = STRATEGY_REFLINK,
+                 hash_cache: HashCache = None):
+        """
+        Args:
+            max_workers: 复制到多个目标时的最大并发数
+            clone_strategy: 默认克隆策略，copy 或 reflink
+            hash_cache: 文件哈希缓存，按内容比较时使用
+        """
         self.progress_callback: Optional[Callable] = None
+        self.max_workers = max_workers
+        self.clone_strategy = clone_strategy
+        self.hash_cache = hash_cache or HashCache()
+        # 实测写入速度，用于估计同步计划的耗时
+        self.throughput = ThroughputMeter()
+        # 目标路径 -> 该目标最近一次 staged 复制的替换，旧目录保留到撤销、过期或目标再次被写入
+        self._undo = {}
+        self._undo_lock = threading.Lock()
 
     def set_progress_callback(self, callback: Callable):
         """
         设置进度回调函数
 
         Args:
-            callback: 回调函数，接收 (current, total, message) 参数
+            callback: 回调函数，接收 (current, total, message, files_done, bytes_done) 参数，
+                抛出异常可中止复制
         """
         self.progress_callback = callback
 
-    def copy_role(self, source: RoleInfo, target: RoleInfo) -> dict:
+    def _check_options(self, mode: str, clone_strategy: Optional[str]) -> Optional[str]:
+        """检查复制参数，返回错误信息，参数有效时返回 None"""
+        if mode not in self.MODES:
+            return f'不支持的复制模式: {mode}'
+        if clone_strategy not in STRATEGIES:
+            return f'不支持的克隆策略: {clone_strategy}'
+        # 目标角色会被游戏修改，与源角色共用硬链接会把修改写回源角色
+        if clone_strategy == STRATEGY_HARDLINK:
+            return '角色复制不支持硬链接策略'
+        return None
+
+    @timed('copy')
+    def copy_role(self, source: RoleInfo, target: RoleInfo,
+                  mode: str = MODE_FULL, use_hash: bool = False,
+                  clone_strategy: str = None, progress: Callable = None,
+                  profile: SyncProfile = None) -> dict:
         """
         复制单个角色数据
 
+        指定同步方案时只同步匹配的文件：复制源中匹配的文件、删除目标中匹配但源中
+        已没有的文件，不匹配的目标文件保持不变。full 和 staged 模式重写所有匹配的文件，
+        incremental 模式跳过未变化的文件。
+
         Args:
             source: 源角色
             target: 目标角色
+            mode: 复制模式，full、incremental 或 staged
+            use_hash: 增量模式下是否按内容哈希判断文件是否变化
+            clone_strategy: 克隆策略，默认使用 self.clone_strategy
+            progress: 进度回调，默认使用 set_progress_callback 设置的回调
+            profile: 同步方案
 
         Returns:
-            操作结果 {'success': bool, 'message': str}
+            操作结果 {'success': bool, 'message': str, 'mechanisms': {机制: 文件数}}，
+            增量模式或使用同步方案时额外返回 'summary': {'added', 'updated', 'deleted', 'skipped'}
         """
+        strategy = clone_strategy or self.clone_strategy
+        error = self._check_options(mode, strategy)
+        if error:
+            return {'success': False, 'message': error}
+
         try:
             source_path = Path(source.path)
             target_path = Path(target.path)
@@ -41,54 +111,567 @@ class RoleCopier:
             # 验证源路径
             if not source_path.exists():
                 return {'success': False, 'message': f'源路径不存在: {source_path}'}
+            self.discard_undo(target_path)
+
+            reporter = ProgressReporter(progress or self.progress_callback, 1, f"正在复制到: {target}",
+                                        op='copy')
+            started = time.perf_counter()
+
+            def copy_file(rel, dst):
+                src = source_path / rel
+                size = src.stat().st_size
+                with io_scheduler.slot(src, dst, size=size):
+                    mechanism = clone_file(src, dst, strategy)
+                reporter.file_done(size)
+                return mechanism
+
+            if mode == self.MODE_STAGED:
+                def build(staging):
+                    if profile:
+                        return self._build_profile_staging(source_path, target_path, staging,
+                                                           copy_file, strategy, profile)
+                    files, dirs = scan_tree(source_path)
+                    mechanisms = self._build_tree(staging, dirs, files, copy_file, self.max_workers)
+                    return {'success': True, 'message': '复制成功', 'mechanisms': dict(mechanisms)}
+
+                result = self._staged_replace(target_path, build)
+                reporter.step("复制完成")
+                self._record_throughput(reporter, started)
+                return result
+
+            if mode == self.MODE_INCREMENTAL or profile:
+                diff = diff_trees(source_path, target_path, use_hash, profile=profile,
+                                  hash_cache=self.hash_cache)
+                if mode == self.MODE_FULL:
+                    self._force_update(diff)
+                mechanisms = self._apply_diff(target_path, diff, copy_file)
+                reporter.step("复制完成")
+                self._record_throughput(reporter, started)
+                return self._incremental_result(diff, mechanisms)
 
             # 删除目标目录
             if target_path.exists():
-                shutil.rmtree(target_path)
+                with metrics.timer('delete'), io_scheduler.slot(target_path, measure=False):
+                    shutil.rmtree(target_path)
 
             # 复制目录
-            shutil.copytree(source_path, target_path)
+            mechanisms = Counter()
+
+            def copy_function(src, dst):
+                size = os.path.getsize(src)
+                with io_scheduler.slot(src, dst, size=size):
+                    mechanisms[clone_file(src, dst, strategy)] += 1
+                reporter.file_done(size)
+
+            shutil.copytree(source_path, target_path, copy_function=copy_function)
+            reporter.step("复制完成")
+            self._record_throughput(reporter, started)
 
-            return {'success': True, 'message': '复制成功'}
+            return {'success': True, 'message': '复制成功', 'mechanisms': dict(mechanisms)}
 
         except Exception as e:
             return {'success': False, 'message': f'复制失败: {str(e)}'}
 
-    def copy_to_multiple(self, source: RoleInfo, targets: List[RoleInfo]) -> dict:
+    def _record_throughput(self, reporter: ProgressReporter, started: float):
+        """用本次复制的字节数和耗时更新写入速度估计"""
+        self.throughput.record(reporter.bytes_done, reporter.files_done,
+                               time.perf_counter() - started)
+
+    @staticmethod
+    def _incremental_result(diff: TreeDiff, mechanisms: Counter) -> dict:
+        """生成增量同步的结果"""
+        return {
+            'success': True,
+            'message': (f'同步完成：新增 {len(diff.added)}，更新 {len(diff.updated)}，'
+                        f'删除 {len(diff.deleted)}，跳过 {len(diff.skipped)}'),
+            'summary': diff.to_summary(),
+            'mechanisms': dict(mechanisms)
+        }
+
+    def _staged_replace(self, target_path: Path, build: Callable[[Path], dict]) -> dict:
+        """
+        在暂存目录中生成新目录后替换目标，旧目录保留 UNDO_TTL 秒供撤销
+
+        Args:
+            target_path: 目标目录
+            build: 在暂存目录中生成完整内容的函数，返回复制结果
+
+        Returns:
+            build 的返回值，另含 'undo': True
+        """
+        swap = StagedSwap(target_path)
+        staging = swap.prepare()
+        try:
+            result = build(staging)
+            swap.commit(discard_old=False)
+        except BaseException:
+            swap.abort()
+            raise
+        self._keep_for_undo(swap)
+        return {**result, 'undo': True}
+
+    @staticmethod
+    def _undo_key(path) -> str:
+        return os.path.normcase(os.path.abspath(str(path)))
+
+    def _keep_for_undo(self, swap: StagedSwap):
+        """记录替换以便撤销，同时删除过期的旧目录"""
+        now = time.monotonic()
+        with self._undo_lock:
+            self._undo[self._undo_key(swap.target)] = swap
+            expired = [key for key, kept in self._undo.items() if now - kept.committed_at > self.UNDO_TTL]
+            discarded = [self._undo.pop(key) for key in expired]
+        for kept in discarded:
+            kept.discard_old()
+
+    def discard_undo(self, target_path):
+        """目标将被再次写入（复制、还原等），之前的替换不能再撤销，删除保留的旧目录"""
+        with self._undo_lock:
+            swap = self._undo.pop(self._undo_key(target_path), None)
+        if swap:
+            swap.discard_old()
+
+    def undo_staged(self, target: RoleInfo) -> dict:
+        """
+        撤销对目标最近一次 staged 复制，恢复复制前的目录
+
+        复制之后对目标的修改（如游戏写入的设置）一并丢弃。
+
+        Returns:
+            操作结果 {'success': bool, 'message': str}
+        """
+        with self._undo_lock:
+            swap = self._undo.pop(self._undo_key(target.path), None)
+        if swap is None or time.monotonic() - swap.committed_at > self.UNDO_TTL:
+            if swap:
+                swap.discard_old()
+            return {'success': False, 'message': '没有可撤销的复制'}
+
+        try:
+            swap.rollback()
+        except (OSError, RuntimeError) as e:
+            return {'success': False, 'message': f'撤销失败: {str(e)}'}
+        return {'success': True, 'message': f'已撤销对 {target} 的复制'}
+
+    @staticmethod
+    def _build_tree(root: Path, dirs, files, copy_file: Callable[[str, Path], str],
+                    workers: int = 1) -> Counter:
+        """
+        在空目录中按相对路径创建目录并写入文件
+
+        Args:
+            root: 目标根目录
+            dirs: 目录相对路径
+            files: 文件相对路径
+            copy_file: 写入单个文件的函数 (相对路径, 目标路径)，返回使用的机制
+            workers: 并发写入的线程数
+
+        Returns:
+            各机制写入的文件数
+        """
+        for rel in sorted(dirs, key=lambda d: d.count('/')):
+            (root / rel).mkdir(parents=True, exist_ok=True)
+
+        rels = list(files)
+        if workers > 1 and len(rels) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                used = list(executor.map(lambda rel: copy_file(rel, root / rel), rels))
+        else:
+            used = [copy_file(rel, root / rel) for rel in rels]
+        return Counter(used)
+
+    def _build_profile_staging(self, source_root: Path, target_path: Path, staging: Path,
+                               copy_file: Callable[[str, Path], str], strategy: str,
+                               profile: SyncProfile, source_tree=None,
+                               diff: TreeDiff = None) -> dict:
+        """
+        staged 模式使用同步方案时，先在暂存目录中克隆现有目标，再写入匹配的文件
+
+        Args:
+            diff: 同步计划中已算好的差异，为空时比较源目录和暂存目录
+
+        Returns:
+            复制结果，格式同增量同步
+        """
+        def clone_existing(src, dst):
+            with io_scheduler.slot(src, dst, size=os.path.getsize(src)):
+                clone_file(src, dst, strategy)
+
+        if target_path.exists():
+            shutil.copytree(target_path, staging, dirs_exist_ok=True, copy_function=clone_existing)
+
+        if diff is None:
+            diff = diff_trees(source_root, staging, source_tree=source_tree, profile=profile)
+        self._force_update(diff)
+        mechanisms = self._apply_diff(staging, diff, copy_file)
+        return self._incremental_result(diff, mechanisms)
+
+    @staticmethod
+    def _force_update(diff: TreeDiff):
+        """full 模式使用同步方案时，未变化的文件也重新写入"""
+        diff.updated = sorted(diff.updated + diff.skipped)
+        diff.skipped = []
+
+    @staticmethod
+    def _apply_diff(target_path: Path, diff: TreeDiff,
+                    copy_file: Callable[[str, Path], str]) -> Counter:
+        """
+        按差异同步目标目录
+
+        先删除多余的文件和目录，再创建缺失目录并复制新增/修改的文件，
+        这样源和目标之间文件与目录互换的情况也能正确处理。
+
+        Args:
+            target_path: 目标目录
+            diff: 目录差异
+            copy_file: 写入单个文件的函数 (相对路径, 目标路径)，返回使用的机制
+
+        Returns:
+            各机制写入的文件数
+        """
+        target_path.mkdir(parents=True, exist_ok=True)
+
+        with metrics.timer('delete'):
+            for rel in diff.deleted:
+                # 按同步计划执行时文件可能已被删除
+                path = target_path / rel
+                with io_scheduler.slot(path):
+                    path.unlink(missing_ok=True)
+
+            # 从最深的目录开始删除
+            for rel in sorted(diff.extra_dirs, key=lambda d: d.count('/'), reverse=True):
+                extra = target_path / rel
+                if extra.exists():
+                    with io_scheduler.slot(extra, measure=False):
+                        shutil.rmtree(extra)
+
+        for rel in diff.missing_dirs:
+            (target_path / rel).mkdir(parents=True, exist_ok=True)
+
+        # 写入时保留修改时间，下次同步时未变化的文件可直接跳过
+        mechanisms = Counter()
+        for rel in diff.added + diff.updated:
+            mechanisms[copy_file(rel, target_path / rel)] += 1
+
+        return mechanisms
+
+    @timed('copy')
+    def _copy_from_snapshot(self, snapshot: SourceSnapshot, target: RoleInfo,
+                            mode: str, use_hash: bool, strategy: str,
+                            reporter: ProgressReporter, diff: TreeDiff = None) -> dict:
+        """
+        将源快照写入单个目标，结果格式与 copy_role 相同
+
+        Args:
+            snapshot: 已加载的源快照
+            target: 目标角色
+            mode: 复制模式
+            use_hash: 增量模式下是否按内容哈希判断文件是否变化
+            strategy: 克隆策略
+            reporter: 进度汇总
+            diff: 同步计划中已算好的差异，提供时不再遍历目标目录
+        """
+        try:
+            target_path = Path(target.path)
+
+            if target_path.resolve() == snapshot.root.resolve():
+                return {'success': False, 'message': '源和目标不能相同'}
+            self.discard_undo(target_path)
+
+            def copy_file(rel, dst):
+                size = snapshot.files[rel].size
+                with io_scheduler.slot(snapshot.root / rel, dst, size=size):
+                    mechanism = snapshot.write_file(rel, dst, strategy)
+                reporter.file_done(size)
+                return mechanism
+
+            if mode == self.MODE_STAGED:
+                def build(staging):
+                    if snapshot.profile:
+                        return self._build_profile_staging(
+                            snapshot.root, target_path, staging, copy_file, strategy,
+                            snapshot.profile, source_tree=(snapshot.files, set(snapshot.dirs)),
+                            diff=diff
+                        )
+                    mechanisms = self._build_tree(staging, snapshot.dirs, snapshot.files, copy_file)
+                    return {'success': True, 'message': '复制成功', 'mechanisms': dict(mechanisms)}
+
+                return self._staged_replace(target_path, build)
+
+            if diff is None and (mode == self.MODE_INCREMENTAL or snapshot.profile):
+                diff = diff_trees(snapshot.root, target_path, use_hash,
+                                  source_tree=(snapshot.files, set(snapshot.dirs)),
+                                  profile=snapshot.profile, hash_cache=self.hash_cache)
+                if mode == self.MODE_FULL:
+                    self._force_update(diff)
+
+            if diff is not None:
+                mechanisms = self._apply_diff(target_path, diff, copy_file)
+                return self._incremental_result(diff, mechanisms)
+
+            # 删除目标目录
+            if target_path.exists():
+                with metrics.timer('delete'), io_scheduler.slot(target_path, measure=False):
+                    shutil.rmtree(target_path)
+
+            target_path.mkdir(parents=True)
+            for rel in snapshot.dirs:
+                (target_path / rel).mkdir()
+
+            mechanisms = Counter()
+            for rel in snapshot.files:
+                mechanisms[copy_file(rel, target_path / rel)] += 1
+
+            return {'success': True, 'message': '复制成功', 'mechanisms': dict(mechanisms)}
+
+        except Exception as e:
+            return {'success': False, 'message': f'复制失败: {str(e)}'}
+
+    def copy_to_multiple(self, source: RoleInfo, targets: List[RoleInfo],
+                         mode: str = MODE_FULL, use_hash: bool = False,
+                         max_workers: int = None, clone_strategy: str = None,
+                         progress: Callable = None, profile: SyncProfile = None,
+                         before_write: Callable = None) -> dict:
         """
         复制到多个目标角色
 
+        源目录只遍历和读取一次，然后在线程池中并发写入各个目标，
+        单个目标失败不影响其他目标。指定 before_write（如备份目标）时，
+        每个目标在自己的线程中先执行 before_write 再写入，各目标之间流水线并行，
+        before_write 失败的目标不会被覆盖。
+
         Args:
             source: 源角色
             targets: 目标角色列表
+            mode: 复制模式，见 copy_role
+            use_hash: 增量模式下是否按内容哈希判断文件是否变化
+            max_workers: 最大并发数，默认使用 self.max_workers
+            clone_strategy: 克隆策略，默认使用 self.clone_strategy
+            progress: 进度回调，默认使用 set_progress_callback 设置的回调
+            profile: 同步方案，见 copy_role
+            before_write: 写入每个目标前调用，参数为 (目标角色, 更新进度说明的函数)，
+                返回 {'success': bool, 'message': str, ...}
+
+        Returns:
+            操作结果 {'success_count': int, 'failed': List[dict], 'mechanisms': {机制: 文件数}}，
+            指定 before_write 时额外返回 'prepared': [{'role': str, **before_write 的结果}]
+        """
+        strategy = clone_strategy or self.clone_strategy
+        error = self._check_options(mode, strategy)
+        if error:
+            return self._fail_all(targets, error)
+
+        source_path = Path(source.path)
+        if not source_path.exists():
+            return self._fail_all(targets, f'源路径不存在: {source_path}')
+
+        reporter = ProgressReporter(progress or self.progress_callback, len(targets), op='copy')
+        reporter.set_message(f"正在读取源角色: {source}")
+
+        try:
+            # reflink 成功时不需要文件内容，按需读取
+            snapshot = SourceSnapshot(source.path, profile).load(read_data=(strategy != STRATEGY_REFLINK))
+        except Exception as e:
+            return self._fail_all(targets, f'读取源角色失败: {str(e)}')
+
+        jobs = [(target, None) for target in targets]
+        return self._write_targets(snapshot, jobs, mode, use_hash, strategy, reporter,
+                                   max_workers, before_write)
+
+    def _write_targets(self, snapshot: SourceSnapshot, jobs, mode: str, use_hash: bool,
+                       strategy: str, reporter: ProgressReporter, max_workers: int = None,
+                       before_write: Callable = None) -> dict:
+        """
+        在线程池中把源快照写入多个目标，写完后关闭快照
+
+        Args:
+            jobs: [(目标角色, 已算好的差异或 None)]
+            before_write: 写入每个目标前在同一线程中调用（如备份目标），参数为
+                (目标角色, 更新进度说明的函数)，返回 {'success': bool, 'message': str, ...}；
+                失败时跳过该目标，不会覆盖
 
         Returns:
-            操作结果 {'success_count': int, 'failed': List[dict]}
+            结果格式同 copy_to_multiple
         """
         success_count = 0
         failed_list = []
-        total = len(targets)
+        prepared_list = []
+        mechanisms = Counter()
+        workers = max(1, min(max_workers or self.max_workers, len(jobs) or 1))
+        copy_seconds = []
+
+        def write(target, diff):
+            prepared = None
+            if before_write:
+                prepared = before_write(target, reporter.set_message)
+                if not prepared['success']:
+                    return {'success': False, 'message': prepared['message']}, prepared
 
-        for i, target in enumerate(targets):
-            if self.progress_callback:
-                self.progress_callback(i, total, f"正在复制到: {target}")
+            started = time.perf_counter()
+            result = self._copy_from_snapshot(snapshot, target, mode, use_hash,
+                                              strategy, reporter, diff)
+            copy_seconds.append(time.perf_counter() - started)
+            return result, prepared
 
-            result = self.copy_role(source, target)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(write, target, diff): target for target, diff in jobs}
 
-            if result['success']:
-                success_count += 1
-            else:
-                failed_list.append({
-                    'role': str(target),
-                    'error': result['message']
-                })
+                for future in as_completed(futures):
+                    target = futures[future]
+                    result, prepared = future.result()
 
-        if self.progress_callback:
-            self.progress_callback(total, total, "复制完成")
+                    if prepared is not None:
+                        prepared_list.append({'role': str(target), **prepared})
+                    mechanisms.update(result.get('mechanisms', {}))
+                    if result['success']:
+                        success_count += 1
+                    else:
+                        failed_list.append({
+                            'role': str(target),
+                            'error': result['message']
+                        })
 
-        return {
+                    reporter.step(f"已处理: {target}")
+        finally:
+            snapshot.close()
+
+        # 各目标的复制耗时之和按并发数折算为复制阶段的实际耗时（不含备份）
+        if copy_seconds:
+            self.throughput.record(reporter.bytes_done, reporter.files_done,
+                                   sum(copy_seconds) / min(workers, len(copy_seconds)))
+        reporter.set_message("复制完成")
+
+        result = {
             'success_count': success_count,
-            'failed': failed_list
+            'failed': failed_list,
+            'mechanisms': dict(mechanisms)
+        }
+        if before_write:
+            result['prepared'] = prepared_list
+        return result
+
+    def plan(self, source: RoleInfo, targets: List[RoleInfo],
+             mode: str = MODE_FULL, use_hash: bool = False,
+             profile: SyncProfile = None, max_workers: int = None) -> SyncPlan:
+        """
+        生成同步计划，不写入任何文件
+
+        源目录只扫描一次，各目标的差异在线程池中并发计算；use_hash 为 True 时
+        通过哈希缓存比较内容，源文件只读取一次，未变化的文件不会重复读取。
+        full 和 staged 模式下所有匹配的文件都计入更新。
+
+        Args:
+            source: 源角色
+            targets: 目标角色列表
+            mode: 复制模式，见 copy_role
+            use_hash: 是否按内容哈希判断文件是否变化
+            profile: 同步方案
+            max_workers: 最大并发数，默认使用 self.max_workers
+
+        Returns:
+            同步计划，单个目标出错时记录在该目标的 error 中
+
+        Raises:
+            ValueError: 复制模式无效或源路径不存在
+        """
+        if mode not in self.MODES:
+            raise ValueError(f'不支持的复制模式: {mode}')
+
+        source_path = Path(source.path)
+        if not source_path.exists():
+            raise ValueError(f'源路径不存在: {source_path}')
+
+        files, dirs = scan_tree(source_path)
+        if profile:
+            files, dirs = profile.filter_tree(files)
+
+        plan = SyncPlan(source=source, mode=mode, use_hash=use_hash, profile=profile,
+                        source_files=files, source_dirs=dirs,
+                        throughput=self.throughput.to_dict())
+
+        def plan_target(target: RoleInfo) -> TargetPlan:
+            target_path = Path(target.path)
+            if target_path.resolve() == source_path.resolve():
+                return TargetPlan(target, error='源和目标不能相同')
+            try:
+                diff = diff_trees(source_path, target_path, use_hash, source_tree=(files, dirs),
+                                  profile=profile, hash_cache=self.hash_cache)
+            except OSError as e:
+                return TargetPlan(target, error=f'读取目标失败: {str(e)}')
+
+            if mode != self.MODE_INCREMENTAL:
+                self._force_update(diff)
+
+            changed = diff.added + diff.updated
+            bytes_to_copy = sum(files[rel].size for rel in changed)
+            bytes_to_delete = 0
+            for rel in diff.deleted:
+                try:
+                    bytes_to_delete += (target_path / rel).stat().st_size
+                except OSError:
+                    pass
+            return TargetPlan(target, diff, bytes_to_copy, bytes_to_delete,
+                              self.throughput.estimate(bytes_to_copy, len(changed)))
+
+        workers = max(1, min(max_workers or self.max_workers, len(targets) or 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            plan.targets = list(executor.map(plan_target, targets))
+
+        return plan
+
+    def execute_plan(self, plan: SyncPlan, max_workers: int = None,
+                     clone_strategy: str = None, progress: Callable = None,
+                     before_write: Callable = None) -> dict:
+        """
+        按同步计划写入各目标
+
+        直接使用计划中的源目录和差异，不再遍历源目录和目标目录。
+        计划生成后目录如有变化，应重新生成计划。
+
+        Args:
+            plan: RoleCopier.plan 生成的计划
+            max_workers: 最大并发数，默认使用 self.max_workers
+            clone_strategy: 克隆策略，默认使用 self.clone_strategy
+            progress: 进度回调，默认使用 set_progress_callback 设置的回调
+            before_write: 写入每个目标前调用，见 copy_to_multiple
+
+        Returns:
+            结果格式同 copy_to_multiple
+        """
+        targets = [t.target for t in plan.targets]
+        strategy = clone_strategy or self.clone_strategy
+        error = self._check_options(plan.mode, strategy)
+        if error:
+            return self._fail_all(targets, error)
+
+        reporter = ProgressReporter(progress or self.progress_callback, len(targets), op='copy')
+        reporter.set_message(f"正在读取源角色: {plan.source}")
+
+        try:
+            snapshot = SourceSnapshot(plan.source.path, plan.profile).load(
+                read_data=(strategy != STRATEGY_REFLINK),
+                tree=(plan.source_files, plan.source_dirs)
+            )
+        except Exception as e:
+            return self._fail_all(targets, f'读取源角色失败: {str(e)}')
+
+        failed = [{'role': str(t.target), 'error': t.error} for t in plan.targets if t.error]
+        jobs = [(t.target, t.diff) for t in plan.targets if not t.error]
+        reporter.step(advance=len(failed))
+
+        result = self._write_targets(snapshot, jobs, plan.mode, plan.use_hash,
+                                     strategy, reporter, max_workers, before_write)
+        result['failed'] = failed + result['failed']
+        return result
+
+    @staticmethod
+    def _fail_all(targets: List[RoleInfo], message: str) -> dict:
+        """所有目标都以同一原因失败时的结果"""
+        return {
+            'success_count': 0,
+            'failed': [{'role': str(t), 'error': message} for t in targets],
+            'mechanisms': {}
         }
 
     @staticmethod
@@ -0,0 +1,325 @@
+"""
+角色索引模块
+持久化保存扫描结果，按目录修改时间逐层校验，只重新遍历有变化的目录
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+from .metrics import STAT_CALLS, metrics
+from .models import RoleInfo
+from .staged_swap import is_temp_name
+
+
+class RoleIndex:
+    """
+    角色索引
+
+    索引是 userdata 目录树的缓存：账号 -> 大区 -> 服务器 -> 角色。
+    每个目录节点记录自身的修改时间，目录中增删或重命名子项时修改时间会变化，
+    此时只重新列出该目录；修改时间不变的目录直接沿用缓存的子项列表。
+    """
+
+    VERSION = 1
+    # 账号、大区、服务器三层目录下还有子目录，角色目录是叶子
+    DEPTH = 3
+
+    def __init__(self, userdata_path: str, index_file: str):
+        """
+        初始化索引
+
+        Args:
+            userdata_path: userdata 目录路径
+            index_file: 索引文件路径
+        """
+        self.userdata_path = Path(userdata_path)
+        self.index_file = Path(index_file)
+        self.tree: Optional[dict] = None
+        self._roles: Optional[List[RoleInfo]] = None
+        self._lock = threading.RLock()
+        # 刷新之间互斥；刷新期间只在替换索引树时持有 _lock，读取角色列表不必等待遍历完成
+        self._refresh_lock = threading.RLock()
+        # 最近一次刷新中无法读取的目录 [{'path': str, 'error': str}]
+        self.errors: List[dict] = []
+        # 角色变化监听器，回调参数为 (新增角色列表, 删除角色列表)
+        self._listeners: List[Callable[[List[RoleInfo], List[RoleInfo]], None]] = []
+
+    def add_listener(self, callback: Callable[[List[RoleInfo], List[RoleInfo]], None]):
+        """添加角色变化监听器，回调在持有索引锁时调用，应尽快返回"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[List[RoleInfo], List[RoleInfo]], None]):
+        """移除角色变化监听器"""
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify(self, old_roles: List[RoleInfo], new_roles: List[RoleInfo]):
+        """比较刷新前后的角色列表并通知监听器"""
+        old_paths = {role.path for role in old_roles}
+        new_paths = {role.path for role in new_roles}
+        added = [role for role in new_roles if role.path not in old_paths]
+        removed = [role for role in old_roles if role.path not in new_paths]
+        if not added and not removed:
+            return
+
+        for callback in list(self._listeners):
+            try:
+                callback(added, removed)
+            except Exception as e:
+                print(f"角色变化通知失败: {e}")
+
+    def load(self) -> bool:
+        """
+        从磁盘加载索引
+
+        Returns:
+            是否加载成功
+        """
+        if not self.index_file.exists():
+            return False
+
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"加载角色索引失败: {e}")
+            return False
+
+        if data.get('version') != self.VERSION or data.get('userdata_path') != str(self.userdata_path):
+            return False
+
+        with self._lock:
+            self.tree = data.get('tree')
+            self._roles = None
+        return True
+
+    def save(self) -> bool:
+        """
+        保存索引到磁盘
+
+        Returns:
+            是否保存成功
+        """
+        # 多个请求可能同时保存，序列化和写入都在锁内，避免共用临时文件或读到修改中的树
+        with self._lock:
+            data = {
+                'version': self.VERSION,
+                'userdata_path': str(self.userdata_path),
+                'tree': self.tree
+            }
+
+            try:
+                self.index_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.index_file.with_suffix('.tmp')
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp, self.index_file)
+                return True
+            except Exception as e:
+                print(f"保存角色索引失败: {e}")
+                return False
+
+    def refresh(self, max_workers: int = 1) -> int:
+        """
+        校验并更新索引
+
+        Args:
+            max_workers: 并行校验账号文件夹的线程数
+
+        Returns:
+            重新列出的目录数量，0 表示索引无变化
+        """
+        with self._refresh_lock:
+            with self._lock:
+                tree = self.tree
+                old_roles = self.roles() if self._listeners and tree else []
+
+            # 校验时不修改旧的节点（见 _revalidate），遍历期间其他线程仍可读取旧的索引树
+            stats = {'relisted': 0, 'errors': []}
+            root = self._revalidate_dir(tree, self.userdata_path, stats)
+
+            if root is not None:
+                accounts = list(root['children'].items())
+                results = []
+
+                def revalidate_account(item):
+                    name, child = item
+                    account_stats = {'relisted': 0, 'errors': []}
+                    child = self._revalidate(child, self.userdata_path / name, 1, account_stats)
+                    return name, child, account_stats
+
+                # 各账号互不影响，并行校验
+                workers = min(max_workers, len(accounts))
+                if workers > 1:
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        results = list(executor.map(revalidate_account, accounts))
+                else:
+                    results = [revalidate_account(item) for item in accounts]
+
+                children = {}
+                for name, child, account_stats in results:
+                    stats['relisted'] += account_stats['relisted']
+                    stats['errors'].extend(account_stats['errors'])
+                    # 子目录在两次列出之间被删除
+                    if child is not None:
+                        children[name] = child
+                root = {'mtime_ns': root['mtime_ns'], 'children': children}
+
+            with self._lock:
+                self.tree = root
+                self.errors = stats['errors']
+                if stats['relisted']:
+                    self._roles = None
+                    if self._listeners:
+                        self._notify(old_roles, self.roles())
+                return stats['relisted']
+
+    def refresh_subtree(self, parts: Sequence[str]) -> int:
+        """
+        只校验 userdata 下的某个子目录
+
+        Args:
+            parts: 子目录的相对路径各级名称，如 (账号, 大区)；
+                   为空或上级目录不在索引中时退化为完整刷新
+
+        Returns:
+            重新列出的目录数量
+        """
+        parts = tuple(parts)[:self.DEPTH]
+
+        with self._refresh_lock, self._lock:
+            parent = None
+            node = self.tree
+            for name in parts:
+                if node is None or name not in node['children']:
+                    return self.refresh()
+                parent, node = node, node['children'][name]
+
+            if parent is None:
+                return self.refresh()
+
+            old_roles = self.filter(*parts) if self._listeners else []
+            stats = {'relisted': 0, 'errors': []}
+            path = self.userdata_path.joinpath(*parts)
+            node = self._revalidate(node, path, len(parts), stats)
+
+            if node is None:
+                del parent['children'][parts[-1]]
+            else:
+                parent['children'][parts[-1]] = node
+
+            self.errors = stats['errors']
+            if stats['relisted']:
+                self._roles = None
+                if self._listeners:
+                    self._notify(old_roles, self.filter(*parts))
+            return stats['relisted']
+
+    def _revalidate(self, node: Optional[dict], path: Path, depth: int, stats: dict) -> Optional[dict]:
+        """
+        递归校验目录节点及其子目录
+
+        Args:
+            node: 缓存的节点 {'mtime_ns': int, 'children': {名称: 节点}}，
+                  角色所在的服务器层 children 为 {角色名: None}
+            path: 目录路径
+            depth: 当前层级，0 为 userdata
+            stats: 统计信息
+
+        Returns:
+            更新后的节点，目录不存在时返回 None
+        """
+        node = self._revalidate_dir(node, path, stats)
+
+        if node is not None and depth < self.DEPTH:
+            children = {}
+            for name, child in node['children'].items():
+                child = self._revalidate(child, path / name, depth + 1, stats)
+                # 子目录在两次列出之间被删除
+                if child is not None:
+                    children[name] = child
+            # 生成新节点而不是修改旧节点，其他线程可能正在读取旧的索引树
+            node = {'mtime_ns': node['mtime_ns'], 'children': children}
+
+        return node
+
+    @staticmethod
+    def _revalidate_dir(node: Optional[dict], path: Path, stats: dict) -> Optional[dict]:
+        """
+        校验单个目录，修改时间变化时重新列出子目录
+
+        Returns:
+            更新后的节点，目录不存在时返回 None
+        """
+        metrics.inc(STAT_CALLS, source='role_index')
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            if node is not None:
+                stats['relisted'] += 1
+            return None
+
+        if node is None or node['mtime_ns'] != mtime_ns:
+            old_children = node['children'] if node else {}
+            children = {}
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        # 跳过复制过程中的临时目录
+                        if entry.is_dir() and not is_temp_name(entry.name):
+                            children[entry.name] = old_children.get(entry.name)
+            except OSError as e:
+                stats['errors'].append({'path': str(path), 'error': str(e)})
+                # 无法读取时保留旧的子项，下次刷新再重试
+                return {'mtime_ns': None, 'children': old_children}
+            node = {'mtime_ns': mtime_ns, 'children': children}
+            stats['relisted'] += 1
+
+        return node
+
+    def roles(self) -> List[RoleInfo]:
+        """获取所有角色（按账号、大区、服务器、角色名排序）"""
+        with self._lock:
+            if self._roles is None:
+                self._roles = self.filter()
+            return self._roles
+
+    def filter(self, account: str = None, region: str = None, server: str = None) -> List[RoleInfo]:
+        """
+        按账号、大区、服务器筛选角色，直接沿索引树查找
+
+        Returns:
+            角色信息列表
+        """
+        roles = []
+
+        with self._lock:
+            accounts = self.tree['children'] if self.tree else {}
+            for account_name in self._select(accounts, account):
+                regions = accounts[account_name]['children']
+                for region_name in self._select(regions, region):
+                    servers = regions[region_name]['children']
+                    for server_name in self._select(servers, server):
+                        server_path = self.userdata_path / account_name / region_name / server_name
+                        for role_name in sorted(servers[server_name]['children']):
+                            roles.append(RoleInfo(
+                                account=account_name,
+                                region=region_name,
+                                server=server_name,
+                                role=role_name,
+                                path=str(server_path / role_name)
+                            ))
+
+        return roles
+
+    @staticmethod
+    def _select(children: dict, name: Optional[str]) -> List[str]:
+        """指定名称时只返回该子项，否则返回全部子项"""
+        if name:
+            return [name] if name in children else []
+        return sorted(children)
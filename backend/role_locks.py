@@ -0,0 +1,223 @@
+"""
+角色锁模块
+按角色路径加读写锁，保证同一角色同一时间只有一个写入操作，
+不同角色上的操作可以并行
+"""
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Optional, Set
+
+# 所有操作都持有该键的读锁，切换游戏路径等全局操作持有写锁
+ALL_ROLES = '*'
+
+# 等待期间调用 waiting 回调的间隔（秒）
+WAIT_INTERVAL = 0.5
+
+
+class RoleBusy(Exception):
+    """角色正在被其他操作使用"""
+
+    def __init__(self, owner: str = ''):
+        self.owner = owner
+        super().__init__(f"角色正在被其他操作使用：{owner}" if owner else '角色正在被其他操作使用')
+
+
+def role_key(path) -> str:
+    """角色路径规范化为锁的键，Windows 下不区分大小写"""
+    if path == ALL_ROLES:
+        return ALL_ROLES
+    return os.path.normcase(os.path.abspath(str(path)))
+
+
+class RoleLease:
+    """
+    一次操作持有的角色锁，release() 一次释放全部
+
+    不绑定线程：可以在请求线程中获得、在任务线程中释放。
+    """
+
+    def __init__(self, locks: 'RoleLocks', owner: str):
+        self.locks = locks
+        self.owner = owner
+        self.reads = set()
+        self.writes = set()
+
+    def add(self, reads: Iterable = (), writes: Iterable = (), timeout: Optional[float] = 0,
+            waiting: Callable[[str], None] = None):
+        """
+        追加锁，已持有的键不重复获取
+
+        已持有锁时再等待可能与其他操作互相等待，默认不等待，冲突时直接抛出 RoleBusy。
+        """
+        writes = {role_key(p) for p in writes} - self.writes
+        reads = {role_key(p) for p in reads} - self.reads - self.writes - writes
+        self.locks._acquire(self, reads, writes, timeout, waiting)
+
+    def release(self):
+        self.locks._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class RoleLocks:
+    """
+    按角色路径的读写锁管理器
+
+    一次获取的所有锁要么全部获得，要么一个都不持有，不会因为加锁顺序不同而死锁。
+    有写入操作在等待的角色不再接受之后到达的读锁，避免写入一直等不到；先到达的操作
+    不受后到达的等待者影响，等待关系只指向持有者或更早的等待者，不会形成环。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        # 键 -> 持有读锁的操作
+        self._readers: Dict[str, Set[RoleLease]] = defaultdict(set)
+        # 键 -> 持有写锁的操作
+        self._writers: Dict[str, RoleLease] = {}
+        # 键 -> 正在等待写锁的操作的到达序号
+        self._waiting_writers: Dict[str, Set[int]] = defaultdict(set)
+        self._tickets = itertools.count()
+
+    def acquire(self, reads: Iterable = (), writes: Iterable = (), owner: str = '',
+                timeout: Optional[float] = None, waiting: Callable[[str], None] = None) -> RoleLease:
+        """
+        获取角色锁
+
+        Args:
+            reads: 只读取的角色路径（如复制源）
+            writes: 会被修改的角色路径
+            owner: 操作说明，冲突时告知其他操作
+            timeout: 最长等待时间（秒），0 表示冲突时立即失败，None 表示一直等待
+            waiting: 等待期间定期调用，参数为占用角色的操作说明；抛出异常可中止等待
+
+        Returns:
+            RoleLease，可用作上下文管理器
+
+        Raises:
+            RoleBusy: 超时仍有冲突
+        """
+        lease = RoleLease(self, owner)
+        lease.add([*reads, ALL_ROLES], writes, timeout, waiting)
+        return lease
+
+    def acquire_all(self, owner: str = '', timeout: Optional[float] = 0) -> RoleLease:
+        """获取全局写锁：等待所有角色操作结束，期间不允许新的操作"""
+        lease = RoleLease(self, owner)
+        lease.add(writes=[ALL_ROLES], timeout=timeout)
+        return lease
+
+    def conflict(self, reads: Iterable = (), writes: Iterable = ()) -> Optional[str]:
+        """
+        检查是否有冲突，不加锁
+
+        Returns:
+            占用角色的操作说明，没有冲突时返回 None
+        """
+        reads = {role_key(p) for p in reads} | {ALL_ROLES}
+        writes = {role_key(p) for p in writes}
+        with self._cond:
+            return self._conflict(None, reads - writes, writes)
+
+    def holders(self) -> list:
+        """当前持有写锁的操作 [{'key': str, 'owner': str}]"""
+        with self._cond:
+            return [{'key': key, 'owner': lease.owner} for key, lease in self._writers.items()]
+
+    def _conflict(self, lease: Optional[RoleLease], reads: set, writes: set,
+                  ticket: Optional[int] = None):
+        """
+        返回占用的操作说明；无法得知时返回空字符串；没有冲突返回 None
+
+        Args:
+            ticket: 本次获取的到达序号，只有更早到达的等待写锁才挡住读锁；为空表示刚刚到达
+        """
+        for key in writes:
+            writer = self._writers.get(key)
+            if writer is not None and writer is not lease:
+                return writer.owner
+            # 自己持有的读锁不算冲突（读锁升级为写锁）
+            for reader in self._readers.get(key, ()):
+                if reader is not lease:
+                    return reader.owner
+        for key in reads:
+            writer = self._writers.get(key)
+            if writer is not None and writer is not lease:
+                return writer.owner
+            waiters = self._waiting_writers.get(key)
+            if waiters and (ticket is None or min(waiters) < ticket):
+                return ''
+        return None
+
+    def _acquire(self, lease: RoleLease, reads: set, writes: set, timeout: Optional[float],
+                 waiting: Callable[[str], None]):
+        if not reads and not writes:
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            ticket = next(self._tickets)
+            owner = self._conflict(lease, reads, writes, ticket)
+            if owner is not None and timeout != 0:
+                for key in writes:
+                    self._waiting_writers[key].add(ticket)
+                try:
+                    while owner is not None:
+                        remaining = WAIT_INTERVAL if deadline is None else \
+                            min(WAIT_INTERVAL, deadline - time.monotonic())
+                        if remaining <= 0:
+                            break
+                        if waiting:
+                            # 回调可能较慢或抛出异常，不持有锁调用
+                            self._cond.release()
+                            try:
+                                waiting(owner)
+                            finally:
+                                self._cond.acquire()
+                        self._cond.wait(remaining)
+                        owner = self._conflict(lease, reads, writes, ticket)
+                finally:
+                    for key in writes:
+                        self._waiting_writers[key].discard(ticket)
+                        if not self._waiting_writers[key]:
+                            del self._waiting_writers[key]
+                    # 放弃等待后，被挡住的读锁可以继续
+                    self._cond.notify_all()
+
+            if owner is not None:
+                raise RoleBusy(owner)
+
+            for key in writes:
+                self._writers[key] = lease
+                if key in lease.reads:
+                    lease.reads.discard(key)
+                    self._discard_reader(key, lease)
+            for key in reads:
+                self._readers[key].add(lease)
+            lease.reads |= reads
+            lease.writes |= writes
+
+    def _release(self, lease: RoleLease):
+        with self._cond:
+            for key in lease.writes:
+                if self._writers.get(key) is lease:
+                    del self._writers[key]
+            for key in lease.reads:
+                self._discard_reader(key, lease)
+            lease.reads = set()
+            lease.writes = set()
+            self._cond.notify_all()
+
+    def _discard_reader(self, key: str, lease: RoleLease):
+        readers = self._readers.get(key)
+        if readers is not None:
+            readers.discard(lease)
+            if not readers:
+                del self._readers[key]
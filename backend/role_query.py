@@ -0,0 +1,252 @@
+"""
+角色查询模块
+在扫描结果上建立倒排索引，支持按账号/大区/服务器筛选、角色名前缀和模糊搜索（含拼音）、排序和分页
+"""
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    from pypinyin import lazy_pinyin
+    HAS_PINYIN = True
+except ImportError:
+    HAS_PINYIN = False
+
+from .models import RoleInfo
+
+
+MATCH_PREFIX = 'prefix'
+MATCH_FUZZY = 'fuzzy'
+MATCH_MODES = (MATCH_PREFIX, MATCH_FUZZY)
+
+SORT_SCORE = 'score'
+SORT_KEYS = (SORT_SCORE, 'account', 'region', 'server', 'role')
+
+# GB2312 一级汉字按拼音排序，各声母首字的 GBK 编码
+_GBK_INITIALS = [
+    (0xB0A1, 'a'), (0xB0C5, 'b'), (0xB2C1, 'c'), (0xB4EE, 'd'), (0xB6EA, 'e'),
+    (0xB7A2, 'f'), (0xB8C1, 'g'), (0xB9FE, 'h'), (0xBBF7, 'j'), (0xBFA6, 'k'),
+    (0xC0AC, 'l'), (0xC2E8, 'm'), (0xC4C3, 'n'), (0xC5B6, 'o'), (0xC5BE, 'p'),
+    (0xC6DA, 'q'), (0xC8BB, 'r'), (0xC8F6, 's'), (0xCBFA, 't'), (0xCDDA, 'w'),
+    (0xCEF4, 'x'), (0xD1B9, 'y'), (0xD4D1, 'z')
+]
+_GBK_CODES = [code for code, _ in _GBK_INITIALS]
+_GBK_LEVEL1_END = 0xD7F9
+
+
+def _is_han(ch: str) -> bool:
+    return '一' <= ch <= '鿿'
+
+
+def _gbk_initial(ch: str) -> Optional[str]:
+    """按 GBK 编码查汉字的拼音首字母，只支持 GB2312 一级汉字"""
+    try:
+        data = ch.encode('gbk')
+    except UnicodeEncodeError:
+        return None
+    if len(data) != 2:
+        return None
+    code = (data[0] << 8) | data[1]
+    if code < _GBK_CODES[0] or code > _GBK_LEVEL1_END:
+        return None
+    return _GBK_INITIALS[bisect_left(_GBK_CODES, code + 1) - 1][1]
+
+
+def pinyin_keys(name: str) -> Tuple[str, str]:
+    """
+    生成角色名的拼音检索键
+
+    Returns:
+        (拼音首字母, 全拼)；未安装 pypinyin 时全拼为空，
+        首字母只覆盖常用汉字，其余汉字原样保留。非汉字字符原样保留（小写）。
+    """
+    initials = []
+    full = []
+    for ch in name.casefold():
+        if not _is_han(ch):
+            initials.append(ch)
+            full.append(ch)
+        elif HAS_PINYIN:
+            syllable = lazy_pinyin(ch)[0]
+            initials.append(syllable[0])
+            full.append(syllable)
+        else:
+            initials.append(_gbk_initial(ch) or ch)
+    return ''.join(initials), ''.join(full) if HAS_PINYIN else ''
+
+
+class RoleQuery:
+    """
+    角色查询引擎
+
+    在构造时为一份角色列表建立索引，角色列表变化后需重新构造。
+    """
+
+    def __init__(self, roles: List[RoleInfo]):
+        """
+        建立索引
+
+        Args:
+            roles: 角色列表（构造后不应再修改）
+        """
+        self.roles = roles
+        self._by_account: Dict[str, Set[int]] = defaultdict(set)
+        self._by_region: Dict[str, Set[int]] = defaultdict(set)
+        self._by_server: Dict[str, Set[int]] = defaultdict(set)
+        self._names: List[str] = []
+        self._initials: List[str] = []
+        self._pinyin: List[str] = []
+        # 前缀查找用的有序键 (检索键, 角色序号)，包括角色名、拼音首字母和全拼
+        prefix_keys = []
+
+        for i, role in enumerate(roles):
+            self._by_account[role.account].add(i)
+            self._by_region[role.region].add(i)
+            self._by_server[role.server].add(i)
+
+            name = role.role.casefold()
+            initials, full = pinyin_keys(role.role)
+            self._names.append(name)
+            self._initials.append(initials)
+            self._pinyin.append(full)
+            for key in {name, initials, full}:
+                if key:
+                    prefix_keys.append((key, i))
+
+        prefix_keys.sort()
+        self._prefix_keys = [key for key, _ in prefix_keys]
+        self._prefix_ids = [i for _, i in prefix_keys]
+
+    def search(self, q: str = '', account: str = None, region: str = None, server: str = None,
+               match: str = MATCH_FUZZY, sort: str = None, order: str = 'asc',
+               offset: int = 0, limit: int = 50) -> dict:
+        """
+        查询角色
+
+        Args:
+            q: 角色名关键字，可以是汉字、拼音首字母或全拼（需安装 pypinyin）
+            account: 账号
+            region: 大区
+            server: 服务器
+            match: prefix（前缀）或 fuzzy（包含或按顺序出现）
+            sort: 排序字段，见 SORT_KEYS；有关键字时默认按匹配度，否则按账号、大区、服务器、角色名
+            order: asc 或 desc
+            offset: 跳过的结果数
+            limit: 返回的结果数，0 表示不限
+
+        Returns:
+            {'total': 匹配总数, 'roles': [RoleInfo], 'offset': int, 'limit': int}
+
+        Raises:
+            ValueError: 参数无效
+        """
+        if match not in MATCH_MODES:
+            raise ValueError(f'不支持的匹配方式: {match}')
+        if sort is not None and sort not in SORT_KEYS:
+            raise ValueError(f'不支持的排序字段: {sort}')
+
+        candidates = self._filter_ids(account, region, server)
+        q = (q or '').strip().casefold()
+
+        scores: Dict[int, int] = {}
+        if q:
+            if match == MATCH_PREFIX:
+                scores = self._prefix_scores(q, candidates)
+            else:
+                scores = self._fuzzy_scores(q, candidates)
+            ids = list(scores)
+        elif candidates is None:
+            ids = list(range(len(self.roles)))
+        else:
+            ids = list(candidates)
+
+        sort = sort or (SORT_SCORE if q else None)
+        if sort == SORT_SCORE:
+            # 匹配度相同时保持原有顺序
+            ids.sort(key=lambda i: (-scores.get(i, 0), i), reverse=(order == 'desc'))
+        elif sort:
+            ids.sort(key=lambda i: (getattr(self.roles[i], sort), i), reverse=(order == 'desc'))
+        else:
+            ids.sort(reverse=(order == 'desc'))
+
+        offset = max(0, offset)
+        page = ids[offset:offset + limit] if limit else ids[offset:]
+        return {
+            'total': len(ids),
+            'roles': [self.roles[i] for i in page],
+            'offset': offset,
+            'limit': limit
+        }
+
+    def _filter_ids(self, account: str, region: str, server: str) -> Optional[Set[int]]:
+        """按倒排索引求交集，没有筛选条件时返回 None 表示全部"""
+        sets = []
+        for index, value in ((self._by_account, account), (self._by_region, region),
+                             (self._by_server, server)):
+            if value:
+                sets.append(index.get(value, set()))
+        if not sets:
+            return None
+
+        sets.sort(key=len)
+        result = set(sets[0])
+        for s in sets[1:]:
+            result &= s
+        return result
+
+    def _prefix_scores(self, q: str, candidates: Optional[Set[int]]) -> Dict[int, int]:
+        """前缀匹配：在有序键上二分查找"""
+        scores = {}
+        start = bisect_left(self._prefix_keys, q)
+        for pos in range(start, len(self._prefix_keys)):
+            if not self._prefix_keys[pos].startswith(q):
+                break
+            i = self._prefix_ids[pos]
+            if candidates is not None and i not in candidates:
+                continue
+            score = self._score(q, i, prefix_only=True)
+            if score > scores.get(i, 0):
+                scores[i] = score
+        return scores
+
+    def _fuzzy_scores(self, q: str, candidates: Optional[Set[int]]) -> Dict[int, int]:
+        """模糊匹配：逐个检查候选角色"""
+        pattern = re.compile('.*?'.join(map(re.escape, q)))
+        ids = range(len(self.roles)) if candidates is None else candidates
+        scores = {}
+        for i in ids:
+            score = self._score(q, i, pattern=pattern)
+            if score:
+                scores[i] = score
+        return scores
+
+    def _score(self, q: str, i: int, prefix_only: bool = False, pattern: re.Pattern = None) -> int:
+        """
+        计算匹配度，0 表示不匹配
+
+        角色名优先于拼音首字母，拼音首字母优先于全拼；
+        完全相同 > 前缀 > 包含（越靠前越好）> 按顺序出现（间隔越小越好）
+        """
+        best = 0
+        for key, weight in ((self._names[i], 300), (self._initials[i], 200), (self._pinyin[i], 100)):
+            if not key:
+                continue
+            if key == q:
+                score = 4000
+            elif key.startswith(q):
+                score = 3000 - min(len(key) - len(q), 99)
+            elif prefix_only:
+                continue
+            else:
+                pos = key.find(q)
+                if pos > 0:
+                    score = 2000 - min(pos, 99)
+                else:
+                    found = pattern.search(key)
+                    if not found:
+                        continue
+                    gaps = found.end() - found.start() - len(q)
+                    score = 1000 - min(gaps * 10 + found.start(), 999)
+            best = max(best, score + weight)
+        return best
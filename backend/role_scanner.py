@@ -2,94 +2,178 @@
 角色扫描模块
 扫描和识别所有游戏角色
 """
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from .hash_cache import HashCache
+from .metrics import timed
 from .models import RoleInfo
+from .role_index import RoleIndex
+from .role_query import MATCH_FUZZY, RoleQuery
+from .staged_swap import is_temp_name
+from .tree_diff import scan_tree
 
 
 class RoleScanner:
     """角色扫描器"""
 
-    def __init__(self, userdata_path: str):
+    # 并行扫描账号文件夹的最大线程数
+    MAX_WORKERS = 8
+
+    def __init__(self, userdata_path: str, index_file: str = None, hash_cache: HashCache = None,
+                 use_saved_index: bool = False):
         """
         初始化扫描器
 
         Args:
             userdata_path: userdata 目录路径
+            index_file: 角色索引文件路径，指定后扫描结果会持久化并增量更新
+            hash_cache: 文件哈希缓存，计算角色文件哈希时使用
+            use_saved_index: 为 True 时从磁盘加载的索引不经校验直接使用，
+                由调用方在后台调用 scan_all_roles() 校验；否则第一次获取角色时先校验
         """
         self.userdata_path = Path(userdata_path)
-
+        self.hash_cache = hash_cache or HashCache()
+        self.index: Optional[RoleIndex] = None
+        self._index_ready = False
+        # 最近一次扫描中无法读取的目录 [{'path': str, 'error': str}]
+        self.scan_errors: List[dict] = []
+        self._query: Optional[RoleQuery] = None
+        self._query_lock = threading.Lock()
+
+        if index_file:
+            self.index = RoleIndex(userdata_path, index_file)
+            if self.index.load() and use_saved_index and self.index.tree is not None:
+                self._index_ready = True
+
+    @timed('scan')
     def scan_all_roles(self) -> List[RoleInfo]:
         """
         扫描所有角色
 
+        使用索引时只重新遍历修改时间有变化的目录
+
         Returns:
             角色信息列表
         """
+        if self.index:
+            if self.index.refresh(self.MAX_WORKERS):
+                self.index.save()
+            self.scan_errors = self.index.errors
+            self._index_ready = True
+            return self.index.roles()
+
         roles = []
+        errors = []
+        self.scan_errors = errors
 
         if not self.userdata_path.exists():
             return roles
 
-        try:
-            # 遍历账号文件夹
-            for account_folder in self.userdata_path.iterdir():
-                if not account_folder.is_dir():
-                    continue
-
-                # 检查是否为本地数据（有子文件夹）
-                subdirs = [d for d in account_folder.iterdir() if d.is_dir()]
-                if len(subdirs) == 0:
-                    continue  # 跳过服务器数据
-
-                # 遍历大区
-                for region_folder in account_folder.iterdir():
-                    if not region_folder.is_dir():
-                        continue
-
-                    # 遍历服务器
-                    for server_folder in region_folder.iterdir():
-                        if not server_folder.is_dir():
-                            continue
-
-                        # 遍历角色
-                        for role_folder in server_folder.iterdir():
-                            if not role_folder.is_dir():
-                                continue
-
-                            role_info = RoleInfo(
-                                account=account_folder.name,
-                                region=region_folder.name,
-                                server=server_folder.name,
-                                role=role_folder.name,
-                                path=str(role_folder)
-                            )
-                            roles.append(role_info)
-
-        except Exception as e:
-            print(f"扫描角色失败: {e}")
+        # 遍历账号文件夹
+        accounts = self._list_subdirs(self.userdata_path, errors)
+
+        # 各账号互不影响，并行扫描
+        workers = min(self.MAX_WORKERS, len(accounts))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self._scan_account, accounts))
+        else:
+            results = [self._scan_account(account) for account in accounts]
+
+        for account_roles, account_errors in results:
+            roles.extend(account_roles)
+            errors.extend(account_errors)
+
+        for error in errors:
+            print(f"扫描目录失败 {error['path']}: {error['error']}")
 
         return roles
 
-    def get_accounts(self, roles: List[RoleInfo]) -> List[str]:
-        """获取所有账号"""
+    def _scan_account(self, account: os.DirEntry) -> Tuple[List[RoleInfo], List[dict]]:
+        """
+        扫描单个账号文件夹
+
+        没有子文件夹的账号是服务器数据，遍历结果自然为空
+
+        Returns:
+            (角色列表, 错误列表)
+        """
+        roles = []
+        errors = []
+
+        # 遍历大区
+        for region in self._list_subdirs(account.path, errors):
+            # 遍历服务器
+            for server in self._list_subdirs(region.path, errors):
+                # 遍历角色
+                for role in self._list_subdirs(server.path, errors):
+                    roles.append(RoleInfo(
+                        account=account.name,
+                        region=region.name,
+                        server=server.name,
+                        role=role.name,
+                        path=role.path
+                    ))
+
+        return roles, errors
+
+    @staticmethod
+    def _list_subdirs(path, errors: List[dict]) -> List[os.DirEntry]:
+        """
+        列出子目录
+
+        DirEntry 自带文件类型信息，判断是否为目录不需要额外的 stat 调用。
+        目录无法读取时记录错误并返回空列表，不影响其他目录的扫描。
+        复制过程中的临时目录会被跳过。
+        """
+        try:
+            with os.scandir(path) as it:
+                return [entry for entry in it if entry.is_dir() and not is_temp_name(entry.name)]
+        except OSError as e:
+            errors.append({'path': str(path), 'error': str(e)})
+            return []
+
+    def get_roles(self) -> List[RoleInfo]:
+        """
+        获取角色列表
+
+        使用索引时直接返回索引内容，只在本次运行尚未校验过索引时扫描一次
+
+        Returns:
+            角色信息列表
+        """
+        if self.index and self._index_ready:
+            return self.index.roles()
+        return self.scan_all_roles()
+
+    def get_accounts(self, roles: List[RoleInfo] = None) -> List[str]:
+        """获取所有账号，不传 roles 时从索引读取"""
+        if roles is None:
+            roles = self.get_roles()
         return sorted(set(role.account for role in roles))
 
-    def get_regions(self, roles: List[RoleInfo]) -> List[str]:
-        """获取所有大区"""
+    def get_regions(self, roles: List[RoleInfo] = None) -> List[str]:
+        """获取所有大区，不传 roles 时从索引读取"""
+        if roles is None:
+            roles = self.get_roles()
         return sorted(set(role.region for role in roles))
 
-    def get_servers(self, roles: List[RoleInfo]) -> List[str]:
-        """获取所有服务器"""
+    def get_servers(self, roles: List[RoleInfo] = None) -> List[str]:
+        """获取所有服务器，不传 roles 时从索引读取"""
+        if roles is None:
+            roles = self.get_roles()
         return sorted(set(role.server for role in roles))
 
-    def filter_roles(self, roles: List[RoleInfo], account: str = None,
+    def filter_roles(self, roles: List[RoleInfo] = None, account: str = None,
                      region: str = None, server: str = None) -> List[RoleInfo]:
         """
         过滤角色
 
         Args:
-            roles: 角色列表
+            roles: 角色列表，为 None 时直接沿索引树查找
             account: 账号过滤
             region: 大区过滤
             server: 服务器过滤
@@ -97,6 +181,13 @@ class RoleScanner:
         Returns:
             过滤后的角色列表
         """
+        if roles is None:
+            if self.index:
+                if not self._index_ready:
+                    self.scan_all_roles()
+                return self.index.filter(account, region, server)
+            roles = self.scan_all_roles()
+
         filtered = roles
 
         if account:
@@ -107,3 +198,36 @@ class RoleScanner:
             filtered = [r for r in filtered if r.server == server]
 
         return filtered
+
+    def query_roles(self, q: str = '', account: str = None, region: str = None, server: str = None,
+                    match: str = MATCH_FUZZY, sort: str = None, order: str = 'asc',
+                    offset: int = 0, limit: int = 50) -> dict:
+        """
+        查询角色，参数见 RoleQuery.search
+
+        查询索引在角色列表变化时重建；使用角色索引时角色列表不变则复用。
+
+        Returns:
+            {'total': int, 'roles': [RoleInfo], 'offset': int, 'limit': int}
+        """
+        roles = self.get_roles()
+        with self._query_lock:
+            if self._query is None or self._query.roles is not roles:
+                self._query = RoleQuery(roles)
+            engine = self._query
+
+        return engine.search(q, account, region, server, match, sort, order, offset, limit)
+
+    def hash_role(self, role: RoleInfo) -> Dict[str, str]:
+        """
+        计算角色目录中所有文件的内容哈希
+
+        未变化的文件直接取哈希缓存，再次计算只需要 stat。
+
+        Returns:
+            {相对路径（posix）: 哈希}
+        """
+        root = Path(role.path)
+        files, _ = scan_tree(root)
+        return {rel: self.hash_cache.hash_file(root / rel, entry)
+                for rel, entry in sorted(files.items())}
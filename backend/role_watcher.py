@@ -0,0 +1,345 @@
+"""
+角色目录监视模块
+监视 userdata 目录结构变化，增量更新角色索引并推送变化事件
+"""
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+from collections import defaultdict
+from typing import List, Optional, Set, Tuple
+
+from .models import RoleInfo
+from .role_scanner import RoleScanner
+
+
+class _Inotify:
+    """Linux inotify 的最小封装"""
+
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+                  | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失败')
+
+    def add_watch(self, path: str) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch 失败: {path}')
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """
+        读取事件
+
+        Returns:
+            [(wd, mask, name)]，超时返回空列表
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class RoleWatcher:
+    """
+    角色目录监视器
+
+    Linux 上使用 inotify 监视 userdata 到服务器这几层目录，只重新校验发生变化的目录；
+    其他平台定时校验角色索引（只比较目录修改时间）。
+    角色增删改名时向所有订阅者推送事件：
+        {'type': 'role_added', 'role': dict}
+        {'type': 'role_removed', 'role': dict}
+        {'type': 'role_renamed', 'role': dict, 'old_role': dict}
+        {'type': 'resync'}  事件积压时要求客户端重新获取完整列表
+    """
+
+    BACKEND_INOTIFY = 'inotify'
+    BACKEND_POLLING = 'polling'
+
+    # 收到事件后等待一小段时间，合并同一批次的目录变化
+    DEBOUNCE_SECONDS = 0.1
+    SUBSCRIBER_QUEUE_SIZE = 1000
+
+    def __init__(self, scanner: RoleScanner, poll_interval: float = 2.0):
+        """
+        初始化监视器
+
+        Args:
+            scanner: 使用角色索引的扫描器
+            poll_interval: 轮询模式下的校验间隔（秒）
+        """
+        if scanner.index is None:
+            raise ValueError('目录监视需要启用角色索引')
+
+        self.scanner = scanner
+        self.index = scanner.index
+        self.userdata_path = scanner.userdata_path
+        self.poll_interval = poll_interval
+        self.backend = self.BACKEND_INOTIFY if sys.platform.startswith('linux') else self.BACKEND_POLLING
+
+        self._subscribers: List[queue.Queue] = []
+        self._subscribers_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify: Optional[_Inotify] = None
+        self._watches = {}
+        # 启动时的索引校验已完成
+        self.ready = threading.Event()
+
+    def start(self, revalidate: bool = True):
+        """
+        启动监视线程
+
+        Args:
+            revalidate: 为 True 时先校验索引再返回；为 False 时立即返回，由监视线程
+                在后台校验，与磁盘不一致的角色作为变化事件推送，完成后设置 ready
+        """
+        if self._thread and self._thread.is_alive():
+            return
+
+        self.ready.clear()
+        if revalidate:
+            # 先让索引与磁盘一致，避免启动时把所有角色当作新增推送
+            self.scanner.scan_all_roles()
+            self.ready.set()
+        self.index.add_listener(self._on_roles_changed)
+
+        if self.backend == self.BACKEND_INOTIFY:
+            try:
+                self._inotify = _Inotify()
+                self._sync_watches()
+            except (OSError, AttributeError) as e:
+                print(f"inotify 不可用，改用轮询: {e}")
+                self._close_inotify()
+                self.backend = self.BACKEND_POLLING
+
+        self._stop_event.clear()
+        target = self._run_inotify if self.backend == self.BACKEND_INOTIFY else self._run_polling
+        self._thread = threading.Thread(target=target, name='role-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监视线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.index.remove_listener(self._on_roles_changed)
+        self._close_inotify()
+
+    def subscribe(self) -> queue.Queue:
+        """订阅角色变化事件"""
+        q = queue.Queue(maxsize=self.SUBSCRIBER_QUEUE_SIZE)
+        with self._subscribers_lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        """取消订阅"""
+        with self._subscribers_lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def _publish(self, event: dict):
+        """向所有订阅者推送事件"""
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # 客户端处理不过来时丢弃积压的事件，让它重新获取完整列表
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait({'type': 'resync'})
+
+    def _on_roles_changed(self, added: List[RoleInfo], removed: List[RoleInfo]):
+        """角色索引变化回调，同一服务器下一删一增视为改名"""
+        added_by_server = defaultdict(list)
+        removed_by_server = defaultdict(list)
+        for role in added:
+            added_by_server[(role.account, role.region, role.server)].append(role)
+        for role in removed:
+            removed_by_server[(role.account, role.region, role.server)].append(role)
+
+        for key in set(added_by_server) | set(removed_by_server):
+            server_added = added_by_server.get(key, [])
+            server_removed = removed_by_server.get(key, [])
+            if len(server_added) == 1 and len(server_removed) == 1:
+                self._publish({
+                    'type': 'role_renamed',
+                    'role': server_added[0].to_dict(),
+                    'old_role': server_removed[0].to_dict()
+                })
+                continue
+            for role in server_removed:
+                self._publish({'type': 'role_removed', 'role': role.to_dict()})
+            for role in server_added:
+                self._publish({'type': 'role_added', 'role': role.to_dict()})
+
+    def _initial_revalidate(self):
+        """启动时未校验索引的，在监视线程中校验一次"""
+        if self.ready.is_set():
+            return
+        try:
+            self.scanner.scan_all_roles()
+            self._sync_watches()
+        except Exception as e:
+            print(f"校验角色索引失败: {e}")
+        finally:
+            self.ready.set()
+
+    def _run_polling(self):
+        """轮询模式：定时校验整个索引"""
+        self._initial_revalidate()
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                if self.index.refresh():
+                    self.index.save()
+            except Exception as e:
+                print(f"校验角色索引失败: {e}")
+
+    def _run_inotify(self):
+        """inotify 模式：只校验发生变化的目录"""
+        self._initial_revalidate()
+        while not self._stop_event.is_set():
+            try:
+                events = self._inotify.read_events(timeout=0.5)
+                if not events:
+                    continue
+
+                # 合并短时间内的连续事件
+                self._stop_event.wait(self.DEBOUNCE_SECONDS)
+                events.extend(self._inotify.read_events(timeout=0))
+
+                changed = self._changed_dirs(events)
+                if changed is None:
+                    relisted = self.index.refresh()
+                else:
+                    relisted = sum(self.index.refresh_subtree(parts) for parts in changed)
+
+                if relisted:
+                    self.index.save()
+                    self._sync_watches()
+            except Exception as e:
+                if self._stop_event.is_set():
+                    break
+                print(f"处理目录变化失败: {e}")
+
+    def _changed_dirs(self, events: List[Tuple[int, int, str]]) -> Optional[Set[tuple]]:
+        """
+        根据 inotify 事件找出需要重新校验的目录
+
+        Returns:
+            相对 userdata 的目录集合（各级名称元组），事件队列溢出时返回 None 表示需要完整校验
+        """
+        changed = set()
+        for wd, mask, name in events:
+            if mask & _Inotify.IN_Q_OVERFLOW:
+                return None
+            if mask & _Inotify.IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            parts = self._watches.get(wd)
+            if parts is None:
+                continue
+
+            if mask & (_Inotify.IN_DELETE_SELF | _Inotify.IN_MOVE_SELF):
+                # 被监视的目录自身被删除或移动，由上级目录重新校验；
+                # 移动后监视仍跟随原目录，需要移除，校验后按新路径重新添加
+                self._watches.pop(wd, None)
+                if mask & _Inotify.IN_MOVE_SELF:
+                    self._inotify.rm_watch(wd)
+                if parts:
+                    changed.add(parts[:-1])
+            elif mask & _Inotify.IN_ISDIR:
+                changed.add(parts)
+
+        # 上级目录已在集合中时不必再单独校验子目录
+        return {parts for parts in changed
+                if not any(parts[:i] in changed for i in range(len(parts)))}
+
+    def _sync_watches(self):
+        """为索引中 userdata 到服务器层的目录添加监视"""
+        if not self._inotify:
+            return
+
+        watched = set(self._watches.values())
+        for parts in self._index_dirs():
+            if parts in watched:
+                continue
+            try:
+                wd = self._inotify.add_watch(str(self.userdata_path.joinpath(*parts)))
+                self._watches[wd] = parts
+            except OSError as e:
+                # 目录可能刚被删除，下次事件会再同步
+                print(f"监视目录失败: {e}")
+
+    def _index_dirs(self) -> List[tuple]:
+        """索引中需要监视的目录（各级名称元组）"""
+        dirs = []
+        tree = self.index.tree
+        if tree is None:
+            return dirs
+
+        stack = [((), tree)]
+        while stack:
+            parts, node = stack.pop()
+            dirs.append(parts)
+            if len(parts) < self.index.DEPTH:
+                for name, child in list(node['children'].items()):
+                    if child is not None:
+                        stack.append((parts + (name,), child))
+        return dirs
+
+    def _close_inotify(self):
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+        self._watches.clear()
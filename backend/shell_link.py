@@ -0,0 +1,223 @@
+"""
+快捷方式解析模块
+直接读取 Windows 快捷方式（.lnk，MS-SHLLINK 二进制格式）中的目标路径，
+不依赖 COM，任何平台都可以解析
+"""
+import locale
+import os
+import re
+import struct
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+# ShellLinkHeader
+HEADER_SIZE = 0x4C
+LINK_CLSID = bytes.fromhex('0114020000000000c000000000000046')
+
+# LinkFlags
+HAS_LINK_TARGET_ID_LIST = 0x00000001
+HAS_LINK_INFO = 0x00000002
+HAS_NAME = 0x00000004
+HAS_RELATIVE_PATH = 0x00000008
+HAS_WORKING_DIR = 0x00000010
+HAS_ARGUMENTS = 0x00000020
+HAS_ICON_LOCATION = 0x00000040
+IS_UNICODE = 0x00000080
+FORCE_NO_LINK_INFO = 0x00000100
+HAS_EXP_STRING = 0x00000200
+
+# LinkInfoFlags
+VOLUME_ID_AND_LOCAL_BASE_PATH = 0x1
+COMMON_NETWORK_RELATIVE_LINK_AND_PATH_SUFFIX = 0x2
+# LinkInfoHeaderSize 不小于该值时包含 Unicode 路径的偏移
+LINK_INFO_UNICODE_HEADER_SIZE = 0x24
+
+# ExtraData
+ENVIRONMENT_VARIABLE_BLOCK = 0xA0000001
+ENVIRONMENT_VARIABLE_BLOCK_SIZE = 0x314
+ENVIRONMENT_ANSI_SIZE = 260
+
+# 未提供 Unicode 版本时，字符串按系统的 ANSI 代码页解码
+ANSI_ENCODING = 'mbcs' if sys.platform == 'win32' else locale.getpreferredencoding(False)
+
+_ENV_VAR = re.compile(r'%([^%]+)%')
+
+
+class ShellLinkError(ValueError):
+    """不是有效的快捷方式文件"""
+
+
+@dataclass
+class ShellLink:
+    """快捷方式中与路径有关的字段，没有的字段为 None"""
+    local_base_path: Optional[str] = None
+    network_path: Optional[str] = None
+    name: Optional[str] = None
+    relative_path: Optional[str] = None
+    working_dir: Optional[str] = None
+    arguments: Optional[str] = None
+    icon_location: Optional[str] = None
+    # 环境变量数据块中的目标路径（如 %ProgramFiles%\...），未展开
+    env_target: Optional[str] = None
+
+    def target_path(self, lnk_path: str = None) -> Optional[str]:
+        """
+        按 Windows 外壳的顺序确定目标路径
+
+        环境变量路径能完整展开时优先使用，其次是 LinkInfo 中的本地路径和网络路径，
+        最后是相对于快捷方式所在目录的相对路径
+
+        Args:
+            lnk_path: 快捷方式文件路径，用于解析相对路径
+
+        Returns:
+            目标路径，无法确定时返回 None（只有 IDList 的快捷方式）
+        """
+        if self.env_target:
+            expanded = expand_environment(self.env_target)
+            if '%' not in expanded:
+                return expanded
+        if self.local_base_path:
+            return self.local_base_path
+        if self.network_path:
+            return self.network_path
+        if self.relative_path and lnk_path:
+            # 快捷方式中的相对路径使用 Windows 分隔符
+            relative = self.relative_path.replace('\\', os.sep)
+            return os.path.normpath(os.path.join(os.path.dirname(lnk_path), relative))
+        return None
+
+
+def expand_environment(value: str) -> str:
+    """展开 Windows 风格的 %变量%，变量名不区分大小写，未定义的变量保持原样"""
+    environ = {key.upper(): item for key, item in os.environ.items()}
+    return _ENV_VAR.sub(lambda m: environ.get(m.group(1).upper(), m.group(0)), value)
+
+
+def _read_cstring(data: bytes, offset: int, unicode: bool) -> str:
+    """读取以空字符结尾的字符串"""
+    if unicode:
+        end = data.find(b'\0\0', offset)
+        # 结束符必须在字符边界上，奇数位置的两个零字节跨越了两个字符
+        while end >= 0 and (end - offset) % 2:
+            end = data.find(b'\0\0', end + 1)
+        if end < 0:
+            end = len(data) - (len(data) - offset) % 2
+        return data[offset:end].decode('utf-16-le', errors='replace')
+    end = data.find(b'\0', offset)
+    if end < 0:
+        end = len(data)
+    return data[offset:end].decode(ANSI_ENCODING, errors='replace')
+
+
+def _unpack(fmt: str, data: bytes, offset: int) -> tuple:
+    try:
+        return struct.unpack_from(fmt, data, offset)
+    except struct.error:
+        raise ShellLinkError('快捷方式文件不完整')
+
+
+def _parse_link_info(data: bytes, link: ShellLink):
+    """LinkInfo：本地路径 = LocalBasePath + CommonPathSuffix，网络路径 = NetName\\CommonPathSuffix"""
+    size, header_size, flags, _, local_offset, network_offset, suffix_offset = _unpack('<7I', data, 0)
+    if size > len(data) or header_size > size:
+        raise ShellLinkError('LinkInfo 长度无效')
+
+    local_unicode_offset = suffix_unicode_offset = 0
+    if header_size >= LINK_INFO_UNICODE_HEADER_SIZE:
+        local_unicode_offset, suffix_unicode_offset = _unpack('<2I', data, 28)
+
+    if suffix_unicode_offset:
+        suffix = _read_cstring(data, suffix_unicode_offset, True)
+    elif suffix_offset:
+        suffix = _read_cstring(data, suffix_offset, False)
+    else:
+        suffix = ''
+
+    if flags & VOLUME_ID_AND_LOCAL_BASE_PATH:
+        if local_unicode_offset:
+            base = _read_cstring(data, local_unicode_offset, True)
+        else:
+            base = _read_cstring(data, local_offset, False)
+        if base:
+            link.local_base_path = base + suffix
+
+    if flags & COMMON_NETWORK_RELATIVE_LINK_AND_PATH_SUFFIX and network_offset:
+        net_name_offset, = _unpack('<I', data, network_offset + 8)
+        net_name = None
+        if net_name_offset > 0x14:
+            net_name_unicode_offset, = _unpack('<I', data, network_offset + 0x14)
+            if net_name_unicode_offset:
+                net_name = _read_cstring(data, network_offset + net_name_unicode_offset, True)
+        if net_name is None:
+            net_name = _read_cstring(data, network_offset + net_name_offset, False)
+        if net_name:
+            link.network_path = net_name + ('\\' + suffix if suffix else '')
+
+
+def parse_shell_link(data: bytes) -> ShellLink:
+    """
+    解析快捷方式文件内容
+
+    Raises:
+        ShellLinkError: 不是有效的快捷方式文件
+    """
+    if len(data) < HEADER_SIZE or _unpack('<I', data, 0)[0] != HEADER_SIZE or data[4:20] != LINK_CLSID:
+        raise ShellLinkError('不是有效的快捷方式文件')
+
+    flags, = _unpack('<I', data, 20)
+    link = ShellLink()
+    offset = HEADER_SIZE
+
+    if flags & HAS_LINK_TARGET_ID_LIST:
+        id_list_size, = _unpack('<H', data, offset)
+        offset += 2 + id_list_size
+
+    if flags & HAS_LINK_INFO:
+        link_info_size, = _unpack('<I', data, offset)
+        if not flags & FORCE_NO_LINK_INFO:
+            _parse_link_info(data[offset:offset + link_info_size], link)
+        offset += link_info_size
+
+    # StringData，按固定顺序出现
+    unicode = bool(flags & IS_UNICODE)
+    for flag, field in ((HAS_NAME, 'name'), (HAS_RELATIVE_PATH, 'relative_path'),
+                        (HAS_WORKING_DIR, 'working_dir'), (HAS_ARGUMENTS, 'arguments'),
+                        (HAS_ICON_LOCATION, 'icon_location')):
+        if not flags & flag:
+            continue
+        count, = _unpack('<H', data, offset)
+        offset += 2
+        length = count * 2 if unicode else count
+        if offset + length > len(data):
+            raise ShellLinkError('快捷方式文件不完整')
+        raw = data[offset:offset + length]
+        setattr(link, field, raw.decode('utf-16-le' if unicode else ANSI_ENCODING, errors='replace'))
+        offset += length
+
+    # ExtraData 由若干数据块组成，大小小于 4 的终止块表示结束；只读取环境变量数据块
+    while flags & HAS_EXP_STRING and offset + 8 <= len(data):
+        block_size, signature = _unpack('<2I', data, offset)
+        if block_size < 8:
+            break
+        if signature == ENVIRONMENT_VARIABLE_BLOCK and block_size >= ENVIRONMENT_VARIABLE_BLOCK_SIZE:
+            block = data[offset + 8:offset + block_size]
+            target = _read_cstring(block, ENVIRONMENT_ANSI_SIZE, True)
+            link.env_target = target or _read_cstring(block[:ENVIRONMENT_ANSI_SIZE], 0, False) or None
+            break
+        offset += block_size
+
+    return link
+
+
+def read_shell_link(path: str) -> ShellLink:
+    """
+    读取并解析快捷方式文件
+
+    Raises:
+        OSError: 无法读取文件
+        ShellLinkError: 不是有效的快捷方式文件
+    """
+    with open(path, 'rb') as f:
+        return parse_shell_link(f.read())
@@ -0,0 +1,127 @@
+"""
+源目录快照模块
+一次性遍历并读取源角色目录，供多个目标并发写入
+"""
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+from .file_cloner import MECHANISM_COPY, MECHANISM_REFLINK, STRATEGY_COPY, try_reflink
+from .sync_profile import SyncProfile
+from .tree_diff import FileEntry, scan_tree
+
+
+class SourceSnapshot:
+    """
+    源角色目录快照
+
+    小文件直接读入内存，大文件使用只读内存映射，
+    所有目标共享同一份数据，源目录只读取一次。
+    目标支持 reflink 时直接共享数据块，此时不读取文件内容。
+    """
+
+    MMAP_THRESHOLD = 1024 * 1024
+
+    def __init__(self, root: str, profile: SyncProfile = None):
+        """
+        初始化快照
+
+        Args:
+            root: 源角色目录
+            profile: 同步方案，指定时只包含匹配的文件及其上级目录
+        """
+        self.root = Path(root)
+        self.profile = profile
+        self.files: Dict[str, FileEntry] = {}
+        self.dirs: List[str] = []
+        self.total_bytes = 0
+        self._data = {}
+        self._handles = []
+        self._lock = threading.Lock()
+
+    def load(self, read_data: bool = True,
+             tree: Tuple[Dict[str, FileEntry], Set[str]] = None) -> 'SourceSnapshot':
+        """
+        遍历源目录
+
+        Args:
+            read_data: 是否立即读取文件内容，为 False 时首次写入文件时再读取
+            tree: 已扫描的源目录 (文件字典, 目录集合)，提供时不再遍历
+        """
+        files, dirs = tree or scan_tree(self.root)
+        if self.profile:
+            files, dirs = self.profile.filter_tree(files)
+        self.files = files
+        # 按深度排序，保证父目录先于子目录创建
+        self.dirs = sorted(dirs, key=lambda d: (d.count('/'), d))
+        self.total_bytes = sum(entry.size for entry in files.values())
+
+        if read_data:
+            for rel in files:
+                self._get_data(rel)
+
+        return self
+
+    def _get_data(self, rel: str):
+        """获取文件内容，尚未读取时读取一次"""
+        data = self._data.get(rel)
+        if data is not None:
+            return data
+
+        with self._lock:
+            data = self._data.get(rel)
+            if data is not None:
+                return data
+
+            path = self.root / rel
+            if self.files[rel].size >= self.MMAP_THRESHOLD:
+                f = open(path, 'rb')
+                self._handles.append(f)
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._handles.append(data)
+            else:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            self._data[rel] = data
+            return data
+
+    def write_file(self, rel: str, target: Path, strategy: str = STRATEGY_COPY) -> str:
+        """
+        将快照中的文件写入目标路径，并保留修改时间
+
+        Args:
+            rel: 相对路径
+            target: 目标文件路径
+            strategy: 克隆策略，非 copy 时先尝试 reflink
+
+        Returns:
+            实际使用的机制
+        """
+        # 先删除已有文件而不是原地覆盖，避免改写与备份共享数据的硬链接
+        if target.is_file() or target.is_symlink():
+            target.unlink()
+
+        if strategy != STRATEGY_COPY and try_reflink(self.root / rel, target):
+            return MECHANISM_REFLINK
+
+        with open(target, 'wb') as f:
+            f.write(self._get_data(rel))
+        mtime_ns = self.files[rel].mtime_ns
+        os.utime(target, ns=(mtime_ns, mtime_ns))
+        return MECHANISM_COPY
+
+    def close(self):
+        """释放内存映射和文件句柄"""
+        with self._lock:
+            for handle in reversed(self._handles):
+                handle.close()
+            self._handles.clear()
+            self._data.clear()
+
+    def __enter__(self):
+        return self.load()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,177 @@
+"""
+暂存替换模块
+先在目标旁边的临时目录中生成新内容，再用重命名替换目标目录，失败时回滚
+"""
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from .io_scheduler import PRIORITY_BACKGROUND, io_scheduler
+from .metrics import metrics
+
+# 临时目录名称中的标记，扫描角色时会忽略带有此标记的目录
+TEMP_MARKER = '.jx3sync-'
+STAGING_TAG = 'staging'
+OLD_TAG = 'old'
+
+
+def is_temp_name(name: str) -> bool:
+    """是否为暂存替换产生的临时目录"""
+    return TEMP_MARKER in name
+
+
+class StagedSwap:
+    """
+    目录暂存替换
+
+    用法：
+        swap = StagedSwap(target)
+        staging = swap.prepare()
+        ...在 staging 中生成完整的新目录...
+        swap.commit()        # 两次重命名完成替换，旧目录在后台删除
+        # 或 commit(discard_old=False) 保留旧目录，之后 rollback() 撤销或 discard_old() 删除
+
+    两次重命名之间目标路径短暂不存在；第二次重命名失败时把旧目录改回原名。
+    进程在两次重命名之间退出时，下次对同一目标执行 prepare() 会先恢复旧目录；
+    保留的旧目录同样会在下次对同一目标执行 prepare() 时删除。
+    """
+
+    def __init__(self, target: Path):
+        """
+        Args:
+            target: 要替换的目录，可以不存在
+        """
+        self.target = Path(target)
+        token = uuid.uuid4().hex[:8]
+        self.staging = self._sibling(STAGING_TAG, token)
+        self.old = self._sibling(OLD_TAG, token)
+        self._committed = False
+        self._had_target = False
+        # 替换完成的时间（time.monotonic()）
+        self.committed_at: Optional[float] = None
+
+    def _sibling(self, tag: str, token: str) -> Path:
+        return self.target.with_name(f"{self.target.name}{TEMP_MARKER}{tag}-{token}")
+
+    def prepare(self) -> Path:
+        """
+        清理同一目标上次中断留下的临时目录，并创建暂存目录
+
+        Returns:
+            暂存目录
+        """
+        self.recover(self.target)
+        self.target.parent.mkdir(parents=True, exist_ok=True)
+        self.staging.mkdir()
+        return self.staging
+
+    def commit(self, discard_old: bool = True):
+        """
+        用暂存目录替换目标目录
+
+        Args:
+            discard_old: 是否在后台删除旧目录；为 False 时保留，可调用 rollback() 恢复
+
+        Raises:
+            OSError: 重命名失败（如目标目录中有文件被占用），此时目标保持原样
+        """
+        had_target = self.target.exists()
+        if had_target:
+            os.rename(self.target, self.old)
+
+        try:
+            os.rename(self.staging, self.target)
+        except OSError:
+            if had_target:
+                os.rename(self.old, self.target)
+            raise
+
+        self._committed = True
+        self._had_target = had_target
+        self.committed_at = time.monotonic()
+        if discard_old and had_target:
+            self.discard_old()
+
+    def rollback(self):
+        """
+        撤销替换，恢复替换前的目标目录（commit 时 discard_old 为 False 才可用）
+
+        替换前目标不存在时删除替换出的目录。替换之后对目标的修改一并丢弃。
+
+        Raises:
+            RuntimeError: 没有可恢复的旧目录
+            OSError: 重命名失败（如目标目录中有文件被占用），此时目标保持原样
+        """
+        if not self._committed or (self._had_target and not self.old.exists()):
+            raise RuntimeError('没有可恢复的旧目录')
+
+        replaced = self.target.with_name(self.staging.name)
+        os.rename(self.target, replaced)
+        if self._had_target:
+            try:
+                os.rename(self.old, self.target)
+            except OSError:
+                os.rename(replaced, self.target)
+                raise
+        self._committed = False
+        self._remove_in_background(replaced)
+
+    def abort(self):
+        """放弃替换，删除暂存目录"""
+        if self.staging.exists():
+            shutil.rmtree(self.staging, ignore_errors=True)
+
+    def discard_old(self):
+        """在后台删除旧目录"""
+        if self.old.exists():
+            self._remove_in_background(self.old)
+
+    @staticmethod
+    def _remove_in_background(path: Path):
+        def remove():
+            # 旧目录已不再使用，按后台优先级删除，不影响正在进行的复制
+            with metrics.timer('delete'), \
+                    io_scheduler.slot(path, priority=PRIORITY_BACKGROUND, measure=False):
+                shutil.rmtree(path, ignore_errors=True)
+
+        thread = threading.Thread(target=remove, name='staged-swap-cleanup', daemon=True)
+        thread.start()
+
+    @staticmethod
+    def recover(target: Path) -> Optional[str]:
+        """
+        处理目标上次中断留下的临时目录
+
+        目标不存在而旧目录存在时（中断于两次重命名之间）恢复旧目录，
+        其余暂存目录和旧目录直接删除。
+
+        Returns:
+            恢复时返回说明，否则返回 None
+        """
+        target = Path(target)
+        parent = target.parent
+        if not parent.is_dir():
+            return None
+
+        prefix = f"{target.name}{TEMP_MARKER}"
+        leftovers = [entry for entry in os.scandir(parent)
+                     if entry.name.startswith(prefix) and entry.is_dir()]
+        if not leftovers:
+            return None
+
+        recovered = None
+        if not target.exists():
+            olds = sorted((e for e in leftovers if e.name[len(prefix):].startswith(OLD_TAG)),
+                          key=lambda e: e.stat().st_mtime_ns, reverse=True)
+            if olds:
+                os.rename(olds[0].path, target)
+                recovered = f"已恢复中断前的目录: {target}"
+                leftovers = [e for e in leftovers if e.path != olds[0].path]
+
+        for entry in leftovers:
+            shutil.rmtree(entry.path, ignore_errors=True)
+        return recovered
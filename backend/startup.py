@@ -0,0 +1,85 @@
+"""
+启动状态模块
+记录后端启动的各个阶段，供健康检查报告和请求等待
+"""
+import threading
+import time
+from typing import Optional
+
+# 启动阶段，按顺序推进
+STAGE_STARTING = 'starting'              # 服务尚未创建，只有健康检查可用
+STAGE_INDEX_LOADED = 'index_loaded'      # 已从磁盘加载保存的角色索引，可以列出角色
+STAGE_SERVICES_READY = 'services_ready'  # 备份管理器等服务已创建，所有接口可用
+STAGE_READY = 'ready'                    # 角色索引已与磁盘校验一致
+STAGES = (STAGE_STARTING, STAGE_INDEX_LOADED, STAGE_SERVICES_READY, STAGE_READY)
+
+
+class StartupState:
+    """
+    启动进度
+
+    阶段只能向前推进，跳过的阶段视为同时完成；启动失败时记录错误并直接进入 ready，
+    等待中的请求不会一直阻塞。
+    """
+
+    def __init__(self, started: float = None):
+        """
+        Args:
+            started: 计时起点（time.monotonic()），默认为创建时
+        """
+        self.started = time.monotonic() if started is None else started
+        self.stage = STAGE_STARTING
+        self.error: Optional[str] = None
+        # 阶段或时间点 -> 距离启动的毫秒数
+        self.timings = {STAGE_STARTING: self._elapsed_ms()}
+        self._cond = threading.Condition()
+
+    def _elapsed_ms(self) -> float:
+        return round((time.monotonic() - self.started) * 1000, 1)
+
+    def advance(self, stage: str):
+        """进入 stage，已经到达或超过时忽略"""
+        with self._cond:
+            current = STAGES.index(self.stage)
+            target = STAGES.index(stage)
+            if target <= current:
+                return
+            elapsed = self._elapsed_ms()
+            for skipped in STAGES[current + 1:target + 1]:
+                self.timings[skipped] = elapsed
+            self.stage = stage
+            self._cond.notify_all()
+
+    def mark(self, event: str):
+        """记录不属于阶段的时间点（如开始监听端口）"""
+        with self._cond:
+            self.timings[event] = self._elapsed_ms()
+
+    def fail(self, error: str):
+        """记录启动错误，结束启动"""
+        with self._cond:
+            self.error = error
+        self.advance(STAGE_READY)
+
+    def reached(self, stage: str) -> bool:
+        return STAGES.index(self.stage) >= STAGES.index(stage)
+
+    def wait(self, stage: str, timeout: float = None) -> bool:
+        """
+        等待到达 stage
+
+        Returns:
+            是否已到达
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.reached(stage), timeout)
+
+    def to_dict(self) -> dict:
+        with self._cond:
+            return {
+                'stage': self.stage,
+                'ready': self.stage == STAGE_READY,
+                'error': self.error,
+                'uptime_ms': self._elapsed_ms(),
+                'timings_ms': dict(self.timings)
+            }
@@ -0,0 +1,178 @@
+"""
+同步计划模块
+不写入任何文件，预先计算源角色到各目标的逐文件差异、传输字节数和预计耗时。
+计划保存了源目录和各目标的差异，可以直接执行而不必再次遍历目录。
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from .models import RoleInfo
+from .sync_profile import SyncProfile
+from .tree_diff import FileEntry, TreeDiff
+
+
+class ThroughputMeter:
+    """
+    磁盘写入速度估计
+
+    预计耗时 = 文件数 × 单文件开销 + 字节数 / 写入速度。
+    每次实际复制后用实测的字节数、文件数和耗时更新写入速度（指数移动平均），
+    尚无实测数据时使用默认值。
+    """
+
+    DEFAULT_BYTES_PER_SECOND = 100 * 1024 * 1024
+    FILE_OVERHEAD = 0.001
+    SMOOTHING = 0.3
+    # 太小的复制耗时主要是固定开销，不用于估计写入速度
+    MIN_SAMPLE_BYTES = 1024 * 1024
+
+    def __init__(self):
+        self.bytes_per_second = float(self.DEFAULT_BYTES_PER_SECOND)
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def record(self, bytes_done: int, files_done: int, seconds: float):
+        """记录一次实际复制"""
+        if bytes_done < self.MIN_SAMPLE_BYTES or seconds <= 0:
+            return
+        transfer = max(seconds - files_done * self.FILE_OVERHEAD, seconds * 0.1)
+        measured = bytes_done / transfer
+        with self._lock:
+            if self.samples:
+                self.bytes_per_second += self.SMOOTHING * (measured - self.bytes_per_second)
+            else:
+                self.bytes_per_second = measured
+            self.samples += 1
+
+    def estimate(self, bytes_total: int, files_total: int) -> float:
+        """估计写入耗时（秒）"""
+        return files_total * self.FILE_OVERHEAD + bytes_total / self.bytes_per_second
+
+    def to_dict(self) -> dict:
+        return {
+            'bytes_per_second': int(self.bytes_per_second),
+            'file_overhead': self.FILE_OVERHEAD,
+            'measured': self.samples > 0
+        }
+
+
+@dataclass
+class TargetPlan:
+    """单个目标的同步计划"""
+    target: RoleInfo
+    diff: Optional[TreeDiff] = None
+    bytes_to_copy: int = 0
+    bytes_to_delete: int = 0
+    estimated_seconds: float = 0.0
+    error: str = ''
+
+    def to_dict(self, include_files: bool = True) -> dict:
+        data = {
+            'target': self.target.to_dict(),
+            'error': self.error,
+            'bytes': self.bytes_to_copy,
+            'bytes_to_delete': self.bytes_to_delete,
+            'estimated_seconds': round(self.estimated_seconds, 3)
+        }
+        if self.diff is not None:
+            data['counts'] = {key: len(value) for key, value in self.diff.to_summary().items()}
+            if include_files:
+                data.update(self.diff.to_summary())
+        return data
+
+
+@dataclass
+class SyncPlan:
+    """
+    一次复制的同步计划
+
+    source_files/source_dirs 是计划时源目录的状态（已按同步方案筛选），
+    执行计划时直接使用，不再遍历源目录和目标目录。
+    """
+    source: RoleInfo
+    mode: str
+    use_hash: bool
+    profile: Optional[SyncProfile]
+    source_files: Dict[str, FileEntry]
+    source_dirs: Set[str]
+    targets: List[TargetPlan] = field(default_factory=list)
+    throughput: dict = field(default_factory=dict)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def bytes_to_copy(self) -> int:
+        return sum(t.bytes_to_copy for t in self.targets)
+
+    @property
+    def estimated_seconds(self) -> float:
+        return sum(t.estimated_seconds for t in self.targets)
+
+    def to_dict(self, include_files: bool = True) -> dict:
+        counts = {'added': 0, 'updated': 0, 'deleted': 0, 'skipped': 0}
+        for target in self.targets:
+            if target.diff is not None:
+                for key, value in target.diff.to_summary().items():
+                    counts[key] += len(value)
+
+        return {
+            'plan_id': self.id,
+            'created_at': self.created_at,
+            'source': self.source.to_dict(),
+            'mode': self.mode,
+            'use_hash': self.use_hash,
+            'profile': self.profile.to_dict() if self.profile else None,
+            'source_files': len(self.source_files),
+            'source_bytes': sum(entry.size for entry in self.source_files.values()),
+            'counts': counts,
+            'bytes': self.bytes_to_copy,
+            'estimated_seconds': round(self.estimated_seconds, 3),
+            'throughput': self.throughput,
+            'targets': [t.to_dict(include_files) for t in self.targets]
+        }
+
+
+class PlanStore:
+    """
+    保存待执行的同步计划
+
+    计划只反映生成时的目录状态，超过有效期后不再允许执行。
+    """
+
+    def __init__(self, ttl: float = 600, max_plans: int = 20):
+        """
+        Args:
+            ttl: 计划有效期（秒）
+            max_plans: 最多保存的计划数，超过时丢弃最早的计划
+        """
+        self.ttl = ttl
+        self.max_plans = max_plans
+        self._plans = OrderedDict()
+        self._lock = threading.RLock()
+
+    def add(self, plan: SyncPlan):
+        with self._lock:
+            self._plans[plan.id] = plan
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+
+    def get(self, plan_id: str) -> Optional[SyncPlan]:
+        """获取未过期的计划"""
+        with self._lock:
+            plan = self._plans.get(plan_id)
+            if plan and time.time() - plan.created_at > self.ttl:
+                del self._plans[plan_id]
+                plan = None
+            return plan
+
+    def pop(self, plan_id: str) -> Optional[SyncPlan]:
+        """取出计划，每个计划只能执行一次；同时取出同一计划时只有一方能得到"""
+        with self._lock:
+            plan = self.get(plan_id)
+            if plan:
+                del self._plans[plan_id]
+            return plan
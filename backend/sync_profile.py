@@ -0,0 +1,163 @@
+"""
+同步方案模块
+用 glob 规则选择角色目录中需要同步的文件，例如只同步界面布局或某个插件的设置
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
+
+
+def _translate(pattern: str) -> str:
+    """
+    将 glob 转换为正则表达式
+
+    *  匹配除 / 以外的任意字符
+    ** 匹配任意层目录（包括零层）
+    ?  匹配除 / 以外的单个字符
+    [] 字符集合
+    """
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            out.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            out.append('[^/]')
+            i += 1
+        elif pattern[i] == '[':
+            end = pattern.find(']', i + 2)
+            if end < 0:
+                out.append(re.escape('['))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            out.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+            i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(out)
+
+
+class _Rule:
+    """
+    单条 glob 规则，语义与 .gitignore 相近：
+
+    - 不含 / 的规则匹配任意层级的文件名或目录名，如 *.jx3dat、interface
+    - 含 / 的规则从角色目录开始匹配，如 userdata/macro.dat、interface/**/*.ini
+    - 以 / 结尾的规则只匹配目录，如 interface/
+    - 匹配到目录时，目录下的所有文件都算匹配
+    - 不区分大小写（游戏运行在 Windows 上）
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        text = pattern.strip().replace('\\', '/')
+        self.dir_only = text.endswith('/')
+        text = text.strip('/')
+        if not text:
+            raise ValueError(f'无效的规则: {pattern!r}')
+
+        anchored = '/' in text
+        regex = _translate(text)
+        if not anchored:
+            regex = '(?:.*/)?' + regex
+        self._regex = re.compile(regex + r'\Z', re.IGNORECASE | re.DOTALL)
+
+    def matches(self, rel: str) -> bool:
+        """rel 为文件的相对路径（posix）"""
+        if not self.dir_only and self._regex.match(rel):
+            return True
+        # 检查各级上级目录
+        pos = rel.rfind('/')
+        while pos > 0:
+            if self._regex.match(rel[:pos]):
+                return True
+            pos = rel.rfind('/', 0, pos)
+        return False
+
+
+@dataclass
+class SyncProfile:
+    """
+    同步方案
+
+    include 为空时选择所有文件；exclude 优先于 include。
+    """
+    name: str
+    include: List[str] = field(default_factory=list)
+    exclude: List[str] = field(default_factory=list)
+    description: str = ''
+
+    def __post_init__(self):
+        if not self.name:
+            raise ValueError('同步方案名称不能为空')
+        self._include = [_Rule(p) for p in self.include]
+        self._exclude = [_Rule(p) for p in self.exclude]
+
+    def matches(self, rel: str) -> bool:
+        """判断相对路径（posix）是否属于该方案"""
+        if self._include and not any(rule.matches(rel) for rule in self._include):
+            return False
+        return not any(rule.matches(rel) for rule in self._exclude)
+
+    def filter_files(self, files: Dict[str, object]) -> Dict[str, object]:
+        """筛选 {相对路径: 文件信息}"""
+        return {rel: entry for rel, entry in files.items() if self.matches(rel)}
+
+    def filter_tree(self, files: Dict[str, object], dirs: Set[str] = None) -> Tuple[Dict[str, object], Set[str]]:
+        """
+        筛选目录树
+
+        Returns:
+            (匹配的文件, 这些文件的所有上级目录)
+        """
+        selected = self.filter_files(files)
+        parents = set()
+        for rel in selected:
+            pos = rel.rfind('/')
+            while pos > 0 and rel[:pos] not in parents:
+                parents.add(rel[:pos])
+                pos = rel.rfind('/', 0, pos)
+        return selected, parents
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'include': list(self.include),
+            'exclude': list(self.exclude),
+            'description': self.description
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'SyncProfile':
+        """
+        从字典创建
+
+        Raises:
+            ValueError: 格式无效
+        """
+        if not isinstance(data, dict):
+            raise ValueError('同步方案格式无效')
+        include = data.get('include') or []
+        exclude = data.get('exclude') or []
+        if not isinstance(include, list) or not isinstance(exclude, list):
+            raise ValueError('同步方案的规则必须是字符串列表')
+        if not all(isinstance(p, str) for p in include + exclude):
+            raise ValueError('同步方案的规则必须是字符串')
+        return SyncProfile(
+            name=str(data.get('name', '')).strip(),
+            include=list(include),
+            exclude=list(exclude),
+            description=data.get('description', '')
+        )
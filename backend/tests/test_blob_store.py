@@ -0,0 +1,29 @@
+"""文件块存储测试"""
+from backend.blob_store import BlobStore
+
+
+def test_put_file_names_blob_by_written_content(tmp_path):
+    store = BlobStore(str(tmp_path / 'store'))
+    source = tmp_path / 'config.dat'
+    source.write_bytes(b'old')
+    stale = BlobStore.hash_file(source)
+    # 计算哈希之后文件被改写
+    source.write_bytes(b'new content')
+
+    digest, _ = store.put_file(source, digest=stale)
+    store.release([digest])
+    assert digest == BlobStore.hash_file(source)
+    assert store.blob_path(digest).read_bytes() == b'new content'
+    assert not store.has(stale)
+
+
+def test_clear_keeps_pinned_blobs(tmp_path):
+    store = BlobStore(str(tmp_path / 'store'))
+    (tmp_path / 'a').write_bytes(b'a')
+    (tmp_path / 'b').write_bytes(b'b')
+    pinned, _ = store.put_file(tmp_path / 'a')
+    released, _ = store.put_file(tmp_path / 'b')
+    store.release([released])
+
+    assert store.clear() == {'removed': 1, 'freed': 1}
+    assert store.has(pinned) and not store.has(released)
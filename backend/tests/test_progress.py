@@ -0,0 +1,40 @@
+"""进度汇报测试"""
+import threading
+
+from backend.job_manager import Job
+from backend.progress import ProgressReporter
+
+
+def test_out_of_order_reports_do_not_double_count():
+    job = Job('copy')
+    job.report(0, 1, '', 6, 600, operation='copy')
+    job.report(0, 1, '', 5, 500, operation='copy')
+    assert (job.files_done, job.bytes_done) == (6, 600)
+
+
+def test_operations_in_one_job_accumulate():
+    job = Job('copy')
+    backup = ProgressReporter(job.report, 2)
+    backup.file_done(100)
+    backup.file_done(100)
+    copy = ProgressReporter(job.report, 1)
+    copy.file_done(50)
+    assert (job.files_done, job.bytes_done) == (3, 250)
+
+
+def test_parallel_writers_report_exact_totals():
+    job = Job('copy')
+    reporter = ProgressReporter(job.report, 4)
+    per_thread = 5000
+
+    def write():
+        for _ in range(per_thread):
+            reporter.file_done(10)
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert job.files_done == 4 * per_thread
+    assert job.bytes_done == 4 * per_thread * 10
@@ -0,0 +1,81 @@
+"""角色锁测试"""
+import threading
+import time
+
+import pytest
+
+from backend.role_locks import RoleBusy, RoleLocks
+
+# 等待线程进入等待状态的时间（秒）
+SETTLE = 0.1
+
+
+def acquire_in_thread(locks: RoleLocks, results: dict, name: str, **kwargs) -> threading.Thread:
+    """在线程中获取锁，获得后立即释放，结果记录在 results[name]"""
+    def run():
+        try:
+            with locks.acquire(owner=name, **kwargs):
+                results[name] = 'ok'
+        except RoleBusy:
+            results[name] = 'busy'
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_write_conflict_fails_without_waiting():
+    locks = RoleLocks()
+    with locks.acquire(writes=['X'], owner='holder'):
+        with pytest.raises(RoleBusy) as e:
+            locks.acquire(writes=['X'], timeout=0)
+        assert e.value.owner == 'holder'
+        # 不同角色可以并行
+        locks.acquire(writes=['Y'], timeout=0).release()
+
+
+def test_crossed_copies_waiting_behind_holder_do_not_deadlock():
+    """复制 Y->X 与复制 X->Y 都在等待 X 的持有者时，释放后两者都能完成"""
+    locks = RoleLocks()
+    results = {}
+    holder = locks.acquire(writes=['X'], owner='holder')
+
+    first = acquire_in_thread(locks, results, 'Y->X', reads=['Y'], writes=['X'], timeout=5)
+    time.sleep(SETTLE)
+    second = acquire_in_thread(locks, results, 'X->Y', reads=['X'], writes=['Y'], timeout=5)
+    time.sleep(SETTLE)
+    assert results == {}
+
+    holder.release()
+    first.join(10)
+    second.join(10)
+    assert results == {'Y->X': 'ok', 'X->Y': 'ok'}
+
+
+def test_waiting_writer_blocks_later_readers():
+    """有写入在等待的角色不接受之后到达的读锁"""
+    locks = RoleLocks()
+    results = {}
+    reader = locks.acquire(reads=['X'], owner='reader')
+
+    writer = acquire_in_thread(locks, results, 'writer', writes=['X'], timeout=5)
+    time.sleep(SETTLE)
+    with pytest.raises(RoleBusy):
+        locks.acquire(reads=['X'], timeout=0)
+    assert locks.conflict(reads=['X']) == ''
+
+    reader.release()
+    writer.join(10)
+    assert results == {'writer': 'ok'}
+    locks.acquire(reads=['X'], timeout=0).release()
+
+
+def test_acquire_all_waits_for_running_operations():
+    locks = RoleLocks()
+    lease = locks.acquire(writes=['X'], owner='backup')
+    with pytest.raises(RoleBusy):
+        locks.acquire_all('clear', timeout=0)
+    lease.release()
+    with locks.acquire_all('clear', timeout=0):
+        with pytest.raises(RoleBusy):
+            locks.acquire(writes=['Y'], timeout=0)
@@ -0,0 +1,180 @@
+"""快捷方式解析测试"""
+import os
+import struct
+
+import pytest
+
+from backend import shell_link
+from backend.benchmarks.userdata_generator import build_shortcut
+from backend.path_resolver import PathResolver
+from backend.shell_link import ShellLinkError, parse_shell_link, read_shell_link
+
+# LinkInfoHeaderSize 不含 Unicode 偏移时的大小
+LINK_INFO_ANSI_HEADER_SIZE = 0x1C
+# CommonNetworkRelativeLink 含 Unicode 偏移时的头部大小
+NETWORK_UNICODE_HEADER_SIZE = 0x1C
+
+
+def ansi_z(value: str) -> bytes:
+    return value.encode('ascii') + b'\0'
+
+
+def unicode_z(value: str) -> bytes:
+    return value.encode('utf-16-le') + b'\0\0'
+
+
+def counted(value: str) -> bytes:
+    return struct.pack('<H', len(value)) + value.encode('utf-16-le')
+
+
+def link_header(flags: int) -> bytes:
+    return struct.pack('<I16sIIqqqIIIHHII', shell_link.HEADER_SIZE, shell_link.LINK_CLSID,
+                       flags | shell_link.IS_UNICODE, 0x20, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0)
+
+
+def link_info(local_base: str = None, suffix: str = '', net_name: str = None,
+              unicode: bool = False, ansi_local_base: str = None) -> bytes:
+    """
+    生成 LinkInfo
+
+    Args:
+        local_base: 本地路径 LocalBasePath
+        suffix: CommonPathSuffix
+        net_name: 网络路径 NetName，提供时写入 CommonNetworkRelativeLink
+        unicode: 是否写入 Unicode 版本的路径和偏移
+        ansi_local_base: ANSI 版本的 LocalBasePath，默认与 local_base 相同
+    """
+    header_size = shell_link.LINK_INFO_UNICODE_HEADER_SIZE if unicode else LINK_INFO_ANSI_HEADER_SIZE
+    flags = 0
+    body = b''
+    offsets = {'volume': 0, 'local': 0, 'network': 0, 'suffix': 0,
+               'local_unicode': 0, 'suffix_unicode': 0}
+
+    def append(name: str, data: bytes):
+        nonlocal body
+        offsets[name] = header_size + len(body)
+        body += data
+
+    if local_base is not None:
+        flags |= shell_link.VOLUME_ID_AND_LOCAL_BASE_PATH
+        # VolumeID：大小、驱动器类型（固定磁盘）、序列号、卷标偏移，卷标为空
+        append('volume', struct.pack('<IIII', 0x11, 3, 0, 0x10) + b'\0')
+        append('local', ansi_z(local_base if ansi_local_base is None else ansi_local_base))
+    if net_name is not None:
+        flags |= shell_link.COMMON_NETWORK_RELATIVE_LINK_AND_PATH_SUFFIX
+        if unicode:
+            network = struct.pack('<5I', 0, 0, NETWORK_UNICODE_HEADER_SIZE, 0, 0)
+            name_unicode_offset = NETWORK_UNICODE_HEADER_SIZE + len(ansi_z('?'))
+            network += struct.pack('<2I', name_unicode_offset, 0) + ansi_z('?') + unicode_z(net_name)
+        else:
+            network = struct.pack('<5I', 0, 0, 0x14, 0, 0) + ansi_z(net_name)
+        append('network', struct.pack('<I', len(network)) + network[4:])
+    append('suffix', ansi_z('?' * len(suffix) if unicode else suffix))
+    if unicode:
+        if local_base is not None:
+            append('local_unicode', unicode_z(local_base))
+        append('suffix_unicode', unicode_z(suffix))
+
+    fields = [header_size + len(body), header_size, flags, offsets['volume'], offsets['local'],
+              offsets['network'], offsets['suffix']]
+    if unicode:
+        fields += [offsets['local_unicode'], offsets['suffix_unicode']]
+    return struct.pack(f'<{len(fields)}I', *fields) + body
+
+
+def build_link(info: bytes = None, relative_path: str = None) -> bytes:
+    """生成只含 LinkInfo 和相对路径的快捷方式"""
+    flags = 0
+    data = b''
+    if info is not None:
+        flags |= shell_link.HAS_LINK_INFO
+        data += info
+    if relative_path is not None:
+        flags |= shell_link.HAS_RELATIVE_PATH
+        data += counted(relative_path)
+    return link_header(flags) + data + b'\0' * 4
+
+
+def test_local_base_path_with_suffix():
+    link = parse_shell_link(build_link(link_info('C:\\SeasunGame\\', 'Game\\SeasunGame.exe')))
+    assert link.local_base_path == 'C:\\SeasunGame\\Game\\SeasunGame.exe'
+    assert link.network_path is None
+    assert link.target_path() == 'C:\\SeasunGame\\Game\\SeasunGame.exe'
+
+
+def test_unicode_offsets_take_precedence_over_ansi():
+    # 'a' 之后的 'Ā'（0x0100）使两个零字节出现在奇数位置，不能当作结束符
+    data = build_link(link_info('D:\\剑网三\\', 'a\u0100\\SeasunGame.exe', unicode=True,
+                                ansi_local_base='D:\\???\\'))
+    link = parse_shell_link(data)
+    assert link.local_base_path == 'D:\\剑网三\\a\u0100\\SeasunGame.exe'
+
+
+@pytest.mark.parametrize('unicode', [False, True])
+def test_network_path(unicode):
+    data = build_link(link_info(net_name='\\\\nas\\games', suffix='JX3\\SeasunGame.exe', unicode=unicode))
+    link = parse_shell_link(data)
+    assert link.local_base_path is None
+    assert link.network_path == '\\\\nas\\games\\JX3\\SeasunGame.exe'
+    assert link.target_path() == link.network_path
+
+
+def test_network_path_without_suffix():
+    link = parse_shell_link(build_link(link_info(net_name='\\\\nas\\games')))
+    assert link.network_path == '\\\\nas\\games'
+
+
+def test_relative_path_only(tmp_path):
+    lnk = tmp_path / 'SeasunGame.lnk'
+    lnk.write_bytes(build_link(relative_path='..\\SeasunGame\\SeasunGame.exe'))
+
+    link = read_shell_link(str(lnk))
+    assert link.local_base_path is None and link.network_path is None
+    assert link.target_path() is None
+    assert link.target_path(str(lnk)) == os.path.normpath(
+        os.path.join(str(tmp_path), '..', 'SeasunGame', 'SeasunGame.exe'))
+
+
+def test_environment_block(monkeypatch):
+    data = build_shortcut('C:\\Fallback\\SeasunGame.exe', env_target='%JX3_TEST_ROOT%\\SeasunGame.exe')
+    link = parse_shell_link(data)
+    assert link.env_target == '%JX3_TEST_ROOT%\\SeasunGame.exe'
+
+    monkeypatch.setenv('JX3_TEST_ROOT', 'E:\\SeasunGame')
+    assert link.target_path() == 'E:\\SeasunGame\\SeasunGame.exe'
+
+    # 变量未定义时退回 LinkInfo 中的本地路径
+    monkeypatch.delenv('JX3_TEST_ROOT')
+    assert link.target_path() == 'C:\\Fallback\\SeasunGame.exe'
+
+
+def test_not_a_shell_link():
+    with pytest.raises(ShellLinkError):
+        parse_shell_link(b'MZ' + b'\0' * 100)
+
+
+def test_truncated_input():
+    data = build_shortcut('C:\\SeasunGame\\SeasunGame.exe', relative_path='.\\SeasunGame.exe',
+                          working_dir='C:\\SeasunGame', env_target='%ProgramFiles%\\SeasunGame.exe')
+    with pytest.raises(ShellLinkError):
+        parse_shell_link(data[:shell_link.HEADER_SIZE - 1])
+    # StringData 被截断
+    with pytest.raises(ShellLinkError):
+        parse_shell_link(data[:data.index('.\\SeasunGame.exe'.encode('utf-16-le')) + 4])
+
+    # 任意位置截断都只会抛出 ShellLinkError 或得到部分结果
+    for end in range(len(data)):
+        try:
+            parse_shell_link(data[:end])
+        except ShellLinkError:
+            pass
+
+
+def test_parse_shortcut_caches_until_file_changes(tmp_path):
+    lnk = tmp_path / 'SeasunGame.lnk'
+    lnk.write_bytes(build_link(link_info('C:\\A\\', 'SeasunGame.exe')))
+    PathResolver.clear_shortcut_cache()
+    assert PathResolver.parse_shortcut(str(lnk)) == 'C:\\A\\SeasunGame.exe'
+
+    lnk.write_bytes(build_link(link_info('C:\\Longer\\', 'SeasunGame.exe')))
+    assert PathResolver.parse_shortcut(str(lnk)) == 'C:\\Longer\\SeasunGame.exe'
@@ -0,0 +1,48 @@
+"""staged 模式复制和撤销测试"""
+from backend.file_cloner import STRATEGY_COPY
+from backend.models import RoleInfo
+from backend.role_copier import RoleCopier
+
+
+def make_role(root, name, files):
+    path = root / name
+    path.mkdir(parents=True, exist_ok=True)
+    for rel, content in files.items():
+        (path / rel).write_text(content)
+    return RoleInfo('acc', 'reg', 'srv', name, str(path))
+
+
+def test_undo_restores_previous_tree(tmp_path):
+    copier = RoleCopier(clone_strategy=STRATEGY_COPY)
+    source = make_role(tmp_path, 'source', {'a.ini': 'new'})
+    target = make_role(tmp_path, 'target', {'a.ini': 'old', 'b.ini': 'old'})
+
+    result = copier.copy_role(source, target, mode=RoleCopier.MODE_STAGED)
+    assert result['success'] and result['undo']
+    assert sorted(p.name for p in (tmp_path / 'target').iterdir()) == ['a.ini']
+
+    assert copier.undo_staged(target)['success']
+    assert (tmp_path / 'target' / 'a.ini').read_text() == 'old'
+    assert (tmp_path / 'target' / 'b.ini').read_text() == 'old'
+    # 只能撤销一次
+    assert not copier.undo_staged(target)['success']
+
+
+def test_undo_of_copy_into_new_directory_removes_it(tmp_path):
+    copier = RoleCopier(clone_strategy=STRATEGY_COPY)
+    source = make_role(tmp_path, 'source', {'a.ini': 'new'})
+    target = RoleInfo('acc', 'reg', 'srv', 'target', str(tmp_path / 'target'))
+
+    assert copier.copy_role(source, target, mode=RoleCopier.MODE_STAGED)['success']
+    assert copier.undo_staged(target)['success']
+    assert not (tmp_path / 'target').exists()
+
+
+def test_later_write_discards_undo(tmp_path):
+    copier = RoleCopier(clone_strategy=STRATEGY_COPY)
+    source = make_role(tmp_path, 'source', {'a.ini': 'new'})
+    target = make_role(tmp_path, 'target', {'a.ini': 'old'})
+
+    copier.copy_role(source, target, mode=RoleCopier.MODE_STAGED)
+    copier.copy_role(source, target, mode=RoleCopier.MODE_INCREMENTAL)
+    assert not copier.undo_staged(target)['success']
@@ -0,0 +1,126 @@
+"""
+目录差异比较模块
+比较源目录和目标目录，找出需要新增、更新、删除的文件
+"""
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .blob_store import BlobStore
+from .hash_cache import HashCache
+from .metrics import STAT_CALLS, metrics, timed
+from .sync_profile import SyncProfile
+
+
+@dataclass
+class FileEntry:
+    """文件元数据"""
+    size: int
+    mtime_ns: int
+    dev: int = 0
+    ino: int = 0
+
+
+@dataclass
+class TreeDiff:
+    """目录差异，路径均为相对于角色目录的 posix 路径"""
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    missing_dirs: List[str] = field(default_factory=list)
+    extra_dirs: List[str] = field(default_factory=list)
+
+    def to_summary(self) -> dict:
+        return {
+            'added': self.added,
+            'updated': self.updated,
+            'deleted': self.deleted,
+            'skipped': self.skipped
+        }
+
+
+@timed('scan')
+def scan_tree(root: Path) -> Tuple[Dict[str, FileEntry], Set[str]]:
+    """
+    扫描目录树
+
+    Args:
+        root: 根目录
+
+    Returns:
+        (文件字典 {相对路径: FileEntry}, 子目录相对路径集合)
+    """
+    files = {}
+    dirs = set()
+
+    if not root.is_dir():
+        return files, dirs
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = Path(dirpath).relative_to(root)
+        for name in dirnames:
+            dirs.add((rel_dir / name).as_posix())
+        metrics.inc(STAT_CALLS, len(filenames), source='scan_tree')
+        for name in filenames:
+            stat = os.stat(os.path.join(dirpath, name))
+            files[(rel_dir / name).as_posix()] = FileEntry(stat.st_size, stat.st_mtime_ns,
+                                                            stat.st_dev, stat.st_ino)
+
+    return files, dirs
+
+
+def diff_trees(source_root: Path, target_root: Path, use_hash: bool = False,
+               source_tree: Optional[Tuple[Dict[str, FileEntry], Set[str]]] = None,
+               profile: SyncProfile = None, hash_cache: HashCache = None) -> TreeDiff:
+    """
+    比较两个目录树
+
+    大小不同视为已修改；大小相同时默认比较修改时间，
+    use_hash 为 True 时改为比较文件内容哈希。
+
+    Args:
+        source_root: 源目录
+        target_root: 目标目录
+        use_hash: 是否比较内容哈希
+        source_tree: 已扫描的源目录 (文件字典, 目录集合)，为空时重新扫描
+        profile: 同步方案，指定时只比较匹配的文件，不匹配的目标文件和目录保持不变
+        hash_cache: 哈希缓存，use_hash 为 True 时未变化的文件不再重复读取
+
+    Returns:
+        目录差异
+    """
+    source_files, source_dirs = source_tree or scan_tree(source_root)
+    target_files, target_dirs = scan_tree(target_root)
+    if profile:
+        source_files, source_dirs = profile.filter_tree(source_files)
+        target_files = profile.filter_files(target_files)
+    diff = TreeDiff()
+
+    for rel, src in sorted(source_files.items()):
+        dst = target_files.get(rel)
+        if dst is None:
+            diff.added.append(rel)
+        elif src.size != dst.size:
+            diff.updated.append(rel)
+        elif use_hash:
+            if hash_cache:
+                same = (hash_cache.hash_file(source_root / rel, src)
+                        == hash_cache.hash_file(target_root / rel, dst))
+            else:
+                same = (BlobStore.hash_file(source_root / rel)
+                        == BlobStore.hash_file(target_root / rel))
+            (diff.skipped if same else diff.updated).append(rel)
+        elif src.mtime_ns != dst.mtime_ns:
+            diff.updated.append(rel)
+        else:
+            diff.skipped.append(rel)
+
+    diff.deleted = sorted(rel for rel in target_files if rel not in source_files)
+    diff.missing_dirs = sorted(d for d in source_dirs if d not in target_dirs)
+    if not profile:
+        # 使用同步方案时多余的目录中可能有不匹配的文件，不能删除
+        diff.extra_dirs = sorted(d for d in target_dirs if d not in source_dirs)
+
+    return diff
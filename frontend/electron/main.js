@@ -3,6 +3,13 @@ const path = require('path');
 const { spawn } = require('child_process');
 const kill = require('tree-kill');
 const fs = require('fs');
+const http = require('http');
+
+// 后端健康检查地址，端口开始监听后立即可用
+const BACKEND_HEALTH_URL = 'http://127.0.0.1:5000/api/health';
+// 轮询健康检查的间隔和最长等待时间（毫秒）
+const BACKEND_POLL_INTERVAL = 50;
+const BACKEND_START_TIMEOUT = 30000;
 
 let mainWindow;
 let pythonProcess;
@@ -38,9 +45,38 @@ function startPythonBackend() {
     console.log(`Python process exited with code ${code}`);
   });
 
-  // 等待后端服务启动
+  return waitForBackend();
+}
+
+// 轮询健康检查直到后端可以响应，超时后仍然继续打开窗口
+function waitForBackend() {
+  const started = Date.now();
+
   return new Promise((resolve) => {
-    setTimeout(resolve, 2000);
+    const retry = () => {
+      if (Date.now() - started > BACKEND_START_TIMEOUT) {
+        console.error('Backend did not respond to health check in time');
+        resolve();
+        return;
+      }
+      setTimeout(poll, BACKEND_POLL_INTERVAL);
+    };
+
+    const poll = () => {
+      const req = http.get(BACKEND_HEALTH_URL, (res) => {
+        res.resume();
+        if (res.statusCode === 200) {
+          console.log(`Backend responded in ${Date.now() - started} ms`);
+          resolve();
+        } else {
+          retry();
+        }
+      });
+      req.setTimeout(1000, () => req.destroy());
+      req.on('error', retry);
+    };
+
+    poll();
   });
 }
 
@@ -8,6 +8,18 @@ import SuccessDialog from './components/SuccessDialog';
 import GuideDialog from './components/GuideDialog';
 import './App.css';
 
+const formatBytes = (bytes) => {
+  if (bytes >= 1024 * 1024) return `${(bytes / 1024 / 1024).toFixed(1)} MB`;
+  if (bytes >= 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+  return `${Math.round(bytes)} B`;
+};
+
+const formatJobProgress = (job) => {
+  const { current, total, message, files_done, bytes_done, throughput } = job.progress;
+  const step = total > 0 ? ` (${current}/${total})` : '';
+  return `${message || '正在复制...'}${step} · ${files_done} 个文件 · ${formatBytes(bytes_done)} · ${formatBytes(throughput)}/s`;
+};
+
 function App() {
   const [userdataPath, setUserdataPath] = useState('');
   const [roles, setRoles] = useState([]);
@@ -30,6 +42,34 @@ function App() {
     }
   }, []);
 
+  // 角色目录变化时增量更新角色列表
+  useEffect(() => {
+    if (!userdataPath) return;
+
+    const source = ApiService.subscribeRoleEvents((event) => {
+      switch (event.type) {
+        case 'role_added':
+          setRoles(prev => prev.some(r => r.path === event.role.path) ? prev : [...prev, event.role]);
+          break;
+        case 'role_removed':
+          setRoles(prev => prev.filter(r => r.path !== event.role.path));
+          setTargetRoles(prev => prev.filter(r => r.path !== event.role.path));
+          break;
+        case 'role_renamed':
+          setRoles(prev => prev.map(r => r.path === event.old_role.path ? event.role : r));
+          setTargetRoles(prev => prev.map(r => r.path === event.old_role.path ? event.role : r));
+          break;
+        case 'resync':
+          scanRoles();
+          break;
+        default:
+          break;
+      }
+    });
+
+    return () => source.close();
+  }, [userdataPath]);
+
   const loadConfig = async () => {
     try {
       const config = await ApiService.getConfig();
@@ -90,7 +130,9 @@ function App() {
       const result = await ApiService.copyMultiple(
         sourceRole,
         targetRoles,
-        options.autoBackup
+        options.autoBackup,
+        (job) => setMessage(formatJobProgress(job)),
+        options.profile || null
       );
 
       if (result.success) {
@@ -60,6 +60,81 @@ class ApiService {
     return this.request('/roles/filters');
   }
 
+  /**
+   * 查询角色（后端索引，支持拼音首字母和模糊匹配）
+   * params: { q, account, region, server, match, sort, order, offset, limit }
+   */
+  static async queryRoles(params = {}) {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== null && value !== '') query.set(key, value);
+    });
+    return this.request(`/roles/query?${query.toString()}`);
+  }
+
+  /**
+   * 订阅角色变化事件（Server-Sent Events）
+   * 返回 EventSource，调用 close() 取消订阅
+   */
+  static subscribeRoleEvents(onEvent) {
+    const source = new EventSource(`${API_BASE_URL}/roles/events`);
+    ['role_added', 'role_removed', 'role_renamed', 'resync'].forEach((type) => {
+      source.addEventListener(type, (e) => onEvent(JSON.parse(e.data)));
+    });
+    return source;
+  }
+
+  /**
+   * 导出角色包，返回 Response，调用方可用 response.body 流式读取或 blob() 保存
+   * options: { format: 'tar' | 'zip', profile, skip_hashes }
+   */
+  static async exportRoles(roles, options = {}) {
+    const response = await fetch(`${API_BASE_URL}/roles/export`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ roles, ...options }),
+    });
+    if (!response.ok) {
+      const data = await response.json();
+      throw new Error(data.error || '导出失败');
+    }
+    return response;
+  }
+
+  // 只获取角色包清单（文件列表和哈希），不传输文件
+  static async exportManifest(roles, options = {}) {
+    return this.request('/roles/export', {
+      method: 'POST',
+      body: JSON.stringify({ roles, ...options, manifest_only: true }),
+    });
+  }
+
+  // 检查清单中哪些文件本机已有，返回的 have 可作为导出时的 skip_hashes
+  static async checkImport(manifest, targets = null) {
+    return this.request('/roles/import/check', {
+      method: 'POST',
+      body: JSON.stringify({ manifest, targets }),
+    });
+  }
+
+  /**
+   * 导入角色包，bundle 为 Blob / File / ReadableStream
+   * options: { format: 'tar' | 'zip', targets, autoBackup, prune }
+   */
+  static async importRoles(bundle, options = {}) {
+    const query = new URLSearchParams({
+      format: options.format || 'tar',
+      auto_backup: options.autoBackup === false ? '0' : '1',
+      prune: options.prune === false ? '0' : '1',
+    });
+    if (options.targets) query.set('targets', JSON.stringify(options.targets));
+    return this.request(`/roles/import?${query.toString()}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/octet-stream' },
+      body: bundle,
+    });
+  }
+
   // ===== 复制相关 =====
 
   static async validateCopy(source, target) {
@@ -69,17 +144,58 @@ class ApiService {
     });
   }
 
-  static async copySingle(source, target, autoBackup = true) {
-    return this.request('/copy/single', {
+  static async copySingle(source, target, autoBackup = true, onProgress = null, profile = null) {
+    return this.runJob('/copy/single', { source, target, auto_backup: autoBackup, profile }, onProgress);
+  }
+
+  static async copyMultiple(source, targets, autoBackup = true, onProgress = null, profile = null) {
+    return this.runJob('/copy/multiple', { source, targets, auto_backup: autoBackup, profile }, onProgress);
+  }
+
+  // 撤销对目标最近一次 staged 模式的复制
+  static async undoCopy(target) {
+    return this.request('/copy/undo', {
+      method: 'POST',
+      body: JSON.stringify({ target }),
+    });
+  }
+
+  // 生成同步计划（不写入文件），options 可包含 mode、use_hash、profile、include_files
+  static async planCopy(source, targets, options = {}) {
+    return this.request('/copy/plan', {
+      method: 'POST',
+      body: JSON.stringify({ source, targets, ...options }),
+    });
+  }
+
+  static async executePlan(planId, autoBackup = true, onProgress = null) {
+    return this.runJob(`/copy/plan/${planId}/execute`, { auto_backup: autoBackup }, onProgress);
+  }
+
+  // ===== 同步方案 =====
+
+  static async listProfiles() {
+    return this.request('/profiles');
+  }
+
+  static async saveProfile(profile) {
+    return this.request('/profiles/save', {
+      method: 'POST',
+      body: JSON.stringify(profile),
+    });
+  }
+
+  static async deleteProfile(name) {
+    return this.request('/profiles/delete', {
       method: 'POST',
-      body: JSON.stringify({ source, target, auto_backup: autoBackup }),
+      body: JSON.stringify({ name }),
     });
   }
 
-  static async copyMultiple(source, targets, autoBackup = true) {
-    return this.request('/copy/multiple', {
+  static async previewProfile(source, profile) {
+    return this.request('/profiles/preview', {
       method: 'POST',
-      body: JSON.stringify({ source, targets, auto_backup: autoBackup }),
+      body: JSON.stringify({ source, profile }),
     });
   }
 
@@ -89,25 +205,101 @@ class ApiService {
     return this.request('/backup/get-path');
   }
 
-  static async listBackups(limit = null) {
-    const params = limit ? `?limit=${limit}` : '';
-    return this.request(`/backup/list${params}`);
+  /**
+   * 列出备份，传入 role 时只列出该角色的备份
+   */
+  static async listBackups(limit = null, role = null) {
+    const params = new URLSearchParams();
+    if (limit) params.set('limit', limit);
+    if (role) {
+      ['account', 'region', 'server', 'role'].forEach((key) => params.set(key, role[key]));
+    }
+    const query = params.toString();
+    return this.request(`/backup/list${query ? `?${query}` : ''}`);
+  }
+
+  static async rebuildBackupCatalog() {
+    return this.request('/backup/rebuild-catalog', { method: 'POST' });
+  }
+
+  static async collectBackupGarbage() {
+    return this.request('/backup/gc', { method: 'POST' });
+  }
+
+  static async createBackup(role, onProgress = null) {
+    return this.runJob('/backup/create', { role }, onProgress);
+  }
+
+  static async restoreBackup(backupName, target, onProgress = null) {
+    return this.runJob('/backup/restore', { backup_name: backupName, target }, onProgress);
+  }
+
+  static async deleteBackup(backupName, onProgress = null) {
+    return this.runJob('/backup/delete', { backup_name: backupName }, onProgress);
   }
 
-  static async restoreBackup(backupName, target) {
-    return this.request('/backup/restore', {
+
+  // ===== 后台任务 =====
+
+  /**
+   * 提交后台任务并等待完成
+   * onProgress 收到任务状态（含 progress），返回任务结果
+   */
+  static async runJob(endpoint, body, onProgress = null) {
+    const submitted = await this.request(endpoint, {
       method: 'POST',
-      body: JSON.stringify({ backup_name: backupName, target }),
+      body: JSON.stringify(body),
     });
+    const job = await this.watchJob(submitted.job_id, onProgress);
+
+    if (job.status === 'failed') {
+      throw new Error(job.error || '任务失败');
+    }
+    if (job.status === 'cancelled') {
+      throw new Error('任务已取消');
+    }
+    return job.result;
   }
 
-  static async deleteBackup(backupName) {
-    return this.request('/backup/delete', {
-      method: 'POST',
-      body: JSON.stringify({ backup_name: backupName }),
+  /**
+   * 订阅任务进度（Server-Sent Events），任务结束时返回最终状态
+   */
+  static watchJob(jobId, onProgress = null) {
+    return new Promise((resolve, reject) => {
+      const source = new EventSource(`${API_BASE_URL}/jobs/${jobId}/events`);
+      source.addEventListener('progress', (e) => {
+        if (onProgress) onProgress(JSON.parse(e.data));
+      });
+      source.addEventListener('done', (e) => {
+        source.close();
+        const job = JSON.parse(e.data);
+        if (onProgress) onProgress(job);
+        resolve(job);
+      });
+      source.onerror = () => {
+        // 连接断开时改用查询接口确认任务状态
+        if (source.readyState === EventSource.CLOSED) {
+          this.getJob(jobId)
+            .then((job) => (job.status === 'pending' || job.status === 'running'
+              ? this.watchJob(jobId, onProgress).then(resolve)
+              : resolve(job)))
+            .catch(reject);
+        }
+      };
     });
   }
 
+  static async getJob(jobId) {
+    return this.request(`/jobs/${jobId}`);
+  }
+
+  static async listJobs() {
+    return this.request('/jobs');
+  }
+
+  static async cancelJob(jobId) {
+    return this.request(`/jobs/${jobId}/cancel`, { method: 'POST' });
+  }
 
   // ===== 配置相关 =====
 
@@ -131,6 +323,31 @@ class ApiService {
     });
   }
 
+  // ===== I/O 调度 =====
+
+  static async getIoDevices() {
+    return this.request('/io/devices');
+  }
+
+  // ===== 性能分析 =====
+
+  static async listRequestProfiles() {
+    return this.request('/debug/profiles');
+  }
+
+  static async getRequestProfile(id) {
+    return this.request(`/debug/profiles/${id}`);
+  }
+
+  // 分析文件的下载地址，format 为 prof、collapsed 或 json
+  static requestProfileUrl(id, format = 'prof') {
+    return `${API_BASE_URL}/debug/profiles/${id}/download?format=${format}`;
+  }
+
+  static async clearRequestProfiles() {
+    return this.request('/debug/profiles/clear', { method: 'POST' });
+  }
+
   // ===== 健康检查 =====
 
   static async healthCheck() {
@@ -1,12 +1,21 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
+import ApiService from '../api';
 import ConfirmDialog from './ConfirmDialog';
 
 function CopyOptions({ sourceRole, targetRoles, onCopy, disabled }) {
   const [options, setOptions] = useState({
     autoBackup: true,
-    confirmBeforeCopy: true
+    confirmBeforeCopy: true,
+    profile: ''
   });
   const [showConfirm, setShowConfirm] = useState(false);
+  const [profiles, setProfiles] = useState([]);
+
+  useEffect(() => {
+    ApiService.listProfiles()
+      .then((result) => setProfiles(result.profiles))
+      .catch((error) => console.error('加载同步方案失败:', error));
+  }, []);
 
   const handleCopy = () => {
     if (options.confirmBeforeCopy) {
@@ -49,6 +58,24 @@ function CopyOptions({ sourceRole, targetRoles, onCopy, disabled }) {
           />
           <span>覆盖前二次确认</span>
         </label>
+
+        {profiles.length > 0 && (
+          <label className="option-item">
+            <span>同步范围</span>
+            <select
+              value={options.profile}
+              onChange={(e) => setOptions({ ...options, profile: e.target.value })}
+              disabled={disabled}
+            >
+              <option value="">全部文件</option>
+              {profiles.map(profile => (
+                <option key={profile.name} value={profile.name} title={profile.description}>
+                  {profile.name}
+                </option>
+              ))}
+            </select>
+          </label>
+        )}
       </div>
 
       <button
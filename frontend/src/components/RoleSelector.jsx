@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import ApiService from '../api';
 
 // 获取Electron的shell、path和fs API
@@ -7,6 +7,9 @@ const pathModule = window.require ? window.require('path') : {};
 const fs = window.require ? window.require('fs') : {};
 const { shell } = electron;
 
+const SEARCH_DELAY = 150;
+const ROLE_QUERY_LIMIT = 1000;
+
 function RoleSelector({ roles, sourceRole, targetRoles, onSourceChange, onTargetChange, disabled }) {
   const [sourceSearch, setSourceSearch] = useState('');
   const [targetSearch, setTargetSearch] = useState('');
@@ -21,6 +24,11 @@ function RoleSelector({ roles, sourceRole, targetRoles, onSourceChange, onTarget
     servers: []
   });
   const [contextMenu, setContextMenu] = useState(null);
+  // 后端查询结果的角色路径，null 表示没有搜索条件
+  const [sourceMatches, setSourceMatches] = useState(null);
+  const [targetMatches, setTargetMatches] = useState(null);
+  // 上次自动选择源角色时的搜索词
+  const autoSelectedQuery = useRef('');
 
   useEffect(() => {
     loadFilterOptions();
@@ -35,21 +43,69 @@ function RoleSelector({ roles, sourceRole, targetRoles, onSourceChange, onTarget
     }
   };
 
-  const handleSourceSearchChange = (e) => {
-    const searchValue = e.target.value;
-    setSourceSearch(searchValue);
-
-    if (searchValue) {
-      const filtered = roles.filter(role =>
-        role.role.toLowerCase().includes(searchValue.toLowerCase())
-      );
-      if (filtered.length > 0) {
-        const firstRole = filtered[0];
-        onSourceChange(firstRole);
-        const newTargets = targetRoles.filter(t => t.path !== firstRole.path);
-        onTargetChange(newTargets);
+  // 搜索由后端索引完成，输入停顿后再查询；条件变化后，之前发出的查询结果直接丢弃
+  useEffect(() => {
+    if (!sourceSearch) {
+      setSourceMatches(null);
+      autoSelectedQuery.current = '';
+      return;
+    }
+
+    let stale = false;
+    const timer = setTimeout(async () => {
+      try {
+        const result = await ApiService.queryRoles({ q: sourceSearch, limit: ROLE_QUERY_LIMIT });
+        if (stale) return;
+        setSourceMatches(result.roles.map(role => role.path));
+        // 只在搜索词变化后自动选择第一个结果；角色列表更新（目录监视事件）时只刷新匹配结果，
+        // 不覆盖用户手动选择的源角色
+        if (autoSelectedQuery.current === sourceSearch) return;
+        autoSelectedQuery.current = sourceSearch;
+        if (result.roles.length > 0) {
+          const firstRole = roles.find(r => r.path === result.roles[0].path) || result.roles[0];
+          onSourceChange(firstRole);
+          onTargetChange(targetRoles.filter(t => t.path !== firstRole.path));
+        }
+      } catch (error) {
+        console.error('查询角色失败:', error);
       }
+    }, SEARCH_DELAY);
+
+    return () => {
+      stale = true;
+      clearTimeout(timer);
+    };
+  }, [sourceSearch, roles]);
+
+  useEffect(() => {
+    if (!targetSearch && !filters.account && !filters.region && !filters.server) {
+      setTargetMatches(null);
+      return;
     }
+
+    let stale = false;
+    const timer = setTimeout(async () => {
+      try {
+        const result = await ApiService.queryRoles({
+          q: targetSearch,
+          ...filters,
+          limit: ROLE_QUERY_LIMIT
+        });
+        if (stale) return;
+        setTargetMatches(result.roles.map(role => role.path));
+      } catch (error) {
+        console.error('查询角色失败:', error);
+      }
+    }, SEARCH_DELAY);
+
+    return () => {
+      stale = true;
+      clearTimeout(timer);
+    };
+  }, [targetSearch, filters, roles]);
+
+  const handleSourceSearchChange = (e) => {
+    setSourceSearch(e.target.value);
   };
 
   const handleSourceChange = (e) => {
@@ -150,21 +206,18 @@ function RoleSelector({ roles, sourceRole, targetRoles, onSourceChange, onTarget
     };
   }, [contextMenu]);
 
-  const filteredSourceRoles = roles.filter(role => {
-    if (sourceSearch && !role.role.toLowerCase().includes(sourceSearch.toLowerCase())) {
-      return false;
-    }
-    return true;
-  });
+  // 按查询结果的顺序（匹配度）排列
+  const pickRoles = (paths) => {
+    if (paths === null) return roles;
+    const byPath = new Map(roles.map(role => [role.path, role]));
+    return paths.map(path => byPath.get(path)).filter(Boolean);
+  };
 
-  const filteredTargetRoles = roles.filter(role => {
-    if (filters.account && role.account !== filters.account) return false;
-    if (filters.region && role.region !== filters.region) return false;
-    if (filters.server && role.server !== filters.server) return false;
-    if (targetSearch && !role.role.toLowerCase().includes(targetSearch.toLowerCase())) return false;
-    if (sourceRole && role.path === sourceRole.path) return false;
-    return true;
-  });
+  const filteredSourceRoles = pickRoles(sourceMatches);
+
+  const filteredTargetRoles = pickRoles(targetMatches).filter(
+    role => !sourceRole || role.path !== sourceRole.path
+  );
 
   const roleDisplay = (role) =>
     `${role.account}-${role.region}-${role.server}-${role.role}`;
@@ -177,7 +230,7 @@ function RoleSelector({ roles, sourceRole, targetRoles, onSourceChange, onTarget
         <input
           type="text"
           className="search-input"
-          placeholder="搜索角色名..."
+          placeholder="搜索角色名或拼音首字母..."
           value={sourceSearch}
           onChange={handleSourceSearchChange}
           onClick={(e) => e.stopPropagation()}
@@ -222,7 +275,7 @@ function RoleSelector({ roles, sourceRole, targetRoles, onSourceChange, onTarget
         <input
           type="text"
           className="search-input"
-          placeholder="搜索角色名..."
+          placeholder="搜索角色名或拼音首字母..."
           value={targetSearch}
           onChange={(e) => setTargetSearch(e.target.value)}
           onClick={(e) => e.stopPropagation()}